@@ -6,6 +6,8 @@ __all__ = (
     "__version__",
     "Address",
     "ApiError",
+    "AsyncESClient",
+    "AsyncMySQLClient",
     "Checks",
     "CommonError",
     "ConnectorError",
@@ -42,6 +44,7 @@ __all__ = (
     "SQLClient",
     "SQLtoMongo",
     "SSHClient",
+    "SpatialIndex",
     "Statistics",
     "ThreadSafeIterator",
     "TicToc",
@@ -108,9 +111,11 @@ __all__ = (
     "set_alpha",
     "set_clean_email",
     "set_must_have_address",
+    "set_page_size",
     "set_population_size",
     "set_search_size",
     "set_years_ago",
+    "spatial",
     "thread",
     "thread_queue",
     "threadsafe",
@@ -136,6 +141,8 @@ _module_mapping = {
         "validate",
     ],
     "connectors": [
+        "AsyncESClient",
+        "AsyncMySQLClient",
         "ESClient",
         "EmailClient",
         "MongoDB",
@@ -218,6 +225,7 @@ _module_mapping = {
         "set_alpha",
         "set_clean_email",
         "set_must_have_address",
+        "set_page_size",
         "set_population_size",
         "set_search_size",
         "set_years_ago",
@@ -248,6 +256,9 @@ _module_mapping = {
         "get_secret",
         "get_token",
     ],
+    "spatial": [
+        "SpatialIndex",
+    ],
     "visualizations": [
         "DistributionPlot",
         "PlotMx",
@@ -96,6 +96,8 @@ def set_number_of_residential_addresses() -> bool:
     ).distinct_count(
         field="address.identification.addressId",
         find={"match": {"houseDetails.usePurpose": "woonfunctie"}},
+        partitions=1_000,
+        threads=8,
     )
     return True
 
@@ -106,6 +108,8 @@ def set_number_of_postcodes() -> bool:
     ).distinct_count(
         field="address.postalCode",
         find={"match": {"houseDetails.usePurpose": "woonfunctie"}},
+        partitions=100,
+        threads=8,
     )
     return True
 
@@ -6,7 +6,9 @@ Connect to Elasticsearch with ESClient
 
 There is also an EmailClient, which can be used to send emails.
 
-There are two alternative connectors for MySQL: PandasSQL and SQLClient
+There are two alternative connectors for MySQL: PandasSQL and SQLClient,
+and an asynchronous one: AsyncMySQLClient. For Elasticsearch, there is
+an asynchronous AsyncESClient as well.
 
 Finally, there is a SQLtoMongo class for moving data from MySQL to MongoDB
 """
@@ -14,6 +16,8 @@ Finally, there is a SQLtoMongo class for moving data from MySQL to MongoDB
 from __future__ import annotations
 
 __all__ = (
+    "AsyncESClient",
+    "AsyncMySQLClient",
     "ESClient",
     "EmailClient",
     "MongoDB",
@@ -28,6 +32,8 @@ from importlib import import_module
 from types import ModuleType
 
 _module_mapping = {
+    "mx_aioelastic": "AsyncESClient",
+    "mx_aiomysql": "AsyncMySQLClient",
     "mx_elastic": "ESClient",
     "mx_email": "EmailClient",
     "mx_mongo": "MongoDB",
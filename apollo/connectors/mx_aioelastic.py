@@ -0,0 +1,367 @@
+"""Connect to Matrixian's Elasticsearch databases from asyncio code."""
+
+from __future__ import annotations
+
+__all__ = ("AsyncESClient",)
+
+from asyncio import Semaphore, gather
+from collections.abc import AsyncIterator
+from contextlib import suppress
+from typing import Any
+
+from elasticsearch import AsyncElasticsearch
+from elasticsearch.exceptions import ElasticsearchException, TransportError
+from urllib3.exceptions import HTTPWarning
+
+from ..exceptions import ESClientError
+from .mx_elastic import (
+    ESClient,
+    _address_location,
+    _address_query,
+    _geo_distance_query,
+    _host_config,
+    _simple_query,
+)
+
+
+class AsyncESClient(AsyncElasticsearch):
+    """Asynchronous client for Matrixian's Elasticsearch databases.
+
+    :class:`AsyncESClient` mirrors the added methods of :class:`ESClient`
+    as coroutines: `find`, `findall`, `query`, `count`,
+    `distinct_values` and `geo_distance`. `scrollall` is an async
+    generator. The server is selected based on the index name, like
+    :class:`ESClient` does.
+
+    Example::
+        async with AsyncESClient("dev_realestate.real_estate") as es:
+            doc = await es.find(q, first_only=True)
+            async for doc in es.scrollall(q, source_only=True):
+                print(doc)
+    """
+
+    def __init__(self, es_index: str | None = None, **kwargs: Any):
+        """Asynchronous client for Matrixian's Elasticsearch databases.
+
+        Accepts the same keyword arguments as :class:`ESClient`, except
+        `shared`: the connection pool belongs to the event loop of this
+        client, and is closed with `close`.
+        """
+        self._host, self._port, config = _host_config(es_index, kwargs)
+        hosts = [{"host": self._host, "port": self._port}]
+        config["maxsize"] = kwargs.pop("maxsize", 32)
+        config["http_compress"] = kwargs.pop("http_compress", False)
+        super().__init__(hosts, **config)
+        self.es_index = es_index
+        self.size = kwargs.pop("size", 20)
+        self.retry_on_timeout = kwargs.pop("retry_on_timeout", True)
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__name__}"
+            f"(host='{self._host}', port='{self._port}', index='{self.es_index}')"
+        )
+
+    def __str__(self) -> str:
+        return f"http://{self._host}:{self._port}/{self.es_index}/_stats"  # noqa
+
+    async def find(
+        self,
+        query: dict[str, Any] | list[dict[str, Any]] | None = None,
+        **kwargs: Any,
+    ) -> dict[str, Any] | list[Any]:
+        """Perform an Elasticsearch query, and return the hits.
+
+        See :meth:`ESClient.find`. Multiple queries are sent in batches of
+        `batch_size` (default: 100) using the _msearch API, with at most
+        `threads` (default: 4) batches at once.
+        """
+        shape = ESClient._shaper(kwargs)
+        index = kwargs.pop("index", self.es_index)
+        if isinstance(query, list):
+            if not query:
+                return []
+            return await self._find_many(query, index, shape, **kwargs)
+        elif not query:
+            size = kwargs.pop("size", 1)
+            return await self.search(index=index, size=size, body={}, **kwargs)
+        if "size" in query:
+            size = query.pop("size")
+        else:
+            size = kwargs.pop("size", self.size)
+        while True:
+            try:
+                result = await self.search(index=index, size=size, body=query, **kwargs)
+                break
+            except (OSError, HTTPWarning, TransportError) as e:
+                if not (self.retry_on_timeout and "timeout" in f"{e}".lower()):
+                    raise
+            except ElasticsearchException as e:
+                raise ESClientError(query) from e
+        return shape(result, size)
+
+    async def _find_many(
+        self,
+        queries: list[dict[str, Any]],
+        index: str | None,
+        shape: Any,
+        **kwargs: Any,
+    ) -> list[Any]:
+        """Perform multiple queries in batches using the _msearch API."""
+        batch_size = kwargs.pop("batch_size", 100)
+        threads = kwargs.pop("threads", 4)
+        default_size = kwargs.pop("size", self.size)
+        source = kwargs.pop("_source", None)
+
+        bodies = []
+        for query in queries:
+            body = {**query}
+            body["size"] = body.get("size", default_size)
+            if source is not None:
+                body.setdefault("_source", source)
+            bodies.append(body)
+
+        semaphore = Semaphore(threads)
+
+        async def msearch(batch: list[dict[str, Any]]) -> list[Any]:
+            lines: list[dict[str, Any]] = []
+            for body in batch:
+                lines.extend(({"index": index}, body))
+            while True:
+                try:
+                    async with semaphore:
+                        response = await self.msearch(body=lines, **kwargs)
+                    break
+                except (OSError, HTTPWarning, TransportError) as e:
+                    if not (self.retry_on_timeout and "timeout" in f"{e}".lower()):
+                        raise
+                except ElasticsearchException as e:
+                    raise ESClientError(batch) from e
+            results = []
+            for body, result in zip(batch, response["responses"]):
+                if "error" in result:
+                    raise ESClientError(f"{result['error']} for query {body}")
+                results.append(shape(result, body["size"]))
+            return results
+
+        batches = await gather(
+            *(
+                msearch(bodies[offset : offset + batch_size])
+                for offset in range(0, len(bodies), batch_size)
+            )
+        )
+        return [result for results in batches for result in results]
+
+    async def geo_distance(
+        self,
+        *,
+        address_id: str | None = None,
+        location: tuple[float, float] | list[float] | dict[str, float] | None = None,
+        distance: str = "10m",
+        **kwargs: Any,
+    ) -> dict[str, Any] | list[dict[str, Any]]:
+        """Find all real estate objects or addresses within distance of
+        address_id or location.
+
+        See :meth:`ESClient.geo_distance`. Keyword arguments are passed on
+        to `find` if `size` is given, otherwise to `findall`.
+        """
+        if not any((address_id, location)) or all((address_id, location)):
+            raise ESClientError("Provide either an address_id or a location")
+        assert isinstance(self.es_index, str)
+
+        if address_id:
+            query, source = _address_query(self.es_index, address_id)
+            result = await self.find(
+                query=query, size=1, first_only=True, _source=source
+            )
+            if not isinstance(result, dict):
+                raise ESClientError(f"Address not found: {address_id}")
+            location = _address_location(self.es_index, result)
+
+        query = _geo_distance_query(self.es_index, location, distance)
+        if "size" in kwargs:
+            return await self.find(query=query, **kwargs)
+        return await self.findall(query=query, **kwargs)
+
+    async def findall(
+        self,
+        query: dict[str, Any],
+        index: str | None = None,
+        **kwargs: Any,
+    ) -> list[dict[str, Any]] | dict[str, Any]:
+        """Used for Elasticsearch queries that return more than 10k documents.
+        Returns all results at once.
+
+        Accepts the `hits_only`, `source_only`, `with_id`, `scroll` and
+        `size` options of :meth:`ESClient.findall`. With `hits_only=False`,
+        returns the response with all hits.
+        """
+        hits_only = kwargs.pop("hits_only", True)
+        source_only = kwargs.pop("source_only", False)
+        with_id = kwargs.pop("with_id", False)
+        if source_only:
+            hits_only = True
+        if with_id:
+            hits_only, source_only = True, False
+        scroll = kwargs.pop("scroll", "10m")
+        size = kwargs.pop("size", 10_000)
+        if not index:
+            index = self.es_index
+
+        data = await self.search(
+            index=index,
+            scroll=scroll,
+            size=size,
+            body=query,
+            **kwargs,
+        )
+        sid = data["_scroll_id"]
+        scroll_size = len(data["hits"]["hits"])
+        results: list[dict[str, Any]] = data["hits"]["hits"]
+
+        # We scroll over the results until nothing is returned
+        try:
+            while scroll_size > 0:
+                data = await self.scroll(scroll_id=sid, scroll=scroll)
+                results.extend(data["hits"]["hits"])
+                sid = data["_scroll_id"]
+                scroll_size = len(data["hits"]["hits"])
+        finally:
+            with suppress(ElasticsearchException):
+                await self.clear_scroll(scroll_id=sid)
+
+        if with_id:
+            results = [{**doc, **doc.pop("_source")} for doc in results]
+        if source_only:
+            results = [doc["_source"] for doc in results]
+        if hits_only:
+            return results
+        data["hits"]["hits"] = results
+        return data
+
+    async def scrollall(
+        self,
+        query: dict[str, Any] | None = None,
+        index: str | None = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[Any]:
+        """Used for Elasticsearch queries that return more than 10k documents.
+        Returns an async iterator of documents.
+
+        Accepts the `source_only`, `with_id`, `field`, `scroll`,
+        `as_chunks` and `chunk_size` options of :meth:`ESClient.scrollall`.
+
+        Usage::
+            es = AsyncESClient()
+            async for doc in es.scrollall(query=q):
+                pass
+        """
+        if not kwargs.pop("hits_only", True):
+            raise ESClientError("Use `.findall()` instead.")
+        source_only = kwargs.pop("source_only", False)
+        with_id = kwargs.pop("with_id", False)
+        if with_id:
+            source_only = False
+        field = kwargs.pop("field", None)
+        scroll = kwargs.pop("scroll", "10m")
+        as_chunks = kwargs.pop("as_chunks", False)
+        chunk_size = min(kwargs.pop("chunk_size", 10_000 if as_chunks else 1), 10_000)
+        if not index:
+            index = self.es_index
+
+        def _return(_data: dict[str, Any]) -> list[dict[str, Any]]:
+            docs = _data["hits"]["hits"]
+            if with_id:
+                docs = [{**d, **d.pop("_source")} for d in docs]
+            if source_only:
+                docs = [d["_source"] for d in docs]
+            return docs
+
+        data = await self.search(
+            index=index,
+            scroll=scroll,
+            size=chunk_size,
+            _source=field,
+            body=query,
+            **kwargs,
+        )
+        sid = data["_scroll_id"]
+        try:
+            while data["hits"]["hits"]:
+                if as_chunks:
+                    yield _return(data)
+                else:
+                    for doc in _return(data):
+                        yield doc
+                data = await self.scroll(scroll_id=sid, scroll=scroll)
+                sid = data["_scroll_id"]
+        finally:
+            with suppress(ElasticsearchException):
+                await self.clear_scroll(scroll_id=sid)
+
+    async def query(
+        self,
+        field: str | None = None,
+        value: Any = None,
+        **kwargs: Any,
+    ) -> dict[str, Any] | list[dict[str, Any]]:
+        """Perform a simple Elasticsearch query, and return the hits.
+
+        See :meth:`ESClient.query`.
+        """
+        q, find_kwargs = _simple_query(field, value, self.size, kwargs)
+        return await self.find(q, **find_kwargs)
+
+    async def count(  # type: ignore[override]
+        self,
+        body: dict[str, Any] | None = None,
+        index: str | None = None,
+        find: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> int:
+        """Count the number of documents a query will return."""
+        if index is None:
+            index = self.es_index
+        if find:
+            if body:
+                raise ESClientError("Provide either `body` or `find`.")
+            body = {"query": find}
+        count = await super().count(body=body, index=index, **kwargs)
+        return count["count"]
+
+    async def distinct_values(
+        self,
+        field: str,
+        find: dict[str, Any] | None = None,
+    ) -> list[Any]:
+        """Return distinct values in a certain field.
+
+        See :meth:`ESClient.distinct_values`.
+        """
+        values: list[Any] = []
+        after = None
+        while True:
+            agg: dict[str, Any] = {
+                "sources": [{"q": {"terms": {"field": field}}}],
+                "size": 10_000,
+            }
+            if after is not None:
+                agg["after"] = after
+            query = {
+                "query": find or {"match_all": {}},
+                "aggs": {"q": {"composite": agg}},
+            }
+            try:
+                result = await self.find(query, size=0)
+            except TransportError as e:
+                if "fielddata" in f"{e}" and field[-8:] != ".keyword":
+                    field = f"{field}.keyword"
+                    continue
+                raise ESClientError(query) from e
+            assert isinstance(result, dict)
+            buckets = result["aggregations"]["q"]["buckets"]
+            if not buckets:
+                return values
+            values.extend(bucket["key"]["q"] for bucket in buckets)
+            after = result["aggregations"]["q"]["after_key"]
@@ -0,0 +1,363 @@
+"""Connect to Matrixian's MySQL database from asyncio code."""
+
+from __future__ import annotations
+
+__all__ = ("AsyncMySQLClient",)
+
+import ssl
+from asyncio import Lock
+from collections.abc import AsyncIterator, Sequence
+from typing import Any
+
+import aiomysql
+from pymysql.err import MySQLError
+
+from ..exceptions import MySQLClientError
+from .mx_mysql import _MISSING, _READ_STATEMENTS, MySQLClient, Query, _query_tables
+
+
+class AsyncMySQLClient(MySQLClient):
+    """Asynchronous client for connecting to Matrixian's MySQL database.
+
+    :class:`AsyncMySQLClient` mirrors :class:`MySQLClient`, but
+    :meth:`AsyncMySQLClient.query`, :meth:`AsyncMySQLClient.count` and
+    :meth:`AsyncMySQLClient.insert` are coroutines, and
+    :meth:`AsyncMySQLClient.chunk` and :meth:`AsyncMySQLClient.iter` are
+    async generators. Queries are built with :meth:`MySQLClient.build`
+    and executed on a pool of :mod:`aiomysql` connections, so many
+    concurrent queries share a few connections instead of a thread each.
+
+    Example::
+        async with AsyncMySQLClient("real_estate.real_estate") as sql:
+            data = await sql.query(postcode="1014AK")
+            async for row in sql.iter(plaatsnaam="Amsterdam"):
+                print(row)
+    """
+
+    def __init__(
+        self,
+        database: str | None = None,
+        table: str | None = None,
+        **kwargs: Any,
+    ):
+        """Create an asynchronous client for MySQL.
+
+        Accepts the same arguments as :class:`MySQLClient`, and in addition:
+
+        :param minsize: Minimum number of pooled connections (default: 1)
+        :type minsize: int
+        :param maxsize: Maximum number of pooled connections (default: 10)
+        :type maxsize: int
+        """
+        self.minsize = kwargs.pop("minsize", 1)
+        self.maxsize = kwargs.pop("maxsize", 10)
+        super().__init__(database, table, **kwargs)
+        self.pool: aiomysql.Pool | None = None
+        self._pool_lock: Lock | None = None
+
+    def __repr__(self) -> str:
+        args = f"{self.database}{f'.{self.table_name}' if self.table_name else ''}"
+        return f"AsyncMySQLClient({args})"
+
+    async def __aenter__(self) -> AsyncMySQLClient:
+        await self.create_pool()
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        await self.close()
+
+    async def create_pool(self) -> aiomysql.Pool:
+        """Create the connection pool, if it doesn't exist yet."""
+        if self._pool_lock is None:
+            self._pool_lock = Lock()
+        async with self._pool_lock:
+            if self.pool is None:
+                config = self.__dict__["_MySQLClient__config"]
+                context = ssl.create_default_context(cafile=config["ssl_ca"])
+                context.check_hostname = False
+                context.load_cert_chain(config["ssl_cert"], config["ssl_key"])
+                self.pool = await aiomysql.create_pool(
+                    minsize=self.minsize,
+                    maxsize=self.maxsize,
+                    host=config["host"],
+                    user=config["user"],
+                    password=config["password"],
+                    db=self.database,
+                    ssl=context,
+                    autocommit=True,
+                    init_command=self._session_variables_query(),
+                )
+        return self.pool
+
+    async def close(self) -> None:
+        """Close all connections in the pool."""
+        if self.pool is not None:
+            self.pool.close()
+            await self.pool.wait_closed()
+            self.pool = None
+
+    def _cursor_class(
+        self,
+        unbuffered: bool = False,
+        dictionary: bool | None = None,
+    ) -> type[aiomysql.Cursor]:
+        if dictionary is None:
+            dictionary = self.dictionary
+        if unbuffered:
+            return aiomysql.SSDictCursor if dictionary else aiomysql.SSCursor
+        return aiomysql.DictCursor if dictionary else aiomysql.Cursor
+
+    async def _execute(self, query: Query | str, *args: Any) -> None:
+        """Execute a query that does not return data."""
+        pool = await self.create_pool()
+        async with pool.acquire() as cnx, cnx.cursor() as cursor:
+            try:
+                await cursor.execute(query, *args)
+            except MySQLError as e:
+                raise MySQLClientError(query) from e
+        self.executed_query = query
+        if self.cache is not None and not query.lstrip().upper().startswith(
+            _READ_STATEMENTS
+        ):
+            self.cache.invalidate(*_query_tables(query, self.database))
+
+    async def _fetch(
+        self,
+        query: Query | str,
+        *args: Any,
+        fetch_one: bool = False,
+        dictionary: bool | None = None,
+    ) -> Any:
+        pool = await self.create_pool()
+        cursor_class = self._cursor_class(dictionary=dictionary)
+        async with pool.acquire() as cnx, cnx.cursor(cursor_class) as cursor:
+            try:
+                await cursor.execute(query, *args)
+                if fetch_one:
+                    return await cursor.fetchone()
+                return await cursor.fetchall()
+            except MySQLError as e:
+                raise MySQLClientError(query) from e
+            finally:
+                self.executed_query = query
+
+    async def count(  # type: ignore[override]
+        self,
+        table: str | None = None,
+        *args: Any,
+    ) -> int:
+        """Fetch row count from MySQL.
+
+        Unlike :meth:`MySQLClient.count`, the client's database and table
+        are not changed, so that concurrent calls don't interfere.
+        """
+        if table is None:
+            table = self.table_name
+        if table is None:
+            raise MySQLClientError("No table name provided.")
+        database = self.database
+        if "." in table:
+            database, table = table.split(".")
+        row = await self._fetch(
+            Query(f"SELECT COUNT(*) FROM {database}.{table}"),
+            *args,
+            fetch_one=True,
+        )
+        if isinstance(row, dict):
+            row = tuple(row.values())
+        count = row[0]
+        assert isinstance(count, int)
+        return count
+
+    async def query(  # type: ignore[override]
+        self,
+        table: Query | str | None = None,
+        field: str | None = None,
+        value: Any = None,
+        *,
+        limit: str | int | list[str | int] | None = None,
+        offset: str | int | None = None,
+        fieldnames: bool | None = None,
+        select_fields: list[str] | str | None = None,
+        query: Query | str | None = None,
+        **kwargs: Any,
+    ) -> None | (list[dict[str, Any]] | list[list[Any]] | dict[str, Any] | list[Any]):
+        """Build and perform a MySQL query, and returns a data array.
+
+        See :meth:`MySQLClient.query` for examples. A query that does not
+        return data can be executed using :param query:, and a query that
+        returns data can be provided as the first positional argument.
+        Unlike :meth:`MySQLClient.query`, :param fieldnames: and the
+        database in :param table: only apply to this query, and don't
+        change the client, so that concurrent queries don't interfere.
+        """
+        if query:
+            await self._execute(query)
+            return None
+        if table and (
+            isinstance(table, Query) or table.strip().upper().startswith("SELECT")
+        ):
+            query = table
+        if select_fields is not None and len(select_fields) == 0:
+            raise MySQLClientError(f"Empty {type(select_fields)} not accepted.")
+        if not query:
+            query = self.build(
+                table=table,
+                field=field,
+                value=value,
+                limit=limit,
+                offset=offset,
+                select_fields=select_fields,
+                **kwargs,
+            )
+        database = self.database
+        if table and table is not query and "." in table:
+            database = table.split(".")[0]
+        dictionary = self.dictionary if fieldnames is None else fieldnames
+        one_field = isinstance(select_fields, str)
+
+        key = None
+        if self.cache is not None:
+            key = self.cache.key(
+                query, database, dictionary, "query", one_field, limit == 1
+            )
+            result = self.cache.get(key)
+            if result is not _MISSING:
+                return result
+
+        if limit == 1:
+            row = await self._fetch(query, fetch_one=True, dictionary=dictionary)
+            result = row[0] if isinstance(row, tuple) and one_field else row
+        else:
+            result = [
+                row[0] if (one_field and not isinstance(row, dict)) else row
+                for row in await self._fetch(query, dictionary=dictionary)
+            ]
+
+        if self.cache is not None and key is not None:
+            self.cache.set(key, _query_tables(query, database), result)
+        return result
+
+    async def chunk(  # type: ignore[override]
+        self,
+        query: Query | str | None = None,
+        size: int | None = None,
+        *args: Any,
+        **kwargs: Any,
+    ) -> AsyncIterator[list[dict[str, Any]] | list[tuple[Any, ...]]]:
+        """Returns an async generator for downloading a table in chunks.
+
+        Example::
+            sql = AsyncMySQLClient("real_estate.real_estate")
+            async for rows in sql.chunk():
+                for row in rows:
+                    print(row)
+        """
+        select_fields = kwargs.pop("select_fields", None)
+        order_by = kwargs.pop("order_by", None)
+        fieldnames = kwargs.pop("fieldnames", None)
+        if size is None:
+            size = kwargs.pop("chunk_size", 10_000)
+        elif size <= 0:
+            raise MySQLClientError("Chunk size must be > 0")
+        if not query:
+            query = self.build(
+                *args,
+                select_fields=select_fields,
+                order_by=order_by,
+                **kwargs,
+            )
+
+        pool = await self.create_pool()
+        async with pool.acquire() as cnx:
+            async with cnx.cursor() as cursor:
+                await cursor.execute(
+                    self._session_variables_query(maximum_timeouts=True)
+                )
+            try:
+                cursor_class = self._cursor_class(
+                    unbuffered=True, dictionary=fieldnames
+                )
+                async with cnx.cursor(cursor_class) as cursor:
+                    try:
+                        await cursor.execute(query)
+                    except MySQLError as e:
+                        raise MySQLClientError(query) from e
+                    while True:
+                        data = await cursor.fetchmany(size)
+                        if not data:
+                            break
+                        yield data
+            finally:
+                async with cnx.cursor() as cursor:
+                    await cursor.execute(self._session_variables_query())
+
+    async def iter(  # type: ignore[override]
+        self,
+        query: Query | str | None = None,
+        *args: Any,
+        **kwargs: Any,
+    ) -> AsyncIterator[dict[str, Any] | tuple[Any, ...]]:
+        """Returns an async generator for retrieving query data row by row.
+
+        Example::
+            sql = AsyncMySQLClient()
+            query = sql.build(
+                table="real_estate.real_estate",
+                provincie="Noord-Holland",
+                select_fields=['bag_nummeraanduidingid', 'plaatsnaam']
+            )
+            async for row in sql.iter(query=query):
+                print(row)
+        """
+        kwargs.setdefault("fieldnames", True)
+        size = kwargs.pop("chunk_size", 1_000)
+        async for rows in self.chunk(query, size, *args, **kwargs):
+            for row in rows:
+                yield row
+
+    async def insert(  # type: ignore[override]
+        self,
+        table: str | None = None,
+        data: Sequence[dict[str, Any] | list[Any] | tuple[Any, ...]] | None = None,
+        ignore: bool = False,
+        _limit: int = 10_000,
+        fields: list[str] | None = None,
+    ) -> int:
+        """Insert a data array into a SQL table.
+
+        The data is split into chunks, which are sent as multi-row INSERT
+        statements. Unlike :meth:`MySQLClient.insert`, field definitions
+        are not altered on errors.
+        """
+        if not data or not data[0]:
+            raise MySQLClientError("No data provided.")
+        if not table:
+            if not self.table_name:
+                raise MySQLClientError("Provide a table name.")
+            table = self.table_name
+        database = self.database
+        if "." in table:
+            database, table = table.split(".")
+        if fields is None and isinstance(data[0], dict):
+            fields = list(data[0].keys())
+        fields_str = f"({', '.join(f'`{f}`' for f in fields)})" if fields else ""
+        query = Query(
+            f"INSERT {'IGNORE' if ignore else ''} INTO "
+            f"{database}.{table} {fields_str} VALUES "
+            f"({', '.join(['%s'] * len(data[0]))})"
+        )
+        pool = await self.create_pool()
+        async with pool.acquire() as cnx, cnx.cursor() as cursor:
+            for offset in range(0, len(data), _limit):
+                chunk = [
+                    list(d.values()) if isinstance(d, dict) else d
+                    for d in data[offset : offset + _limit]
+                ]
+                try:
+                    await cursor.executemany(query, chunk)
+                except MySQLError as e:
+                    raise MySQLClientError(query) from e
+        if self.cache is not None:
+            self.cache.invalidate(f"{database}.{table}")
+        return len(data)
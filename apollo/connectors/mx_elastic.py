@@ -2,15 +2,32 @@
 
 from __future__ import annotations
 
-__all__ = ("ESClient",)
-
-from collections import defaultdict
-from collections.abc import Sequence
+__all__ = (
+    "BulkResult",
+    "ESClient",
+    "PointInTimeIterator",
+)
+
+import gzip
+import json
+import os
+import pickle
+import re
+from collections import defaultdict, namedtuple
+from collections.abc import Callable, Generator, Iterable, Sequence
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import suppress
+from functools import partial, reduce
 from logging import debug
-from typing import Any, Iterator
+from pathlib import Path
+from queue import Empty, Full, Queue
+from threading import Event, Lock
+from time import sleep
+from typing import TYPE_CHECKING, Any, Iterator
 
 from elasticsearch.client import Elasticsearch
 from elasticsearch.exceptions import ElasticsearchException, TransportError
+from elasticsearch.transport import Transport
 from urllib3.exceptions import HTTPWarning
 
 from ..env import envfile, getenv
@@ -18,6 +35,9 @@ from ..exceptions import ESClientError
 from ..handlers import tqdm
 from ..secrets import get_secret
 
+if TYPE_CHECKING:
+    from ..spatial import SpatialIndex
+
 # Globals
 _config = {
     "timeout": 300,
@@ -33,6 +53,205 @@ _hosts = {
 }
 _port = int(getenv("MX_ELASTIC_PORT", 9200))
 
+_transports: dict[str, Transport] = {}
+_transports_lock = Lock()
+_transports_pid = os.getpid()
+
+BulkResult = namedtuple("BulkResult", ("success", "errors"))
+
+_units = {
+    **dict.fromkeys(("", "m", "meters"), 1.0),
+    **dict.fromkeys(("km", "kilometers"), 1_000.0),
+    **dict.fromkeys(("cm", "centimeters"), 0.01),
+    **dict.fromkeys(("mm", "millimeters"), 0.001),
+    **dict.fromkeys(("mi", "miles"), 1_609.344),
+    **dict.fromkeys(("yd", "yards"), 0.9144),
+    **dict.fromkeys(("ft", "feet"), 0.3048),
+    **dict.fromkeys(("in", "inch"), 0.0254),
+    **dict.fromkeys(("NM", "nmi", "nauticalmiles"), 1_852.0),
+}
+
+
+def _host_config(
+    es_index: str | None,
+    kwargs: dict[str, Any],
+) -> tuple[str, int, dict[str, Any]]:
+    """Select the host and port for an index, and the client configuration.
+
+    Pops the `local`, `host` and `dev` keyword arguments.
+    """
+    local = kwargs.pop("local", False)
+    host = kwargs.pop("host", None)
+    dev = kwargs.pop("dev", True)
+    config = {**_config}
+    if local or host == "localhost":
+        del config["http_auth"]
+        return "localhost", 9200, config
+    if es_index and not host:
+        if es_index.startswith("cdqc"):
+            envv = _hosts["cdqc"]
+        elif es_index.startswith("production"):
+            envv = _hosts["prod"]
+        elif es_index.startswith("addressvalidation"):
+            envv = _hosts["address"]
+        else:
+            envv = _hosts["dev"]
+    elif host == "dev" and es_index and es_index.startswith("addressvalidation"):
+        envv = _hosts["address_dev"]
+    elif host:
+        envv = _hosts.get(host, "")
+    else:
+        if dev:
+            if es_index and es_index.startswith("addressvalidation"):
+                envv = _hosts["address_dev"]
+            else:
+                envv = _hosts["dev"]
+        else:
+            envv = _hosts["prod"]
+    hostname = getenv(envv, "")
+    if not hostname:
+        raise ESClientError(
+            f"Make sure a host is configured for variable"
+            f" name '{envv}' in file '{envfile}'"
+        )
+    if not _config["http_auth"]:
+        _config["http_auth"] = get_secret("MX_ELASTIC")  # noqa
+    config["http_auth"] = _config["http_auth"]
+    return hostname, _port, config
+
+
+def _shared_transport(hosts: list[dict[str, Any]], **kwargs: Any) -> Transport:
+    """Return the process-wide transport for these hosts and settings.
+
+    Used as `transport_class` for :class:`ESClient`, so that all clients
+    for the same server share one connection pool. After a fork, the
+    child process creates its own transports, and clients look up theirs
+    again (see :attr:`ESClient.transport`).
+    """
+    global _transports_pid
+    key = json.dumps([hosts, sorted(kwargs.items())], default=repr)
+    with _transports_lock:
+        if _transports_pid != os.getpid():
+            _transports.clear()
+            _transports_pid = os.getpid()
+        transport = _transports.get(key)
+        if transport is None:
+            transport = _transports[key] = Transport(hosts, **kwargs)
+    return transport
+
+
+def _address_fields(es_index: str) -> tuple[str, str]:
+    """Return the address ID field and the coordinates field of an index."""
+    if "realestate.realestate" in es_index:
+        return "avmData.locationData.address_id", "geometry"
+    elif "real_estate" in es_index:
+        return "address.identification.addressId", "geometry"
+    elif "addressvalidation" in es_index:
+        return "fullAddressLine", "details.geometry.coordinates"
+    raise NotImplementedError(f"{es_index}")
+
+
+def _address_query(es_index: str, address_id: str) -> tuple[dict[str, Any], str]:
+    """Return the query and `_source` field to look up an address in an index."""
+    field, source = _address_fields(es_index)
+    if "addressvalidation" in es_index:
+        return {"query": {"bool": {"must": {"match": {field: address_id}}}}}, source
+    return {"query": {"match": {f"{field}.keyword": address_id}}}, source
+
+
+def _address_location(es_index: str, doc: dict[str, Any]) -> tuple[float, float]:
+    """Return the latitude-longitude pair of a document found by `_address_query`."""
+    if "addressvalidation" in es_index:
+        longitude, latitude = doc["details"]["geometry"]["coordinates"][:2]
+        return latitude, longitude
+    return doc["geometry"]["latitude"], doc["geometry"]["longitude"]
+
+
+def _lat_lon(
+    location: tuple[float, float] | list[float] | dict[str, float] | None,
+) -> tuple[float, float]:
+    """Return a latitude-longitude pair from a tuple, list, or dict."""
+    if isinstance(location, dict):
+        latitude, longitude = location.values()
+    elif isinstance(location, Sequence):
+        latitude, longitude = location
+    else:
+        raise ESClientError(type(location))
+    return latitude, longitude
+
+
+def _meters(distance: str) -> float:
+    """Convert an Elasticsearch distance, such as "42km", to meters."""
+    match = re.fullmatch(r"\s*(\d+(?:\.\d*)?)\s*([a-zA-Z]*)\s*", distance)
+    if not match or match.group(2) not in _units:
+        raise ESClientError(f"Distance not recognized: {distance}")
+    return float(match.group(1)) * _units[match.group(2)]
+
+
+def _geo_distance_query(
+    es_index: str,
+    location: tuple[float, float] | list[float] | dict[str, float] | None,
+    distance: str,
+) -> dict[str, Any]:
+    """Return the query for documents within distance of a location."""
+    location = dict(zip(("latitude", "longitude"), _lat_lon(location)))
+
+    point: dict[str, float] | list[float]
+    if "realestate.realestate" in es_index:
+        field = "geometry.geoPoint"
+        point = {"lat": location["latitude"], "lon": location["longitude"]}
+    elif "real_estate" in es_index:
+        field = "geometry.geoPoint.coordinates"
+        point = [location["longitude"], location["latitude"]]
+    elif "addressvalidation" in es_index:
+        field = "details.geometry.coordinates"
+        point = [location["longitude"], location["latitude"]]
+    else:
+        raise NotImplementedError(f"{es_index}")
+    return {
+        "query": {
+            "bool": {"filter": {"geo_distance": {"distance": distance, field: point}}}
+        },
+        "sort": [{"_geo_distance": {field: point, "order": "asc"}}],
+    }
+
+
+def _simple_query(
+    field: str | None,
+    value: Any,
+    size: int,
+    kwargs: dict[str, Any],
+) -> tuple[dict[str, Any] | None, dict[str, Any]]:
+    """Build the query and `find` keyword arguments for `ESClient.query`."""
+    find_kwargs = {
+        "size": kwargs.pop("size", size),
+        "sort": kwargs.pop("sort", None),
+        "track_scores": kwargs.pop("track_scores", None),
+        "hits_only": kwargs.pop("hits_only", True),
+        "source_only": kwargs.pop("source_only", False),
+        "first_only": kwargs.pop("first_only", False),
+        "with_id": kwargs.pop("with_id", False),
+    }
+
+    if field and value:
+        q = {"query": {"bool": {"must": [{"match": {field: value}}]}}}
+        return q, find_kwargs
+    elif field or value:
+        raise ESClientError("Provide both field and value.")
+
+    args = {}
+    for k in kwargs:
+        if "_" in k and not k.startswith("_"):
+            args[k.replace("_", ".")] = kwargs[k]
+        else:
+            args[k] = kwargs[k]
+    if len(args) == 1:
+        return {"query": {"bool": {"must": {"match": args}}}}, find_kwargs
+    elif len(args) > 1:
+        q = {"query": {"bool": {"must": [{"match": {k: v}} for k, v in args.items()]}}}
+        return q, find_kwargs
+    return None, find_kwargs
+
 
 class ESClient(Elasticsearch):
     """Client for Matrixian's Elasticsearch databases.
@@ -45,13 +264,23 @@ class ESClient(Elasticsearch):
     Like `search`, but better.
 
     `geo_distance`: Find all real estate objects for a specific location.
+    `geo_distance_many` does so for many addresses or locations at once.
 
     `findall`: Used for Elasticsearch queries that return more than
     10k documents. Returns all results at once.
 
+    `streamall`: Like `findall`, but returns an iterator of documents.
+    `dumpall` writes these to a file instead, and `loadall` reads them.
+
     `scrollall`: Used for Elasticsearch queries that return more than
     10k documents. Returns an iterator of documents.
 
+    `scroll_parallel`: Like `scrollall`, but reads several slices of the
+    scroll concurrently. Returns an iterator of chunks of documents.
+
+    `scroll_pit`: Like `scrollall`, but uses a point in time and
+    search_after instead of a scroll context. Resumable.
+
     `query`: Perform a simple Elasticsearch query, and return the hits.
 
     `total`: The total number of documents within the index.
@@ -61,6 +290,10 @@ class ESClient(Elasticsearch):
     `distinct_count`: Provide a count of distinct values in a certain field.
 
     `distinct_values`: Return distinct values in a certain field.
+    `iter_distinct_values` returns them as an iterator.
+
+    `bulk_load`: Index documents from any iterable using parallel bulk
+    requests.
     """
 
     def __init__(self, es_index: str | None = None, **kwargs: Any):
@@ -79,51 +312,27 @@ class ESClient(Elasticsearch):
         `dev`: boolean, only if no :param es_index: is provided (default True)
         `size`: int, default results size (default 20, max 10000)
         `retry_on_timeout`: boolean (default True)
+        `maxsize`: int, connection pool size per host (default 32)
+        `http_compress`: boolean, gzip requests and accept gzipped
+            responses (default False)
+        `shared`: boolean, share one connection pool with all other
+            clients for the same server in this process (default True)
+        `spatial_index`: apollo.spatial.SpatialIndex, used by `geo_distance`
+            with `ids_only=True` instead of querying Elasticsearch
         """
-        local = kwargs.pop("local", False)
-        host = kwargs.pop("host", None)
-        dev = kwargs.pop("dev", True)
-        if local or host == "localhost":
-            self._host, self._port = "localhost", 9200
-            del _config["http_auth"]
-        else:
-            if es_index and not host:
-                if es_index.startswith("cdqc"):
-                    envv = _hosts["cdqc"]
-                elif es_index.startswith("production"):
-                    envv = _hosts["prod"]
-                elif es_index.startswith("addressvalidation"):
-                    envv = _hosts["address"]
-                else:
-                    envv = _hosts["dev"]
-            elif (
-                host == "dev" and es_index and es_index.startswith("addressvalidation")
-            ):
-                envv = _hosts["address_dev"]
-            elif host:
-                envv = _hosts.get(host, "")
-            else:
-                if dev:
-                    if es_index and es_index.startswith("addressvalidation"):
-                        envv = _hosts["address_dev"]
-                    else:
-                        envv = _hosts["dev"]
-                else:
-                    envv = _hosts["prod"]
-            self._host, self._port = getenv(envv, ""), _port
-            if not self._host:
-                raise ESClientError(
-                    f"Make sure a host is configured for variable"
-                    f" name '{envv}' in file '{envfile}'"
-                )
-            if not _config["http_auth"]:
-                _config["http_auth"] = get_secret("MX_ELASTIC")  # noqa
+        self._host, self._port, config = _host_config(es_index, kwargs)
         hosts = [{"host": self._host, "port": self._port}]
-        _config["maxsize"] = kwargs.pop("maxsize", 32)
-        super().__init__(hosts, **_config)  # type: ignore
+        config["maxsize"] = kwargs.pop("maxsize", 32)
+        config["http_compress"] = kwargs.pop("http_compress", False)
+        self.shared = kwargs.pop("shared", True)
+        self._shared_args = hosts, {**config}
+        if self.shared:
+            config["transport_class"] = _shared_transport
+        super().__init__(hosts, **config)
         self.es_index = es_index
         self.size = kwargs.pop("size", 20)
         self.retry_on_timeout = kwargs.pop("retry_on_timeout", True)
+        self.spatial_index: SpatialIndex | None = kwargs.pop("spatial_index", None)
 
     def __repr__(self) -> str:
         return (
@@ -134,15 +343,38 @@ class ESClient(Elasticsearch):
     def __str__(self) -> str:
         return f"http://{self._host}:{self._port}/{self.es_index}/_stats"  # noqa
 
+    @property
+    def transport(self) -> Transport:
+        """The transport of this client.
+
+        A shared transport is looked up again after a fork, so that a
+        client created in a parent process uses the child's transport.
+        """
+        if self.shared and self._transport_pid != os.getpid():
+            hosts, config = self._shared_args
+            self.transport = _shared_transport(hosts, **config)
+        return self._transport
+
+    @transport.setter
+    def transport(self, transport: Transport) -> None:
+        self._transport, self._transport_pid = transport, os.getpid()
+
+    def close(self) -> None:
+        """Close the transport, unless it is shared with other clients."""
+        if not self.shared:
+            super().close()
+
     def find(
         self,
-        query: dict[str, Any] | None = None,
+        query: dict[str, Any] | list[dict[str, Any]] | None = None,
         **kwargs: Any,
-    ) -> dict[str, Any] | list[dict[str, Any]]:
+    ) -> dict[str, Any] | list[Any]:
         """Perform an Elasticsearch query, and return the hits. Like `search`, but better.
 
         Uses .search() method on class attribute .es_index with size=10_000. Will try again on errors.
         Accepts a single query (dict) or multiple (list[dict]).
+        Multiple queries are sent in batches of `batch_size` (default: 100)
+        using the _msearch API, with `threads` (default: 4) batches in flight.
         Returns:
             query: dict and
                 not hits_only -> dict
@@ -155,27 +387,21 @@ class ESClient(Elasticsearch):
                 source_only -> list[list[dict]]
                 first_only -> list[dict]
         """
-        hits_only = kwargs.pop("hits_only", True)
-        source_only = kwargs.pop("source_only", False)
-        first_only = kwargs.pop("first_only", False)
-        with_id = kwargs.pop("with_id", False)
+        shape = self._shaper(kwargs)
 
         if "index" in kwargs:
             index = kwargs.pop("index")
         else:
             index = self.es_index
-        if not query:
+        if isinstance(query, list):
+            if not query:
+                return []
+        elif not query:
             size = kwargs.pop("size", 1)
             result = self.search(index=index, size=size, body={}, **kwargs)
             return result
-        if first_only and not source_only:
-            source_only = True
-        if source_only and not hits_only:
-            debug("Returning hits only if any([source_only, first_only])")
-            hits_only = True
-        if with_id:
-            debug("Returning hits only if with_id is True, with _source flattened")
-            hits_only, source_only, first_only = True, False, False
+        if isinstance(query, list):
+            return self._find_many(query, index, shape, **kwargs)
         if "size" in query:
             size = query.pop("size")
         else:
@@ -189,6 +415,94 @@ class ESClient(Elasticsearch):
                     raise
             except ElasticsearchException as e:
                 raise ESClientError(query) from e
+        return shape(result, size)
+
+    def _find_many(
+        self,
+        queries: list[dict[str, Any]],
+        index: str,
+        shape: Callable[[dict[str, Any], int], Any],
+        **kwargs: Any,
+    ) -> list[Any]:
+        """Perform multiple queries in batches using the _msearch API."""
+        batch_size = kwargs.pop("batch_size", 100)
+        threads = kwargs.pop("threads", 4)
+        default_size = kwargs.pop("size", self.size)
+        source = kwargs.pop("_source", None)
+
+        bodies = []
+        for query in queries:
+            body = {**query}
+            body["size"] = body.get("size", default_size)
+            if source is not None:
+                body.setdefault("_source", source)
+            bodies.append(body)
+
+        def msearch(offset: int) -> list[Any]:
+            batch = bodies[offset : offset + batch_size]
+            lines: list[dict[str, Any]] = []
+            for body in batch:
+                lines.extend(({"index": index}, body))
+            while True:
+                try:
+                    responses = self.msearch(body=lines, **kwargs)["responses"]
+                    break
+                except (OSError, HTTPWarning, TransportError) as e:
+                    if not (self.retry_on_timeout and "timeout" in f"{e}".lower()):
+                        raise
+                except ElasticsearchException as e:
+                    raise ESClientError(batch) from e
+            results = []
+            for body, response in zip(batch, responses):
+                if "error" in response:
+                    raise ESClientError(f"{response['error']} for query {body}")
+                results.append(shape(response, body["size"]))
+            return results
+
+        offsets = range(0, len(bodies), batch_size)
+        if len(offsets) == 1:
+            return msearch(0)
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            return [
+                result
+                for results in executor.map(msearch, offsets)
+                for result in results
+            ]
+
+    @classmethod
+    def _shaper(cls, kwargs: dict[str, Any]) -> Callable[[dict[str, Any], int], Any]:
+        """Pop the result shaping options of `find` from kwargs."""
+        hits_only = kwargs.pop("hits_only", True)
+        source_only = kwargs.pop("source_only", False)
+        first_only = kwargs.pop("first_only", False)
+        with_id = kwargs.pop("with_id", False)
+        if first_only and not source_only:
+            source_only = True
+        if source_only and not hits_only:
+            debug("Returning hits only if any([source_only, first_only])")
+            hits_only = True
+        if with_id:
+            debug("Returning hits only if with_id is True, with _source flattened")
+            hits_only, source_only, first_only = True, False, False
+        return partial(
+            cls._shape,
+            hits_only=hits_only,
+            source_only=source_only,
+            first_only=first_only,
+            with_id=with_id,
+        )
+
+    @staticmethod
+    def _shape(
+        result: dict[str, Any],
+        size: int,
+        *,
+        hits_only: bool,
+        source_only: bool,
+        first_only: bool,
+        with_id: bool,
+    ) -> Any:
+        """Shape a search response as requested in `find`."""
         if size != 0:
             if hits_only:
                 result = result["hits"]["hits"]
@@ -207,7 +521,7 @@ class ESClient(Elasticsearch):
         location: tuple[float, float] | list[float] | dict[str, float] | None = None,
         distance: str = "10m",
         **kwargs: Any,
-    ) -> dict[str, Any] | list[dict[str, Any]]:
+    ) -> dict[str, Any] | list[Any]:
         """Find all real estate objects or addresses within distance of
         address_id or location.
 
@@ -216,6 +530,12 @@ class ESClient(Elasticsearch):
         :param location: A tuple, list, or dict of
             a latitude-longitude pair.
         :param distance: Distance (in various units) in format "42km".
+        :param kwargs: Passed on to `find` if `size` is given, otherwise to
+            `findall`, or to `streamall` if `stream=True`. Use `max_results`
+            to guard against accidentally large radiuses. Use
+            `ids_only=True` to only return the address IDs, sorted by
+            distance; these are computed in-process if this client has a
+            `spatial_index` (see `apollo.spatial.SpatialIndex`).
         :return: list of results that are :param distance: away.
 
         Example::
@@ -230,149 +550,144 @@ class ESClient(Elasticsearch):
             raise ESClientError("Provide either an address_id or a location")
         assert isinstance(self.es_index, str)
 
+        if kwargs.get("ids_only"):
+            return self.geo_distance_many(
+                address_ids=None if address_id is None else [address_id],
+                locations=None if location is None else [location],
+                distance=distance,
+                **kwargs,
+            )[0]
+
         if address_id:
-            query: dict[str, Any]
-            if "realestate.realestate" in self.es_index:
-                query = {
-                    "query": {
-                        "match": {"avmData.locationData.address_id.keyword": address_id}
-                    }
-                }
-                result = self.find(query=query, size=1, _source="geometry")
-                assert isinstance(result, dict)
-                location = (
-                    result["geometry"]["latitude"],
-                    result["geometry"]["longitude"],
-                )
-            elif "real_estate" in self.es_index:
-                query = {
-                    "query": {
-                        "match": {
-                            "address.identification.addressId.keyword": address_id
-                        }
-                    }
-                }
-                result = self.find(query=query, size=1, _source="geometry")
-                assert isinstance(result, dict)
-                location = (
-                    result["geometry"]["latitude"],
-                    result["geometry"]["longitude"],
-                )
-            elif "addressvalidation" in self.es_index:
-                query = {
-                    "query": {
-                        "bool": {"must": {"match": {"fullAddressLine": address_id}}}
-                    }
-                }
-                result = self.find(
-                    query=query,
-                    size=1,
-                    _source="details.geometry.coordinates",
-                )
-                assert isinstance(result, dict)
-                location = (
-                    result["details"]["geometry"]["coordinates"][1],
-                    result["details"]["geometry"]["coordinates"][0],
-                )
-            else:
-                raise NotImplementedError(f"{self.es_index}")
+            location = self._address_locations([address_id])[0]
+            if location is None:
+                raise ESClientError(f"Address not found: {address_id}")
 
-        if isinstance(location, dict):
-            location = dict(zip(("latitude", "longitude"), location.values()))
-        elif isinstance(location, Sequence):
-            location = dict(zip(("latitude", "longitude"), location))
-        else:
-            raise ESClientError(type(location))
-
-        if "realestate.realestate" in self.es_index:
-            query = {
-                "query": {
-                    "bool": {
-                        "filter": {
-                            "geo_distance": {
-                                "distance": distance,
-                                "geometry.geoPoint": {
-                                    "lat": location["latitude"],
-                                    "lon": location["longitude"],
-                                },
-                            }
-                        }
-                    }
-                },
-                "sort": [
-                    {
-                        "_geo_distance": {
-                            "geometry.geoPoint": {
-                                "lat": location["latitude"],
-                                "lon": location["longitude"],
-                            },
-                            "order": "asc",
-                        }
-                    }
-                ],
-            }
-        elif "real_estate" in self.es_index:
-            query = {
-                "query": {
-                    "bool": {
-                        "filter": {
-                            "geo_distance": {
-                                "distance": distance,
-                                "geometry.geoPoint.coordinates": [
-                                    location["longitude"],
-                                    location["latitude"],
-                                ],
-                            }
-                        }
-                    }
-                },
-                "sort": [
-                    {
-                        "_geo_distance": {
-                            "geometry.geoPoint.coordinates": [
-                                location["longitude"],
-                                location["latitude"],
-                            ],
-                            "order": "asc",
-                        }
-                    }
-                ],
-            }
-        elif "addressvalidation" in self.es_index:
-            query = {
-                "query": {
-                    "bool": {
-                        "filter": {
-                            "geo_distance": {
-                                "distance": distance,
-                                "details.geometry.coordinates": [
-                                    location["longitude"],
-                                    location["latitude"],
-                                ],
-                            }
-                        }
-                    }
-                },
-                "sort": [
-                    {
-                        "_geo_distance": {
-                            "details.geometry.coordinates": [
-                                location["longitude"],
-                                location["latitude"],
-                            ],
-                            "order": "asc",
-                        }
-                    }
-                ],
-            }
-        else:
-            raise NotImplementedError(f"{self.es_index}")
+        query = _geo_distance_query(self.es_index, location, distance)
 
         if "size" in kwargs:
             return self.find(query=query, **kwargs)
 
+        if kwargs.pop("stream", False):
+            return self.streamall(query=query, **kwargs)  # type: ignore
         return self.findall(query=query, **kwargs)
 
+    def geo_distance_many(
+        self,
+        *,
+        address_ids: Sequence[str] | None = None,
+        locations: Sequence[tuple[float, float] | list[float] | dict[str, float] | None]
+        | None = None,
+        distance: str = "10m",
+        coordinates: SpatialIndex
+        | tuple[Sequence[str], Sequence[float], Sequence[float]]
+        | None = None,
+        threads: int = 8,
+        **kwargs: Any,
+    ) -> list[list[Any]]:
+        """Like `geo_distance`, but for many addresses or locations at once.
+
+        Returns a list of results for every address or location, in the
+        same order; every result is a list, also with `size=1`. An address
+        that can't be found gets an empty result.
+
+        All addresses are resolved to coordinates using `_msearch` batches.
+        The distance queries are then sent as `_msearch` batches as well
+        if `size` is given, or else run in :param threads: threads using
+        `findall`. Other keyword arguments are passed on to these.
+
+        Use `ids_only=True` to only return the address IDs within distance,
+        sorted by distance. If this client has a `spatial_index`, or if
+        :param coordinates: is provided (as a SpatialIndex or as a table of
+        address IDs, latitudes and longitudes), these are then computed
+        in-process, and Elasticsearch is only used to look up addresses
+        that are not in the index. `size` then limits the number of
+        nearest address IDs.
+
+        Example::
+            es = ESClient("dev_realestate.real_estate")
+            results = es.geo_distance_many(
+                address_ids=["1071XB 71 B", "1014AK 8"], distance="100m")
+            for address_id, docs in zip(address_ids, results):
+                print(address_id, len(docs))
+        """
+        if (address_ids is None) == (locations is None):
+            raise ESClientError("Provide either address_ids or locations")
+        assert isinstance(self.es_index, str)
+
+        ids_only = kwargs.pop("ids_only", False) or coordinates is not None
+        if isinstance(coordinates, tuple):
+            from ..spatial import SpatialIndex
+
+            coordinates = SpatialIndex(*coordinates)
+        elif coordinates is None and ids_only:
+            coordinates = self.spatial_index
+
+        if address_ids is not None:
+            locations = self._address_locations(address_ids, coordinates, threads)
+        assert locations is not None
+
+        if coordinates is not None:
+            meters = _meters(distance)
+            size = kwargs.get("size")
+            return [
+                []
+                if location is None
+                else coordinates.radius(*_lat_lon(location), meters)[0][:size].tolist()
+                for location in locations
+            ]
+
+        if ids_only:
+            id_field, _ = _address_fields(self.es_index)
+            kwargs.update(_source=id_field, source_only=True)
+        queries = [
+            _geo_distance_query(self.es_index, location, distance)
+            for location in locations
+            if location is not None
+        ]
+        if "size" in kwargs:
+            found = self.find(queries, threads=threads, **kwargs)
+            # With size=1, find returns the hit itself instead of a list
+            found = [[docs] if isinstance(docs, dict) else docs for docs in found]
+        else:
+            with ThreadPoolExecutor(max_workers=threads) as executor:
+                found = list(executor.map(partial(self.findall, **kwargs), queries))
+        if ids_only:
+            found = [
+                [reduce(dict.__getitem__, id_field.split("."), doc) for doc in docs]
+                for docs in found
+            ]
+        results = iter(found)
+        return [[] if location is None else next(results) for location in locations]
+
+    def _address_locations(
+        self,
+        address_ids: Sequence[str],
+        spatial_index: SpatialIndex | None = None,
+        threads: int = 4,
+    ) -> list[tuple[float, float] | None]:
+        """Look up the coordinates of addresses, first in a spatial index,
+        and then in this index using `_msearch` batches."""
+        assert isinstance(self.es_index, str)
+        locations: list[tuple[float, float] | None]
+        if spatial_index is None:
+            locations = [None] * len(address_ids)
+        else:
+            locations = spatial_index.locations(address_ids)
+        missing = [n for n, location in enumerate(locations) if location is None]
+        if missing:
+            queries, source = [], None
+            for n in missing:
+                query, source = _address_query(self.es_index, address_ids[n])
+                queries.append(query)
+            docs = self.find(
+                queries, size=1, first_only=True, _source=source, threads=threads
+            )
+            for n, doc in zip(missing, docs):
+                if doc:
+                    locations[n] = _address_location(self.es_index, doc)
+        return locations
+
     def findall(
         self,
         query: dict[str, Any],
@@ -384,7 +699,9 @@ class ESClient(Elasticsearch):
 
         :param query: dict[str, Any]
         :param index: str
-        :param kwargs: scroll: str
+        :param kwargs: scroll: str, slices: int (read a sliced scroll
+            in parallel, see `scroll_parallel`), max_results: int (raise
+            instead of loading more documents than this)
         :return: list[dict[Any, Any]]
         """
 
@@ -398,9 +715,29 @@ class ESClient(Elasticsearch):
 
         scroll = kwargs.pop("scroll", "10m")
         size = kwargs.pop("size", 10_000)
+        slices = kwargs.pop("slices", 1)
+        max_results = kwargs.pop("max_results", None)
 
         if not index:
             index = self.es_index
+        if max_results is not None:
+            self._check_max_results(query, index, max_results)
+
+        if slices > 1 and hits_only:
+            return [
+                doc
+                for chunk in self.scroll_parallel(
+                    query,
+                    slices=slices,
+                    index=index,
+                    scroll=scroll,
+                    chunk_size=size,
+                    source_only=source_only,
+                    with_id=with_id,
+                    **kwargs,
+                )
+                for doc in chunk
+            ]
 
         data = self.search(
             index=index,
@@ -415,11 +752,15 @@ class ESClient(Elasticsearch):
         results = data["hits"]["hits"]
 
         # We scroll over the results until nothing is returned
-        while scroll_size > 0:
-            data = self.scroll(scroll_id=sid, scroll=scroll)
-            results.extend(data["hits"]["hits"])
-            sid = data["_scroll_id"]
-            scroll_size = len(data["hits"]["hits"])
+        try:
+            while scroll_size > 0:
+                data = self.scroll(scroll_id=sid, scroll=scroll)
+                results.extend(data["hits"]["hits"])
+                sid = data["_scroll_id"]
+                scroll_size = len(data["hits"]["hits"])
+        finally:
+            with suppress(ElasticsearchException):
+                self.clear_scroll(scroll_id=sid)
 
         if hits_only:
             data = results
@@ -433,6 +774,118 @@ class ESClient(Elasticsearch):
         assert isinstance(data, list)
         return data
 
+    def _check_max_results(
+        self,
+        query: dict[str, Any] | None,
+        index: str | None,
+        max_results: int,
+    ) -> None:
+        count_query = {"query": query["query"]} if query and "query" in query else None
+        count = self.count(body=count_query, index=index)
+        if count > max_results:
+            raise ESClientError(
+                f"Query returns {count} documents, which is more than"
+                f" max_results={max_results}: {query}"
+            )
+
+    def streamall(
+        self,
+        query: dict[str, Any] | None = None,
+        index: str | None = None,
+        **kwargs: Any,
+    ) -> Iterator[dict[str, Any]]:
+        """Used for Elasticsearch queries that return more than 10k documents.
+        Returns an iterator of documents, keeping only one page in memory.
+
+        This is the streaming counterpart of `findall`, and uses
+        `scroll_pit`. Provide `fields` (a field name or a list of them) to
+        only retrieve those fields from `_source`. Provide `max_results` to
+        raise an ESClientError instead of returning more documents.
+        Also accepts the `source_only`, `with_id`, `chunk_size` and
+        `use_tqdm` options of `scrollall`.
+
+        Usage::
+            es = ESClient("dev_realestate.real_estate")
+            docs = es.streamall(q, fields=["address"], max_results=100_000)
+            for doc in docs:
+                pass
+        """
+        fields = kwargs.pop("fields", None)
+        max_results = kwargs.pop("max_results", None)
+        if not index:
+            index = self.es_index
+        if max_results is not None:
+            self._check_max_results(query, index, max_results)
+        with self.scroll_pit(query, index, field=fields, **kwargs) as docs:
+            for n, doc in enumerate(docs, start=1):
+                if max_results is not None and n > max_results:
+                    raise ESClientError(
+                        f"Query returned more than max_results={max_results}: {query}"
+                    )
+                yield doc
+
+    def dumpall(
+        self,
+        query: dict[str, Any] | None = None,
+        path: Path | str = "dump.jsonl",
+        index: str | None = None,
+        **kwargs: Any,
+    ) -> int:
+        """Write all documents for a query to a file, instead of to memory.
+
+        The file format depends on the suffix of :param path: ".jsonl" for
+        JSON lines, ".jsonl.gz" for gzipped JSON lines, or ".pickle" for a
+        compact binary stream of pickled chunks. Keyword arguments are
+        passed on to `streamall`. Read the file back using `loadall`.
+
+        Returns the number of written documents.
+
+        Usage::
+            es = ESClient("dev_realestate.real_estate")
+            n = es.dumpall(q, "real_estate.jsonl.gz", source_only=True)
+            for doc in es.loadall("real_estate.jsonl.gz"):
+                pass
+        """
+        path = Path(path)
+        docs = self.streamall(query, index, **kwargs)
+        n = 0
+        if path.suffix == ".pickle":
+            chunk_size = kwargs.get("chunk_size", 1_000)
+            with open(path, "wb") as f:
+                chunk = []
+                for doc in docs:
+                    chunk.append(doc)
+                    if len(chunk) == chunk_size:
+                        pickle.dump(chunk, f, protocol=pickle.HIGHEST_PROTOCOL)
+                        n += len(chunk)
+                        chunk = []
+                if chunk:
+                    pickle.dump(chunk, f, protocol=pickle.HIGHEST_PROTOCOL)
+                    n += len(chunk)
+        else:
+            with (gzip.open if path.suffix == ".gz" else open)(path, "wt") as f:
+                for doc in docs:
+                    f.write(json.dumps(doc, default=str))
+                    f.write("\n")
+                    n += 1
+        return n
+
+    @staticmethod
+    def loadall(path: Path | str) -> Iterator[dict[str, Any]]:
+        """Read documents from a file written by `dumpall`."""
+        path = Path(path)
+        if path.suffix == ".pickle":
+            with open(path, "rb") as f:
+                while True:
+                    try:
+                        yield from pickle.load(f)
+                    except EOFError:
+                        break
+        else:
+            with (gzip.open if path.suffix == ".gz" else open)(path, "rt") as f:
+                for line in f:
+                    yield json.loads(line)
+
     def scrollall(
         self,
         query: dict[str, Any] | None = None,
@@ -492,22 +945,168 @@ class ESClient(Elasticsearch):
             **kwargs,
         )
         sid, scroll_size = data["_scroll_id"], len(data["hits"]["hits"])
-        if as_chunks:
-            yield _return(data)
-        else:
-            yield from _return(data)
-
-        # We scroll over the results until nothing is returned
-        while scroll_size > 0:
-            bar.update(scroll_size)
-            data = self.scroll(scroll_id=sid, scroll=scroll)
-            sid, scroll_size = data["_scroll_id"], len(data["hits"]["hits"])
+        try:
             if as_chunks:
                 yield _return(data)
             else:
                 yield from _return(data)
 
-        bar.close()
+            # We scroll over the results until nothing is returned
+            while scroll_size > 0:
+                bar.update(scroll_size)
+                data = self.scroll(scroll_id=sid, scroll=scroll)
+                sid, scroll_size = data["_scroll_id"], len(data["hits"]["hits"])
+                if as_chunks:
+                    yield _return(data)
+                else:
+                    yield from _return(data)
+        finally:
+            with suppress(ElasticsearchException):
+                self.clear_scroll(scroll_id=sid)
+            bar.close()
+
+    def scroll_parallel(
+        self,
+        query: dict[str, Any] | None = None,
+        slices: int = 4,
+        index: str | None = None,
+        **kwargs: Any,
+    ) -> Iterator[list[dict[str, Any]]]:
+        """Used for Elasticsearch queries that return more than 10k documents.
+        Returns an iterator of chunks of documents.
+
+        The scroll is split into :param slices: slices (see sliced scroll in
+        the Elasticsearch documentation), which are read concurrently in
+        threads. Chunks are yielded as they arrive; set `ordered=True` to
+        yield all chunks of the first slice first, then of the second, etc.
+        Scroll contexts are cleared when the iterator is exhausted or closed.
+
+        Usage::
+            es = ESClient("cdqc.person_data")
+            for chunk in es.scroll_parallel(slices=8, source_only=True):
+                for doc in chunk:
+                    pass
+        """
+        source_only = kwargs.pop("source_only", False)
+        with_id = kwargs.pop("with_id", False)
+        if with_id:
+            source_only = False
+        ordered = kwargs.pop("ordered", False)
+        field = kwargs.pop("field", None)
+        scroll = kwargs.pop("scroll", "10m")
+        chunk_size = min(kwargs.pop("chunk_size", 10_000), 10_000)
+        use_tqdm = kwargs.pop("use_tqdm", False)
+        if slices < 1:
+            raise ESClientError("Provide at least one slice.")
+        if not index:
+            index = self.es_index
+        bar = tqdm(
+            total=self.count(body=query, index=index) if use_tqdm else None,
+            disable=not use_tqdm,
+        )
+
+        queue: Queue[tuple[int, list[dict[str, Any]] | Exception | None]]
+        queue = Queue(maxsize=slices * 2)
+        stop = Event()
+
+        def put(item: tuple[int, list[dict[str, Any]] | Exception | None]) -> None:
+            while not stop.is_set():
+                with suppress(Full):
+                    queue.put(item, timeout=1)
+                    return
+
+        def read_slice(slice_id: int) -> None:
+            body = {**(query or {})}
+            if slices > 1:
+                body["slice"] = {"id": slice_id, "max": slices}
+            sid = None
+            try:
+                data = self.search(
+                    index=index,
+                    scroll=scroll,
+                    size=chunk_size,
+                    _source=field,
+                    body=body,
+                    **kwargs,
+                )
+                sid = data["_scroll_id"]
+                while data["hits"]["hits"] and not stop.is_set():
+                    put((slice_id, data["hits"]["hits"]))
+                    data = self.scroll(scroll_id=sid, scroll=scroll)
+                    sid = data["_scroll_id"]
+            except Exception as e:
+                put((slice_id, e))
+            finally:
+                if sid:
+                    with suppress(ElasticsearchException):
+                        self.clear_scroll(scroll_id=sid)
+                put((slice_id, None))
+
+        buffers: dict[int, list[list[dict[str, Any]]]] = defaultdict(list)
+        finished: set[int] = set()
+        current = 0
+        executor = ThreadPoolExecutor(max_workers=slices)
+        try:
+            for slice_id in range(slices):
+                executor.submit(read_slice, slice_id)
+            while len(finished) < slices:
+                try:
+                    slice_id, item = queue.get(timeout=1)
+                except Empty:
+                    continue
+                if item is None:
+                    finished.add(slice_id)
+                elif isinstance(item, Exception):
+                    raise ESClientError(query) from item
+                else:
+                    bar.update(len(item))
+                    if with_id:
+                        item = [{**d, **d.pop("_source")} for d in item]
+                    elif source_only:
+                        item = [d["_source"] for d in item]
+                    if not ordered:
+                        yield item
+                    else:
+                        buffers[slice_id].append(item)
+                while ordered and current < slices:
+                    yield from buffers.pop(current, [])
+                    if current not in finished:
+                        break
+                    current += 1
+        finally:
+            stop.set()
+            executor.shutdown(wait=True)
+            bar.close()
+
+    def scroll_pit(
+        self,
+        query: dict[str, Any] | None = None,
+        index: str | None = None,
+        **kwargs: Any,
+    ) -> PointInTimeIterator:
+        """Used for Elasticsearch queries that return more than 10k documents.
+        Returns an iterator of documents.
+
+        Instead of a scroll context, a point in time (PIT) is opened and
+        pages are requested using search_after. The PIT is closed when the
+        iterator is exhausted or closed, or when its `with` block exits.
+        Accepts the same `source_only`, `with_id`, `as_chunks`,
+        `chunk_size`, `field` and `use_tqdm` options as `scrollall`, and
+        `keep_alive` (default "1m") for the PIT.
+
+        The sort values of the last returned document are available as
+        :attr:`PointInTimeIterator.search_after`; pass them back as
+        `search_after` to resume. To resume in a new PIT, sort the query
+        on a unique field, since the default `_shard_doc` sort is only
+        valid within the same PIT.
+
+        Usage::
+            es = ESClient("cdqc.person_data")
+            with es.scroll_pit(q, source_only=True) as docs:
+                for doc in docs:
+                    pass
+        """
+        return PointInTimeIterator(self, query, index or self.es_index, **kwargs)
 
     def query(
         self,
@@ -531,41 +1130,8 @@ class ESClient(Elasticsearch):
             {"query": {"bool": {"must": [{"match": {"lastname": "Saalbrink"}},
                                          {"match": {"address.postalCode": "1014AK"}}]}}}
         """
-        find_kwargs = {
-            "size": kwargs.pop("size", self.size),
-            "sort": kwargs.pop("sort", None),
-            "track_scores": kwargs.pop("track_scores", None),
-            "hits_only": kwargs.pop("hits_only", True),
-            "source_only": kwargs.pop("source_only", False),
-            "first_only": kwargs.pop("first_only", False),
-            "with_id": kwargs.pop("with_id", False),
-        }
-        q: dict[str, Any]
-
-        if field and value:
-            q = {"query": {"bool": {"must": [{"match": {field: value}}]}}}
-            return self.find(q, **find_kwargs)
-        elif field or value:
-            raise ESClientError("Provide both field and value.")
-
-        args = {}
-        for k in kwargs:
-            if "_" in k and not k.startswith("_"):
-                args[k.replace("_", ".")] = kwargs[k]
-            else:
-                args[k] = kwargs[k]
-        if len(args) == 1:
-            q = {"query": {"bool": {"must": {"match": args}}}}
-            return self.find(q, **find_kwargs)
-        elif len(args) > 1:
-            q = {
-                "query": {
-                    "bool": {"must": [{"match": {k: v}} for k, v in args.items()]}
-                }
-            }
-            return self.find(q, **find_kwargs)
-        else:
-            return self.find(**find_kwargs)
+        q, find_kwargs = _simple_query(field, value, self.size, kwargs)
+        return self.find(q, **find_kwargs)
 
     @property
     def total(self) -> int:
@@ -590,99 +1156,177 @@ class ESClient(Elasticsearch):
         count = super().count(body=body, index=index, doc_type=doc_type, **kwargs)
         return count["count"]
 
-    def distinct_count(self, field: str, find: dict[str, Any] | None = None) -> int:
-        """Provide a count of distinct values in a certain field.
-
-        See:
-        https://www.elastic.co/guide/en/elasticsearch/reference/current
-        /search-aggregations-bucket-composite-aggregation.html
-        """
-
-        if not find:
-            find = {"match_all": {}}
-
+    def _aggregate(
+        self,
+        field: str,
+        find: dict[str, Any] | None,
+        agg: Callable[[str], dict[str, Any]],
+    ) -> tuple[dict[str, Any], str]:
+        """Perform aggregation `agg(field)` as "q", falling back to "field.keyword"."""
         while True:
-            query = {
-                "query": find,
-                "aggs": {
-                    field: {
-                        "composite": {
-                            "sources": [{field: {"terms": {"field": field}}}],
-                            "size": 10_000,
-                        }
-                    }
-                },
-            }
+            query = {"query": find or {"match_all": {}}, "aggs": {"q": agg(field)}}
             try:
                 result = self.find(query, size=0)
                 assert isinstance(result, dict)
-                break
+                return result["aggregations"]["q"], field
             except TransportError as e:
                 if "fielddata" in f"{e}" and field[-8:] != ".keyword":
                     field = f"{field}.keyword"
                 else:
                     raise ESClientError(query) from e
 
-        n_buckets = 0
+    def _composite_pages(
+        self,
+        field: str,
+        find: dict[str, Any] | None = None,
+    ) -> Iterator[list[Any]]:
+        """Page through distinct values using a composite aggregation."""
+        after = None
+
+        def composite(_field: str) -> dict[str, Any]:
+            agg = {"sources": [{"q": {"terms": {"field": _field}}}], "size": 10_000}
+            if after is not None:
+                agg["after"] = after
+            return {"composite": agg}
+
         while True:
-            agg = result["aggregations"][field]
-            buckets = agg["buckets"]
-            if not buckets:
+            agg, field = self._aggregate(field, find, composite)
+            values = [key["key"]["q"] for key in agg["buckets"]]
+            if not values:
                 break
-            n_buckets += len(buckets)
-            query["aggs"][field]["composite"]["after"] = agg["after_key"]
-            result = self.find(query, size=0)
-            assert isinstance(result, dict)
+            yield values
+            after = agg["after_key"]
 
-        return n_buckets
+    def _partitioned_pages(
+        self,
+        field: str,
+        find: dict[str, Any] | None = None,
+        partitions: int = 10,
+        threads: int = 4,
+        size: int = 10_000,
+    ) -> Iterator[list[Any]]:
+        """Retrieve distinct values concurrently, using a partitioned terms aggregation.
+
+        A partition that holds more than :param size: values is split in
+        two (partition p of n holds the values of partitions p and p + n
+        of 2n), until every partition fits in a single response.
+        """
 
-    def distinct_values(
-        self, field: str, find: dict[str, Any] | None = None
-    ) -> list[Any]:
-        """Return distinct values in a certain field.
+        def partition(p: int, n: int) -> tuple[list[Any], list[tuple[int, int]]]:
+            def terms(_field: str) -> dict[str, Any]:
+                include = {"partition": p, "num_partitions": n}
+                return {"terms": {"field": _field, "include": include, "size": size}}
+
+            agg, _ = self._aggregate(field, find, terms)
+            if agg["sum_other_doc_count"]:
+                return [], [(p, 2 * n), (p + n, 2 * n)]
+            return [bucket["key"] for bucket in agg["buckets"]], []
+
+        executor = ThreadPoolExecutor(max_workers=threads)
+        futures: set[Future[tuple[list[Any], list[tuple[int, int]]]]] = set()
+        try:
+            futures = {
+                executor.submit(partition, p, partitions) for p in range(partitions)
+            }
+            while futures:
+                done, futures = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    values, splits = future.result()
+                    futures |= {executor.submit(partition, *split) for split in splits}
+                    if values:
+                        yield values
+        finally:
+            # Don't run queued partitions if the generator is closed early
+            for future in futures:
+                future.cancel()
+            executor.shutdown()
+
+    def distinct_count(
+        self,
+        field: str,
+        find: dict[str, Any] | None = None,
+        *,
+        approximate: bool = False,
+        precision_threshold: int = 3_000,
+        partitions: int | None = None,
+        threads: int = 4,
+    ) -> int:
+        """Provide a count of distinct values in a certain field.
+
+        By default, all values are counted by paging through a composite
+        aggregation. Set :param approximate: to use a cardinality
+        aggregation instead, which is exact up to about
+        :param precision_threshold: (max 40000) values and close above it.
+        Set :param partitions: to count exactly, but with a partitioned
+        terms aggregation of which the partitions are requested in
+        :param threads: threads. Use about one partition per 10k values.
 
         See:
         https://www.elastic.co/guide/en/elasticsearch/reference/current
         /search-aggregations-bucket-composite-aggregation.html
+        https://www.elastic.co/guide/en/elasticsearch/reference/current
+        /search-aggregations-metrics-cardinality-aggregation.html
         """
-
-        if not find:
-            find = {"match_all": {}}
-
-        while True:
-            query = {
-                "query": find,
-                "aggs": {
-                    "q": {
-                        "composite": {
-                            "sources": [{"q": {"terms": {"field": field}}}],
-                            "size": 10_000,
-                        }
+        if approximate:
+            agg, _ = self._aggregate(
+                field,
+                find,
+                lambda _field: {
+                    "cardinality": {
+                        "field": _field,
+                        "precision_threshold": precision_threshold,
                     }
                 },
-            }
-            try:
-                response = self.find(query, size=0)
-                assert isinstance(response, dict)
-                break
-            except TransportError as e:
-                if "fielddata" in f"{e}" and field[-8:] != ".keyword":
-                    field = f"{field}.keyword"
-                else:
-                    raise ESClientError(query) from e
+            )
+            return agg["value"]
+        return sum(
+            len(values)
+            for values in self._distinct_pages(field, find, partitions, threads)
+        )
 
-        result = []
-        while True:
-            agg = response["aggregations"]["q"]
-            values = [key["key"]["q"] for key in agg["buckets"]]
-            if not values:
-                break
-            result += values
-            query["aggs"]["q"]["composite"]["after"] = agg["after_key"]
-            response = self.find(query, size=0)
-            assert isinstance(response, dict)
+    def _distinct_pages(
+        self,
+        field: str,
+        find: dict[str, Any] | None,
+        partitions: int | None,
+        threads: int,
+    ) -> Iterator[list[Any]]:
+        if partitions:
+            return self._partitioned_pages(field, find, partitions, threads)
+        return self._composite_pages(field, find)
+
+    def iter_distinct_values(
+        self,
+        field: str,
+        find: dict[str, Any] | None = None,
+        *,
+        partitions: int | None = None,
+        threads: int = 4,
+    ) -> Iterator[Any]:
+        """Return an iterator of distinct values in a certain field.
+
+        Values are retrieved page by page; see `distinct_count` for the
+        :param partitions: and :param threads: options. With partitions,
+        values are not returned in order.
+        """
+        for values in self._distinct_pages(field, find, partitions, threads):
+            yield from values
 
-        return result
+    def distinct_values(
+        self,
+        field: str,
+        find: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> list[Any]:
+        """Return distinct values in a certain field.
+
+        Use `iter_distinct_values` to avoid building the list in memory.
+
+        See:
+        https://www.elastic.co/guide/en/elasticsearch/reference/current
+        /search-aggregations-bucket-composite-aggregation.html
+        """
+        return list(self.iter_distinct_values(field, find, **kwargs))
 
     def db(self) -> tuple[int, int]:
         """Returns a named two-tuple with the document count of the corresponding MongoDB
@@ -702,6 +1346,148 @@ class ESClient(Elasticsearch):
         assert isinstance(coll_client, Collection)
         return Count(coll_client.estimated_document_count(), self.count())
 
+    def bulk_load(
+        self,
+        docs: Iterable[dict[str, Any]],
+        index: str | None = None,
+        chunk_size: int = 500,
+        threads: int = 4,
+        **kwargs: Any,
+    ) -> BulkResult:
+        """Index documents from any iterable using parallel bulk requests.
+
+        Documents are streamed into `_bulk` requests of at most
+        :param chunk_size: documents and `max_chunk_bytes` bytes (default
+        10 MiB), and up to :param threads: requests run concurrently.
+        Documents rejected with status 429 are retried with exponential
+        backoff (`max_retries`, default 5; `initial_backoff`, default 2
+        seconds); other failures are not retried.
+
+        A document is indexed as-is, unless it contains "_source", in which
+        case its other underscore keys ("_id", "_op_type", "_routing") are
+        used as metadata. Alternatively, provide `id_field` to use the value
+        of that field as "_id".
+
+        Set `disable_refresh=True` to set "refresh_interval" to -1 and
+        "number_of_replicas" to 0 during the load; the original settings
+        are restored (and the index refreshed) afterwards.
+
+        Returns a named two-tuple with the number of indexed documents and
+        a list of failures as returned by Elasticsearch.
+
+        Example::
+            es = ESClient("dev_realestate.real_estate_v11")
+            docs = MongoDB("dev_realestate.real_estate_v11").find({}, {"_id": False})
+            result = es.bulk_load(docs, threads=8, disable_refresh=True)
+            assert not result.errors
+        """
+        max_chunk_bytes = kwargs.pop("max_chunk_bytes", 10 * 1024 * 1024)
+        max_retries = kwargs.pop("max_retries", 5)
+        initial_backoff = kwargs.pop("initial_backoff", 2)
+        id_field = kwargs.pop("id_field", None)
+        disable_refresh = kwargs.pop("disable_refresh", False)
+        use_tqdm = kwargs.pop("use_tqdm", False)
+        if not index:
+            index = self.es_index
+        assert isinstance(index, str)
+        dumps = self.transport.serializer.dumps
+
+        def to_lines(doc: dict[str, Any]) -> tuple[str, str]:
+            if "_source" in doc:
+                doc = {**doc}
+                source = doc.pop("_source")
+                op_type = doc.pop("_op_type", "index")
+                meta = {k: doc[k] for k in ("_id", "_routing") if k in doc}
+            else:
+                source, op_type, meta = doc, "index", {}
+                if id_field:
+                    meta["_id"] = source[id_field]
+            return dumps({op_type: {"_index": index, **meta}}), dumps(source)
+
+        def chunks() -> Iterator[list[tuple[str, str]]]:
+            chunk: list[tuple[str, str]] = []
+            n_bytes = 0
+            for doc in docs:
+                lines = to_lines(doc)
+                size = len(lines[0].encode()) + len(lines[1].encode()) + 2
+                if chunk and (
+                    len(chunk) == chunk_size or n_bytes + size > max_chunk_bytes
+                ):
+                    yield chunk
+                    chunk, n_bytes = [], 0
+                chunk.append(lines)
+                n_bytes += size
+            if chunk:
+                yield chunk
+
+        def send(chunk: list[tuple[str, str]]) -> BulkResult:
+            success, errors = 0, []
+            for attempt in range(max_retries + 1):
+                body = "".join(f"{action}\n{source}\n" for action, source in chunk)
+                try:
+                    response = self.bulk(body=body, index=index)
+                except TransportError as e:
+                    if e.status_code == 429 and attempt < max_retries:
+                        sleep(min(initial_backoff * 2 ** attempt, 600))
+                        continue
+                    raise ESClientError(f"Bulk request to '{index}' failed") from e
+                retry = []
+                for lines, item in zip(chunk, response["items"]):
+                    (result,) = item.values()
+                    if result.get("status", 500) < 300:
+                        success += 1
+                    elif result["status"] == 429 and attempt < max_retries:
+                        retry.append(lines)
+                    else:
+                        errors.append(item)
+                if not retry:
+                    break
+                chunk = retry
+                sleep(min(initial_backoff * 2 ** attempt, 600))
+            return BulkResult(success, errors)
+
+        original_settings = {}
+        if disable_refresh:
+            settings = self.indices.get_settings(index=index)
+            for name, index_settings in settings.items():
+                original_settings[name] = {
+                    key: index_settings["settings"]["index"].get(key)
+                    for key in ("refresh_interval", "number_of_replicas")
+                }
+            self.indices.put_settings(
+                index=index,
+                body={"index": {"refresh_interval": "-1", "number_of_replicas": 0}},
+            )
+
+        success, errors = 0, []
+        bar = tqdm(desc="bulk_load", disable=not use_tqdm)
+        futures: set[Future[BulkResult]] = set()
+
+        def collect(done: set[Future[BulkResult]]) -> None:
+            nonlocal success
+            for future in done:
+                result = future.result()
+                success += result.success
+                errors.extend(result.errors)
+                bar.update(result.success + len(result.errors))
+
+        try:
+            with ThreadPoolExecutor(max_workers=threads) as executor:
+                for chunk in chunks():
+                    futures.add(executor.submit(send, chunk))
+                    if len(futures) >= threads * 2:
+                        done, futures = wait(futures, return_when=FIRST_COMPLETED)
+                        collect(done)
+                collect(futures)
+        finally:
+            for name, index_settings in original_settings.items():
+                self.indices.put_settings(index=name, body={"index": index_settings})
+            if original_settings:
+                self.indices.refresh(index=index)
+            bar.close()
+
+        return BulkResult(success, errors)
+
     def update_alias(
         self,
         remove_index: str | None = None,
@@ -754,3 +1540,112 @@ class ESClient(Elasticsearch):
             for alias in aliases["aliases"]:
                 result[index].append(alias)
         return dict(result)
+
+
+class PointInTimeIterator:
+    """Iterator over all documents for a query, using a point in time.
+
+    Use :meth:`ESClient.scroll_pit` to create one.
+    """
+
+    def __init__(
+        self,
+        es: ESClient,
+        query: dict[str, Any] | None,
+        index: str | None,
+        **kwargs: Any,
+    ):
+        self.es = es
+        self.query = {**(query or {})}
+        self.query.setdefault("sort", [{"_shard_doc": "asc"}])
+        self.index = index
+        self.source_only = kwargs.pop("source_only", False)
+        self.with_id = kwargs.pop("with_id", False)
+        if self.with_id:
+            self.source_only = False
+        self.as_chunks = kwargs.pop("as_chunks", False)
+        self.chunk_size = min(
+            kwargs.pop("chunk_size", 10_000 if self.as_chunks else 1_000), 10_000
+        )
+        self.field = kwargs.pop("field", None)
+        self.keep_alive = kwargs.pop("keep_alive", "1m")
+        self.search_after: list[Any] | None = kwargs.pop("search_after", None)
+        self.use_tqdm = kwargs.pop("use_tqdm", False)
+        self.kwargs = kwargs
+        self.pit_id: str | None = None
+        self._iterator: Generator[Any, None, None] | None = None
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(index='{self.index}', pit_id='{self.pit_id}')"
+
+    def __enter__(self) -> PointInTimeIterator:
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def __iter__(self) -> Iterator[Any]:
+        if self._iterator is None:
+            self._iterator = self._iterate()
+        return self._iterator
+
+    def __next__(self) -> Any:
+        return next(iter(self))
+
+    def close(self) -> None:
+        """Close the point in time."""
+        if self._iterator is not None:
+            self._iterator.close()
+        self._close_pit()
+
+    def _close_pit(self) -> None:
+        if self.pit_id:
+            with suppress(ElasticsearchException):
+                self.es.close_point_in_time(body={"id": self.pit_id})
+            self.pit_id = None
+
+    def _iterate(self) -> Generator[Any, None, None]:
+        total = None
+        if self.use_tqdm:
+            total = self.es.count(
+                body={"query": self.query["query"]} if "query" in self.query else None,
+                index=self.index,
+            )
+        bar = tqdm(total=total, disable=not self.use_tqdm)
+        self.pit_id = self.es.open_point_in_time(
+            index=self.index, keep_alive=self.keep_alive
+        )["id"]
+        try:
+            while True:
+                body = {
+                    **self.query,
+                    "pit": {"id": self.pit_id, "keep_alive": self.keep_alive},
+                }
+                if self.search_after is not None:
+                    body["search_after"] = self.search_after
+                data = self.es.search(
+                    body=body,
+                    size=self.chunk_size,
+                    _source=self.field,
+                    **self.kwargs,
+                )
+                self.pit_id = data.get("pit_id", self.pit_id)
+                hits = data["hits"]["hits"]
+                if not hits:
+                    break
+                bar.update(len(hits))
+                sorts = [d["sort"] for d in hits]
+                if self.with_id:
+                    hits = [{**d, **d.pop("_source")} for d in hits]
+                elif self.source_only:
+                    hits = [d["_source"] for d in hits]
+                if self.as_chunks:
+                    self.search_after = sorts[-1]
+                    yield hits
+                else:
+                    for doc, sort in zip(hits, sorts):
+                        self.search_after = sort
+                        yield doc
+        finally:
+            self._close_pit()
+            bar.close()
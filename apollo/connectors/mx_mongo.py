@@ -10,18 +10,25 @@ __all__ = (
     "MxDatabase",
 )
 
-from collections import namedtuple
-from collections.abc import Generator, Iterable
+import json
+import os
+from collections import deque, namedtuple
+from collections.abc import Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from itertools import islice
+from logging import info
 from threading import Lock
+from time import sleep
 from typing import Any
 from urllib.parse import quote_plus
 
-from bson import CodecOptions
+from bson import CodecOptions, ObjectId, encode
+from bson.raw_bson import RawBSONDocument
 from pymongo.database import Collection, Database
-from pymongo.errors import ServerSelectionTimeoutError
+from pymongo.errors import AutoReconnect, BulkWriteError, ServerSelectionTimeoutError
 from pymongo.mongo_client import MongoClient
-from pymongo.operations import InsertOne, UpdateMany, UpdateOne
-from pymongo.results import InsertManyResult, InsertOneResult
+from pymongo.operations import DeleteMany, InsertOne, UpdateMany, UpdateOne
+from pymongo.results import BulkWriteResult, InsertManyResult, InsertOneResult
 
 from ..exceptions import MongoDBError
 
@@ -34,14 +41,46 @@ _hosts = {
 }
 
 Count = namedtuple("Count", ("db", "es"))
+_BatchResult = namedtuple("_BatchResult", ("offset", "inserted_ids", "errors"))
+
+_DUPLICATE_KEY = 11000
+_POLYGON_TYPES = ("MultiPolygon", "Polygon")
+_GEOSHAPE_KEYS = ("geometry", "location")
+
+_clients: dict[str, MxClient] = {}
+_clients_lock = Lock()
+_clients_pid = os.getpid()
 
 
 class MxClient(MongoClient):
-    ...
+    # The arguments of a shared client, and the process it was created in
+    _shared_args: tuple[str, dict[str, Any]] | None = None
+    _pid = 0
 
 
 class MxDatabase(Database):
-    ...
+    _mx_client: MongoClient[Any]
+
+    @property
+    def _client(self) -> MongoClient[Any]:
+        """The client of this database.
+
+        A shared client is looked up again after a fork, so that databases
+        and collections created in a parent process use the child's client.
+        """
+        client = self._mx_client
+        if (
+            isinstance(client, MxClient)
+            and client._shared_args is not None
+            and client._pid != os.getpid()
+        ):
+            uri, kwargs = client._shared_args
+            client = self._mx_client = _shared_client(uri, **kwargs)[0]
+        return client
+
+    @_client.setter
+    def _client(self, client: MongoClient[Any]) -> None:
+        self._mx_client = client
 
 
 class MxCollection(Collection):
@@ -100,12 +139,20 @@ class MxCollection(Collection):
         self,
         field: str,
         use_tqdm: bool = False,
+        dry_run: bool = False,
+        batch_size: int = 10_000,
     ) -> int:
         """Remove duplicated documents in a collection, based on `field`.
 
         Provide `field` as a dot-separated string for nested fields.
+        Of every group of documents with the same value, the document with
+        the lowest `_id` is kept. Documents without the field are ignored.
+        Duplicates are found with a server-side aggregation, and deleted
+        with one DeleteMany per value, in bulk writes of `batch_size`.
 
-        Returns the number of deleted documents.
+        Returns the number of deleted documents. With `dry_run=True`,
+        nothing is deleted: the number of documents that would be deleted
+        is returned, and a report is logged.
 
         Usage::
             from apollo.connectors.mx_mongo import MongoDB
@@ -113,64 +160,108 @@ class MxCollection(Collection):
             coll.remove_duplicates("address.identification.addressId")
         """
         from ..handlers import tqdm
-        from ..parsers import flatten
-        from ..requests import thread
-
-        bar = tqdm(total=self.estimated_document_count(), disable=not use_tqdm)
-        batch_size = 10_000
-        count = 0
-        lock = Lock()
-
-        def count_and_delete(doc: dict[str, Any]) -> None:
-            if self.count_documents({field: flatten(doc)[field]}) > 1:
-                self.delete_one({"_id": doc["_id"]})
-                nonlocal count
-                with lock:
-                    count += 1
-                    bar.update()
-            else:
-                with lock:
-                    bar.update()
 
-        thread(
-            function=count_and_delete,
-            data=self.find({}, {field: True}).batch_size(batch_size),
-            process_chunk_size=batch_size,
+        groups = self.aggregate(
+            [
+                {"$match": {field: {"$exists": True}}},
+                {"$sort": {"_id": 1}},
+                {
+                    "$group": {
+                        "_id": f"${field}",
+                        "keep": {"$first": "$_id"},
+                        "count": {"$sum": 1},
+                    }
+                },
+                {"$match": {"count": {"$gt": 1}}},
+            ],
+            allowDiskUse=True,
         )
-        bar.close()
+
+        count = values = 0
+        examples: list[Any] = []
+        batch: list[Any] = []
+        for group in tqdm(groups, disable=not use_tqdm):
+            values += 1
+            if len(examples) < 10:
+                examples.append(group["_id"])
+            count += group["count"] - 1
+            if dry_run:
+                continue
+            batch.append(
+                DeleteMany(
+                    {
+                        # A null value shouldn't match documents without the field
+                        field: {"$eq": group["_id"], "$exists": True},
+                        "_id": {"$ne": group["keep"]},
+                    }
+                )
+            )
+            if len(batch) >= batch_size:
+                self.bulk_write(batch, ordered=False)
+                batch = []
+        if batch:
+            self.bulk_write(batch, ordered=False)
+
+        if dry_run:
+            info(
+                "%s: %d documents would be deleted, for %d duplicated values"
+                " of %s, such as: %s",
+                self.full_name,
+                count,
+                values,
+                field,
+                examples,
+            )
         return count
 
     def insert_many(
         self,
-        documents: list[dict[str, Any]],
+        documents: Iterable[dict[str, Any]],
         ordered: bool = True,
         bypass_document_validation: bool = False,
         session: Any = None,
+        **kwargs: Any,
     ) -> InsertManyResult:
-        _documents: list[dict[str, Any]] | Generator[dict[str, Any], None, None]
-        if isinstance(documents, list) and documents and isinstance(documents[0], dict):
-            # If `documents` is a list, we have to do the type and key checking only once
-            if documents[0].get("geometry"):
-                _documents = (
-                    self.correct_geoshape(doc, "geometry") for doc in documents
-                )
-            elif documents[0].get("location"):
-                _documents = (
-                    self.correct_geoshape(doc, "location") for doc in documents
-                )
-            else:
-                _documents = documents
+        """Insert an iterable of documents.
+
+        Invalid (multi)polygons in "geometry" or "location", or in the
+        fields of :param keys:, are repaired with
+        :meth:`MxCollection.correct_geoshapes`.
+
+        Provide :param threads: for a high-throughput, unordered insert:
+        documents are prepared (geoshapes corrected, encoded to BSON) in a
+        pool of `threads` workers, grouped into batches of at most
+        `batch_bytes` bytes (default 16 MiB), and the batches are inserted
+        with `ordered=False` on `threads` threads. Batches that fail with a
+        transient error (e.g., a network timeout or a primary stepdown) are
+        retried with exponential backoff (`max_retries`, default 5); as
+        part of a batch may have been inserted already, duplicate key
+        errors are ignored on retries. Like an unordered insert, all
+        batches are attempted before a BulkWriteError is raised for the
+        documents that failed.
+
+        Example::
+            coll = MongoDB("dev_realestate.real_estate_v11")
+            docs = ({"_id": i} for i in range(1_000_000))
+            result = coll.insert_many(docs, threads=8)
+        """
+        keys = kwargs.pop("keys", _GEOSHAPE_KEYS)
+        threads = kwargs.pop("threads", None)
+        if threads:
+            if session is not None:
+                raise MongoDBError("Sessions can't be shared between threads.")
+            return self._insert_parallel(
+                documents, bypass_document_validation, threads, keys, **kwargs
+            )
+        _documents: Iterable[dict[str, Any]]
+        if isinstance(documents, list):
+            _documents = self.correct_geoshapes(documents, keys)
         elif isinstance(documents, Iterable):
-            # Otherwise, do it doc-wise but lazily
+            # Otherwise, do it in chunks but lazily
             _documents = (
-                self.correct_geoshape(doc, "geometry")
-                if (isinstance(doc, dict) and doc.get("geometry"))
-                else (
-                    self.correct_geoshape(doc, "location")
-                    if (isinstance(doc, dict) and doc.get("location"))
-                    else doc
-                )
-                for doc in documents
+                doc
+                for chunk in _chunks(documents, 1_000)
+                for doc in self.correct_geoshapes(chunk, keys)
             )
         else:
             raise MongoDBError("Provide non-empty documents.")
@@ -178,44 +269,188 @@ class MxCollection(Collection):
             _documents, ordered, bypass_document_validation, session
         )
 
+    def _insert_parallel(
+        self,
+        documents: Iterable[dict[str, Any]],
+        bypass_document_validation: bool,
+        threads: int,
+        keys: tuple[str, ...],
+        **kwargs: Any,
+    ) -> InsertManyResult:
+        """Insert documents in unordered batches on multiple threads."""
+        batch_bytes = kwargs.pop("batch_bytes", 16 * 1024 * 1024)
+        max_retries = kwargs.pop("max_retries", 5)
+        initial_backoff = kwargs.pop("initial_backoff", 1)
+        prepare_size = kwargs.pop("prepare_size", 1_000)
+        if kwargs:
+            raise MongoDBError(f"Unknown arguments: {', '.join(kwargs)}")
+        insert = super().insert_many
+
+        def prepare(chunk: list[Any]) -> list[RawBSONDocument]:
+            docs = []
+            self.correct_geoshapes(
+                [doc for doc in chunk if not isinstance(doc, RawBSONDocument)], keys
+            )
+            for doc in chunk:
+                if not isinstance(doc, RawBSONDocument):
+                    if "_id" not in doc:
+                        doc["_id"] = ObjectId()
+                    doc = RawBSONDocument(encode(doc, codec_options=self.codec_options))
+                docs.append(doc)
+            return docs
+
+        def batches(executor: ThreadPoolExecutor) -> Iterator[list[RawBSONDocument]]:
+            prepared: deque[Future[list[RawBSONDocument]]] = deque()
+            batch: list[RawBSONDocument] = []
+            n_bytes = 0
+
+            def drain() -> Iterator[list[RawBSONDocument]]:
+                nonlocal batch, n_bytes
+                for doc in prepared.popleft().result():
+                    size = len(doc.raw)
+                    if batch and n_bytes + size > batch_bytes:
+                        yield batch
+                        batch, n_bytes = [], 0
+                    batch.append(doc)
+                    n_bytes += size
+
+            for chunk in _chunks(documents, prepare_size):
+                prepared.append(executor.submit(prepare, chunk))
+                if len(prepared) > threads:
+                    yield from drain()
+            while prepared:
+                yield from drain()
+            if batch:
+                yield batch
+
+        def send(offset: int, batch: list[RawBSONDocument]) -> _BatchResult:
+            errors: list[dict[str, Any]] = []
+            for attempt in range(max_retries + 1):
+                try:
+                    insert(
+                        batch,
+                        ordered=False,
+                        bypass_document_validation=bypass_document_validation,
+                    )
+                    errors = []
+                except BulkWriteError as e:
+                    errors = e.details["writeErrors"]
+                    if attempt:
+                        # Documents may have been inserted by an earlier attempt
+                        errors = [
+                            error for error in errors if error["code"] != _DUPLICATE_KEY
+                        ]
+                except AutoReconnect:
+                    if attempt < max_retries:
+                        sleep(min(initial_backoff * 2 ** attempt, 60))
+                        continue
+                    raise
+                break
+            failed = {error["index"] for error in errors}
+            for error in errors:
+                error["index"] += offset
+            ids = [doc["_id"] for n, doc in enumerate(batch) if n not in failed]
+            return _BatchResult(offset, ids, errors)
+
+        results: list[_BatchResult] = []
+        futures: set[Future[_BatchResult]] = set()
+        offset = 0
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            for batch in batches(executor):
+                futures.add(executor.submit(send, offset, batch))
+                offset += len(batch)
+                if len(futures) >= threads * 2:
+                    done, futures = wait(futures, return_when=FIRST_COMPLETED)
+                    results.extend(future.result() for future in done)
+            results.extend(future.result() for future in futures)
+
+        results.sort()
+        ids = [_id for result in results for _id in result.inserted_ids]
+        errors = [error for result in results for error in result.errors]
+        if errors:
+            raise BulkWriteError(
+                {
+                    "writeErrors": errors,
+                    "writeConcernErrors": [],
+                    "nInserted": len(ids),
+                    "nUpserted": 0,
+                    "nMatched": 0,
+                    "nModified": 0,
+                    "nRemoved": 0,
+                    "upserted": [],
+                }
+            )
+        return InsertManyResult(ids, self.write_concern.acknowledged)
+
     def insert_one(
         self,
         document: dict[str, Any],
         bypass_document_validation: bool = False,
         session: Any = None,
     ) -> InsertOneResult:
-        if isinstance(document, dict) and document.get("geometry"):
-            document = self.correct_geoshape(document)
+        if isinstance(document, dict):
+            self.correct_geoshapes([document])
         return super().insert_one(document, bypass_document_validation, session)
 
-    @staticmethod
-    def correct_geoshape(doc: dict[str, Any], key: str = "geometry") -> dict[str, Any]:
-
-        # TODO: add to InsertOne and InsertMany
-        # TODO: add to update_one, update_many, UpdateOne, UpdateMany (in the future)
-        # TODO: add possibility for nested keys (e.g., key="geometry.geoPoint")
-
-        import shapely.geometry
-
-        try:
-            geom_cls = getattr(shapely.geometry, doc[key]["type"])
-
-            if geom_cls is shapely.geometry.MultiPolygon:
-                geom_doc = geom_cls(
-                    [shapely.geometry.Polygon(x[0]) for x in doc[key]["coordinates"]]
-                )
-            elif geom_cls is shapely.geometry.Polygon:
-                geom_doc = geom_cls(doc[key]["coordinates"][0])
-            else:
-                return doc
+    def bulk_write(
+        self,
+        requests: Iterable[Any],
+        *args: Any,
+        **kwargs: Any,
+    ) -> BulkWriteResult:
+        """Send a batch of write operations to the server.
 
-            if not geom_doc.is_valid:
-                doc[key] = shapely.geometry.mapping(geom_doc.buffer(0))
+        Invalid (multi)polygons in the documents of InsertOne, ReplaceOne,
+        UpdateOne and UpdateMany operations are repaired at once, using
+        :meth:`MxCollection.correct_geoshapes`, in "geometry" and
+        "location" or in the fields of :param keys:.
+        """
+        keys = kwargs.pop("keys", _GEOSHAPE_KEYS)
+        requests = list(requests)
+        self.correct_geoshapes(
+            [
+                request._doc
+                for request in requests
+                if isinstance(getattr(request, "_doc", None), dict)
+            ],
+            keys,
+        )
+        return super().bulk_write(requests, *args, **kwargs)
 
-        except KeyError:
-            pass
+    @staticmethod
+    def correct_geoshape(doc: dict[str, Any], key: str = "geometry") -> dict[str, Any]:
+        """Repair an invalid (multi)polygon in a document, see
+        :meth:`MxCollection.correct_geoshapes`."""
+        return MxCollection.correct_geoshapes([doc], (key,))[0]
 
-        return doc
+    @staticmethod
+    def correct_geoshapes(
+        docs: list[dict[str, Any]],
+        keys: tuple[str, ...] = _GEOSHAPE_KEYS,
+    ) -> list[dict[str, Any]]:
+        """Repair invalid GeoJSON (multi)polygons in many documents at once.
+
+        The geometries at :param keys: are validated, and the invalid ones
+        replaced by their zero-width buffer, using vectorized shapely 2
+        operations. Provide keys as dot-separated strings for nested
+        fields (e.g., "geometry.geoPoint"). Update documents are supported:
+        geometries in `$set` and `$setOnInsert` are repaired, also if the
+        operator sets (a parent of) the key using dot notation.
+
+        Documents are changed in place. Returns the documents.
+        """
+        slots = [
+            (container, field)
+            for doc in docs
+            for key in keys
+            for container, field in _geoshape_slots(doc, key)
+        ]
+        if slots:
+            geometries = _repair_geoshapes([container[f] for container, f in slots])
+            for (container, field), geometry in zip(slots, geometries):
+                if geometry is not None:
+                    container[field] = geometry
+        return docs
 
     def es(self) -> tuple[int, int]:
         """Returns a named two-tuple with the document count
@@ -227,6 +462,102 @@ class MxCollection(Collection):
         )
 
 
+def _chunks(iterable: Iterable[Any], size: int) -> Iterator[list[Any]]:
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _geoshape_slots(
+    doc: dict[str, Any],
+    key: str,
+) -> Iterator[tuple[dict[str, Any], str]]:
+    """Yield the (container, field) pairs that hold a polygon at `key`."""
+    if any(field.startswith("$") for field in doc):
+        for operator in ("$set", "$setOnInsert"):
+            if isinstance(doc.get(operator), dict):
+                yield from _geoshape_slots(doc[operator], key)
+        return
+    value = doc.get(key)
+    if isinstance(value, dict) and value.get("type") in _POLYGON_TYPES:
+        yield doc, key
+    start = 0
+    while True:
+        start = key.find(".", start) + 1
+        if not start:
+            return
+        parent = doc.get(key[: start - 1])
+        if isinstance(parent, dict):
+            yield from _geoshape_slots(parent, key[start:])
+
+
+def _repair_geoshapes(
+    geometries: list[dict[str, Any]],
+) -> list[dict[str, Any] | None]:
+    """Validate GeoJSON (multi)polygons as one array, and return the
+    repaired mappings of the invalid ones, and None for the valid ones."""
+    import numpy as np
+    import shapely
+    from shapely.errors import GEOSException
+    from shapely.geometry import mapping
+
+    # Build a flat coordinate array with offsets, as multipolygons
+    coordinates: list[Any] = []
+    rings, polygons, parts = [0], [0], [0]
+    try:
+        for geometry in geometries:
+            if geometry["type"] == "Polygon":
+                members = [geometry["coordinates"]]
+            else:
+                members = geometry["coordinates"]
+            for polygon in members:
+                for ring in polygon:
+                    coordinates.extend(ring)
+                    rings.append(len(coordinates))
+                polygons.append(len(rings) - 1)
+            parts.append(len(polygons) - 1)
+        array = shapely.from_ragged_array(
+            shapely.GeometryType.MULTIPOLYGON,
+            np.asarray(coordinates, dtype=np.float64),
+            (np.asarray(rings), np.asarray(polygons), np.asarray(parts)),
+        )
+    except (GEOSException, KeyError, TypeError, ValueError):
+        if len(geometries) == 1:
+            return [None]
+        # Isolate the malformed geometries, and leave them as they are
+        return [_repair_geoshapes([geometry])[0] for geometry in geometries]
+
+    repaired: list[dict[str, Any] | None] = [None] * len(geometries)
+    invalid = np.flatnonzero(~shapely.is_valid(array))
+    for n, geometry in zip(invalid, shapely.buffer(array[invalid], 0)):
+        repaired[n] = mapping(geometry)
+    return repaired
+
+
+def _shared_client(uri: str, **kwargs: Any) -> tuple[MxClient, bool]:
+    """Return the process-wide client for this URI and these options,
+    and whether it was newly created.
+
+    After a fork, the child process creates its own clients, because
+    MongoClient instances must not be shared with a parent process.
+    """
+    global _clients_pid
+    key = json.dumps([uri, sorted(kwargs.items())], default=repr)
+    with _clients_lock:
+        if _clients_pid != os.getpid():
+            _clients.clear()
+            _clients_pid = os.getpid()
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = MxClient(host=uri, **kwargs)
+            client._shared_args, client._pid = (uri, kwargs), os.getpid()
+            return client, True
+    return client, False
+
+
 class MongoDB:
     """Factory for a Matrixian MongoDB client, database, or collection object."""
 
@@ -243,6 +574,13 @@ class MongoDB:
 
         Creates a MxClient, MxDatabase, or MxCollection object.
 
+        Clients are shared per URI and options within a process (unless
+        `shared=False`), so do not close a shared client. After a fork,
+        databases and collections use the child process's shared client.
+        Other keyword arguments are passed on to the client as options.
+        Set `test_connection` to True or False to always or never test the
+        connection of a collection; by default, only a new client is tested.
+
         Usage::
             # Create a MxClient object
             client = MongoDB(client=True)
@@ -266,6 +604,8 @@ class MongoDB:
         elif not database and not collection and not client:
             client = True
 
+        shared = kwargs.pop("shared", True)
+        test_connection = kwargs.pop("test_connection", None)
         if kwargs.pop("local", False) or host == "localhost":
             uri = "mongodb://localhost"
         else:
@@ -311,7 +651,11 @@ class MongoDB:
         else:
             codec_options = None
 
-        mongo_client = MxClient(host=uri, connectTimeoutMS=None)
+        kwargs.setdefault("connectTimeoutMS", None)
+        if shared:
+            mongo_client, new = _shared_client(uri, **kwargs)
+        else:
+            mongo_client, new = MxClient(host=uri, **kwargs), True
         if client:
             return mongo_client
         mongo_db = MxDatabase(
@@ -319,7 +663,8 @@ class MongoDB:
         )
         if collection:
             mongo_coll = MxCollection(database=mongo_db, name=collection)
-            mongo_coll.test_connection()
+            if test_connection or (test_connection is None and new):
+                mongo_coll.test_connection()
             return mongo_coll
         else:
             return mongo_db
@@ -3,19 +3,28 @@
 from __future__ import annotations
 
 __all__ = (
+    "DiskQueryCache",
     "MySQLClient",
     "Query",
+    "QueryCache",
 )
 
+import os
+import pickle
+import re
 from ast import literal_eval
-from collections.abc import Iterable, Iterator, Sequence
+from collections.abc import Callable, Iterable, Iterator, Sequence
 from contextlib import suppress
+from copy import deepcopy
 from datetime import date, datetime, timedelta
 from decimal import Decimal
 from functools import partial
+from hashlib import sha256
 from logging import info
 from pathlib import Path
 from random import sample
+from threading import Lock
+from time import time
 from typing import Any, Pattern
 
 from mysql.connector import (
@@ -35,7 +44,16 @@ from ..handlers import tqdm, trange
 from ..parsers import count_bytes
 from ..secrets import get_secret
 
+_CACHE_DIR = commondir / "query_cache"
 _MAX_ERRORS = 10_000
+_MISSING = object()
+_READ_STATEMENTS = ("SELECT", "SHOW", "SET", "DESCRIBE", "DESC", "EXPLAIN", "WITH")
+_QUOTED = re.compile(r"""('(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*"|`[^`]*`)""")
+_TABLES = re.compile(
+    r"\b(?:FROM|JOIN|INTO|UPDATE|TABLE)\s+(?:TABLE\s+)?(?:IF\s+(?:NOT\s+)?EXISTS\s+)?"
+    r"`?(\w+)`?(?:\.`?(\w+)`?)?",
+    re.IGNORECASE,
+)
 _MYSQL_TYPES = {
     str: "CHAR",
     int: {
@@ -61,6 +79,165 @@ class Query(str):
     pass
 
 
+def _normalize_query(query: Query | str) -> str:
+    """Collapse whitespace outside of quoted literals and drop a trailing semicolon."""
+    parts = _QUOTED.split(f"{query}".strip().rstrip(";").strip())
+    return "".join(
+        part if i % 2 else re.sub(r"\s+", " ", part) for i, part in enumerate(parts)
+    )
+
+
+def _query_tables(query: Query | str, database: str | None = None) -> set[str]:
+    """Return the (lowercase) "database.table" names a query refers to."""
+    tables = set()
+    query = _QUOTED.sub(
+        lambda m: m.group() if m.group().startswith("`") else "''", f"{query}"
+    )
+    for first, second in _TABLES.findall(query):
+        if second:
+            tables.add(f"{first}.{second}".lower())
+        elif database:
+            tables.add(f"{database}.{first}".lower())
+        else:
+            tables.add(first.lower())
+    return tables
+
+
+class QueryCache:
+    """In-memory cache for query results.
+
+    Entries are keyed on the normalized query and its parameters, expire
+    after :param ttl: seconds (``None`` to never expire), and are
+    invalidated when a table they were read from is written to through
+    :meth:`QueryCache.invalidate`. :class:`MySQLClient` does the latter
+    automatically for statements it executes.
+
+    Example::
+        cache = QueryCache(ttl=600)
+        sql = MySQLClient("real_estate.real_estate", cache=cache)
+        data = sql.query(postcode="1014AK")  # from MySQL
+        data = sql.query(postcode="1014AK")  # from cache
+    """
+
+    def __init__(self, ttl: float | None = 3600):
+        self.ttl = ttl
+        self._lock = Lock()
+        self._entries: dict[str, tuple[float, tuple[str, ...], Any]] = {}
+        self._invalidated: dict[str, float] = {}
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(ttl={self.ttl})"
+
+    @staticmethod
+    def key(query: Query | str, *params: Any) -> str:
+        """Create a cache key from a query and its parameters."""
+        return sha256(f"{_normalize_query(query)}\0{params!r}".encode()).hexdigest()
+
+    def get(self, key: str) -> Any:
+        """Return a cached value, or :data:`_MISSING` if there is none."""
+        entry = self._read(key)
+        if entry is None:
+            return _MISSING
+        created, tables, value = entry
+        if (self.ttl is not None and created + self.ttl < time()) or any(
+            created <= self._invalidated_at(table) for table in tables
+        ):
+            self._delete(key)
+            return _MISSING
+        return value
+
+    def set(self, key: str, tables: Iterable[str], value: Any) -> None:
+        """Store a value, together with the tables it was read from."""
+        self._write(key, (time(), tuple(tables), value))
+
+    def invalidate(self, *tables: str) -> None:
+        """Invalidate all entries that were read from any of these tables."""
+        now = time()
+        for table in tables:
+            self._set_invalidated_at(table.lower(), now)
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        with self._lock:
+            self._entries.clear()
+            self._invalidated.clear()
+
+    def _read(self, key: str) -> tuple[float, tuple[str, ...], Any] | None:
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return None
+        created, tables, value = entry
+        return created, tables, deepcopy(value)
+
+    def _write(self, key: str, entry: tuple[float, tuple[str, ...], Any]) -> None:
+        created, tables, value = entry
+        with self._lock:
+            self._entries[key] = created, tables, deepcopy(value)
+
+    def _delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def _invalidated_at(self, table: str) -> float:
+        return self._invalidated.get(table, 0.0)
+
+    def _set_invalidated_at(self, table: str, timestamp: float) -> None:
+        with self._lock:
+            self._invalidated[table] = timestamp
+
+
+class DiskQueryCache(QueryCache):
+    """On-disk cache for query results, which persists across runs.
+
+    Entries are pickled into :param path: (default: ~/.apollo/query_cache).
+    Invalidations are stored as marker files, so they are seen by every
+    process that shares the same directory.
+    """
+
+    def __init__(self, ttl: float | None = 3600, path: Path | str | None = None):
+        super().__init__(ttl=ttl)
+        self.path = Path(path) if path else _CACHE_DIR
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(ttl={self.ttl}, path='{self.path}')"
+
+    def clear(self) -> None:
+        for file in self.path.glob("*.*"):
+            with suppress(FileNotFoundError):
+                file.unlink()
+
+    def _read(self, key: str) -> tuple[float, tuple[str, ...], Any] | None:
+        try:
+            with open(self.path / f"{key}.pickle", "rb") as f:
+                entry: tuple[float, tuple[str, ...], Any] = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+        return entry
+
+    def _write(self, key: str, entry: tuple[float, tuple[str, ...], Any]) -> None:
+        tmp = self.path / f"{key}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self.path / f"{key}.pickle")
+
+    def _delete(self, key: str) -> None:
+        with suppress(FileNotFoundError):
+            (self.path / f"{key}.pickle").unlink()
+
+    def _invalidated_at(self, table: str) -> float:
+        try:
+            return (self.path / f"{table}.invalidated").stat().st_mtime
+        except FileNotFoundError:
+            return 0.0
+
+    def _set_invalidated_at(self, table: str, timestamp: float) -> None:
+        marker = self.path / f"{table}.invalidated"
+        marker.touch()
+        os.utime(marker, (timestamp, timestamp))
+
+
 # noinspection SqlInjection
 class MySQLClient:
     """Client for connecting to Matrixian's MySQL database.
@@ -139,6 +316,10 @@ class MySQLClient:
         by initializing with ``:param dictionary:=True``, setting
         ``:attr dictionary:=True`` manually, or by using a method with
         ``:param fieldnames:=True``.
+        :attr:`MySQLClient.cache` optionally holds a :class:`QueryCache`,
+        which caches the results of :meth:`MySQLClient.query` and
+        :meth:`MySQLClient.table`; entries for a table are invalidated
+        whenever this instance executes a statement that writes to it.
 
     Example::
         sql = MySQLClient("webspider_nl_google")
@@ -194,6 +375,13 @@ class MySQLClient:
         :param use_pure: Whether or not to use pure Python or C extension
         (default: False)
         :type use_pure: bool
+        :param cache: Cache results of :meth:`MySQLClient.query` and
+        :meth:`MySQLClient.table`; either "memory", "disk", or a
+        :class:`QueryCache` instance (default: None)
+        :type cache: str | QueryCache
+        :param cache_ttl: Seconds before a cached result expires, if
+        :param cache: is a string (default: 3600)
+        :type cache_ttl: float
 
         Examples::
             sql = MySQLClient()
@@ -201,6 +389,7 @@ class MySQLClient:
             sql = MySQLClient(database="webspider_nl_google",
                               table="pc_data_final")
             sql = MySQLClient("august_2017_google.shop_data_nl_main")
+            sql = MySQLClient("real_estate.real_estate", cache="disk")
         """
         global commondir  # noqa
 
@@ -208,6 +397,20 @@ class MySQLClient:
         dictionary = kwargs.pop("dictionary", True)
         raise_on_warnings = kwargs.pop("raise_on_warnings", True)
         use_pure = kwargs.pop("use_pure", False)
+        cache = kwargs.pop("cache", None)
+        cache_ttl = kwargs.pop("cache_ttl", 3600)
+
+        self.cache: QueryCache | None
+        if cache is None or isinstance(cache, QueryCache):
+            self.cache = cache
+        elif cache == "memory":
+            self.cache = QueryCache(ttl=cache_ttl)
+        elif cache == "disk":
+            self.cache = DiskQueryCache(ttl=cache_ttl)
+        else:
+            raise MySQLClientError(
+                f"`cache` should be 'memory', 'disk' or a QueryCache, not {cache!r}."
+            )
 
         if database and "." in database:
             database, table = database.split(".")
@@ -334,12 +537,32 @@ class MySQLClient:
         self._after_execute(query)
 
     def _after_execute(self, query: Query | str) -> None:
+        if self.cache is not None and not query.lstrip().upper().startswith(
+            _READ_STATEMENTS
+        ):
+            self.cache.invalidate(*_query_tables(query, self.database))
         query = query.upper()
         if any(st in query for st in self._after_execute_statements):
             assert isinstance(self.cnx, MySQLConnectionAbstract)
             self.cnx.commit()
         self._set_cursor_properties()
 
+    def _cached(
+        self,
+        query: Query | str,
+        fetch: Callable[[], Any],
+        *params: Any,
+    ) -> Any:
+        """Return the result of :param fetch: from cache, if caching is enabled."""
+        if self.cache is None:
+            return fetch()
+        key = self.cache.key(query, self.database, self.dictionary, *params)
+        result = self.cache.get(key)
+        if result is _MISSING:
+            result = fetch()
+            self.cache.set(key, _query_tables(query, self.database), result)
+        return result
+
     def fetchall(self) -> list[dict[str, Any] | tuple[Any, ...]]:
         """Returns all rows of a query result set."""
         assert isinstance(self.cursor, MySQLCursorAbstract)
@@ -437,11 +660,16 @@ class MySQLClient:
             query = self.build()
         if fieldnames is not None:
             self.dictionary = fieldnames
-        self.connect()
-        self.execute(query, *args, **kwargs)
-        table = self.fetchall()
-        self.disconnect()
-        return table
+
+        def fetch() -> list[dict[str, Any] | tuple[Any, ...]]:
+            assert query is not None
+            self.connect()
+            self.execute(query, *args, **kwargs)
+            table = self.fetchall()
+            self.disconnect()
+            return table
+
+        return self._cached(query, fetch, "table", args, kwargs)
 
     def row(
         self,
@@ -478,6 +706,21 @@ class MySQLClient:
         maximum_timeouts: bool = False,
     ) -> None:
         """Set session variables, for example to avoid error 2013 (Lost connection)."""
+        query = self._session_variables_query(
+            variables=variables, maximum_timeouts=maximum_timeouts
+        )
+        if cursor:
+            cursor.execute(query)
+        else:
+            assert isinstance(self.cursor, MySQLCursorAbstract)
+            self.cursor.execute(query)
+
+    @staticmethod
+    def _session_variables_query(
+        variables: dict[str, str] | None = None,
+        maximum_timeouts: bool = False,
+    ) -> str:
+        """Build the statement used by :meth:`MySQLClient.set_session_variables`."""
         if maximum_timeouts:
             variables = {
                 # "CONNECT_TIMEOUT"; "31536000",  # s, this is the maximum
@@ -498,14 +741,9 @@ class MySQLClient:
                 "WAIT_TIMEOUT": "7200",  # s
                 "innodb_lock_wait_timeout": "7200",  # s
             }
-        query = "SET SESSION " + ", ".join(
+        return "SET SESSION " + ", ".join(
             f"{var}={val}" for var, val in variables.items()
         )
-        if cursor:
-            cursor.execute(query)
-        else:
-            assert isinstance(self.cursor, MySQLCursorAbstract)
-            self.cursor.execute(query)
 
     def chunk(
         self,
@@ -1362,24 +1600,29 @@ class MySQLClient:
             self.table_name = table
         if fieldnames is not None:
             self.dictionary = fieldnames
-        self.connect()
-        try:
-            self.execute(query)
-            one_field = isinstance(select_fields, str)
-            if limit == 1:
-                result_dict_or_tuple = self.fetchone()
-                if isinstance(result_dict_or_tuple, tuple) and one_field:
-                    result = result_dict_or_tuple[0]
+        one_field = isinstance(select_fields, str)
+
+        def fetch() -> Any:
+            assert query is not None
+            self.connect()
+            try:
+                self.execute(query)
+                if limit == 1:
+                    result_dict_or_tuple = self.fetchone()
+                    if isinstance(result_dict_or_tuple, tuple) and one_field:
+                        result = result_dict_or_tuple[0]
+                    else:
+                        result = result_dict_or_tuple
                 else:
-                    result = result_dict_or_tuple
-            else:
-                result = [
-                    row[0] if (one_field and not isinstance(row, dict)) else row
-                    for row in self.fetchall()
-                ]
-        except DatabaseError as e:
-            raise MySQLClientError(query) from e
-        except IndexError:
-            result = None
-        self.disconnect()
-        return result
+                    result = [
+                        row[0] if (one_field and not isinstance(row, dict)) else row
+                        for row in self.fetchall()
+                    ]
+            except DatabaseError as e:
+                raise MySQLClientError(query) from e
+            except IndexError:
+                result = None
+            self.disconnect()
+            return result
+
+        return self._cached(query, fetch, "query", one_field, limit == 1)
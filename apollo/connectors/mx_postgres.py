@@ -2,17 +2,220 @@ from __future__ import annotations
 
 __all__ = ("PgSql",)
 
-from collections.abc import Collection, Iterable, Iterator, Sequence, Sized
+import os
+from collections.abc import Collection, Iterable, Iterator, Sequence
+from contextlib import suppress
+from datetime import date, datetime, time
 from functools import partial
-from typing import Any
+from itertools import chain, islice
+from json import dumps
+from logging import info
+from operator import itemgetter
+from threading import BoundedSemaphore, Lock
+from time import perf_counter
+from typing import IO, TYPE_CHECKING, Any
+from uuid import uuid4
 
 import psycopg2.extras
 from psycopg2 import sql
+from psycopg2.pool import ThreadedConnectionPool
 from psycopg2.sql import Composed as _Composed
 
 from ..exceptions import PgSqlError
 from ..secrets import get_secret
 
+if TYPE_CHECKING:
+    from numpy.typing import NDArray
+    from pandas import DataFrame
+
+_HOST = "37.97.209.246"
+_PORT = 5432
+
+# NumPy dtypes of PostgreSQL type OIDs, for typed batch fetching
+_DTYPES = {
+    16: "bool",
+    20: "int64",
+    21: "int16",
+    23: "int32",
+    700: "float32",
+    701: "float64",
+    1082: "datetime64[D]",
+    1114: "datetime64[us]",
+}
+
+
+class _BlockingPool(ThreadedConnectionPool):
+    """Connection pool whose `getconn` waits for a free connection,
+    instead of raising `PoolError` when `maxconn` connections are in use."""
+
+    def __init__(self, minconn: int, maxconn: int, *args: Any, **kwargs: Any):
+        self._slots = BoundedSemaphore(maxconn)
+        super().__init__(minconn, maxconn, *args, **kwargs)
+
+    def getconn(self, key: Any = None) -> Any:
+        self._slots.acquire()
+        try:
+            return super().getconn(key)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn: Any = None, key: Any = None, close: bool = False) -> None:
+        try:
+            super().putconn(conn, key, close)
+        finally:
+            # A connection that was already returned has released its slot
+            with suppress(ValueError):
+                self._slots.release()
+
+
+_pools: dict[str, _BlockingPool] = {}
+_pools_lock = Lock()
+_pools_pid = os.getpid()
+# Pools inherited from a parent process, kept referenced so that they are
+# never closed or collected in the child
+_orphaned: list[_BlockingPool] = []
+
+
+def _pool(database: str, minconn: int, maxconn: int) -> _BlockingPool:
+    """Return the process-wide connection pool of a database."""
+    global _pools_pid
+    with _pools_lock:
+        if _pools_pid != os.getpid():
+            # Connections can't be shared with a parent process, but they
+            # must not be closed either: closing (or collecting) them sends
+            # a Terminate message over the sockets shared with the parent,
+            # which ends its sessions. So they are set aside instead.
+            _orphaned.extend(_pools.values())
+            _pools.clear()
+            _pools_pid = os.getpid()
+        if database not in _pools:
+            usr, pwd = get_secret("MX_PSQL")
+            _pools[database] = _BlockingPool(
+                minconn,
+                maxconn,
+                host=_HOST,
+                port=_PORT,
+                database=database,
+                user=usr,
+                password=pwd,
+                connection_factory=psycopg2.extras.DictConnection,
+            )
+        return _pools[database]
+
+
+def _values(
+    rows: Iterable[Sequence[Any] | dict[str, Any]],
+    columns: Sequence[str] | None = None,
+) -> tuple[Iterator[Sequence[Any]] | None, Sequence[str] | None]:
+    """Return rows as sequences of values, and their columns.
+
+    Dicts are converted to values for :param columns: (default: the keys
+    of the first row). Returns None instead of rows if there are none.
+    """
+    iterator = iter(rows)
+    first = next(iterator, None)
+    if first is None:
+        return None, columns
+    values: Iterator[Any] = chain((first,), iterator)
+    if not isinstance(first, dict):
+        return values, columns
+    if columns is None:
+        columns = list(first)
+    getter = itemgetter(*columns)
+    mapped: Iterator[Sequence[Any]]
+    if len(columns) == 1:
+        mapped = ((getter(row),) for row in values)
+    else:
+        mapped = map(getter, values)
+    return mapped, columns
+
+
+def _column_list(columns: Sequence[str] | None) -> sql.Composable:
+    if not columns:
+        return sql.SQL("")
+    return sql.SQL("({})").format(sql.SQL(", ").join(map(sql.Identifier, columns)))
+
+
+def _column(values: tuple[Any, ...], type_code: int) -> NDArray[Any]:
+    """Convert a column of values to a NumPy array of a matching dtype."""
+    import numpy as np
+
+    dtype = _DTYPES.get(type_code, "object")
+    if dtype != "object" and None in values:
+        if dtype == "bool":
+            dtype = "object"
+        elif dtype[:2] in ("in", "fl"):
+            dtype = "float64"
+    return np.array(values, dtype=dtype)
+
+
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def _text(value: Any) -> str:
+    """Format a value in the text representation of PostgreSQL."""
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, (date, datetime, time)):
+        return value.isoformat()
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return f"\\x{bytes(value).hex()}"
+    if isinstance(value, dict):
+        return dumps(value)
+    if isinstance(value, (list, tuple)):
+        return _array(value)
+    return f"{value}"
+
+
+def _array(values: Sequence[Any]) -> str:
+    """Format a (nested) sequence as an array literal, e.g. {1,NULL,"a b"}."""
+    elements = []
+    for value in values:
+        if value is None:
+            elements.append("NULL")
+        elif isinstance(value, (list, tuple)):
+            elements.append(_array(value))
+        else:
+            text = _text(value).replace("\\", "\\\\").replace('"', '\\"')
+            elements.append(f'"{text}"')
+    return f"{{{','.join(elements)}}}"
+
+
+def _copy_value(value: Any) -> str:
+    """Format a value as a field of the COPY text format.
+
+    Lists and tuples are formatted as arrays, and dicts as JSON.
+    """
+    if value is None:
+        return "\\N"
+    return _text(value).translate(_COPY_ESCAPES)
+
+
+class _CopyReader:
+    """File-like object that formats rows for COPY FROM as they are read,
+    so that rows can be streamed without materializing them."""
+
+    def __init__(self, rows: Iterable[Iterable[Any]]):
+        self._rows = iter(rows)
+        self._buffer = ""
+
+    def read(self, size: int = -1) -> str:
+        lines, n = [self._buffer], len(self._buffer)
+        for row in self._rows:
+            line = "\t".join(map(_copy_value, row)) + "\n"
+            lines.append(line)
+            n += len(line)
+            if 0 <= size <= n:
+                break
+        data = "".join(lines)
+        if size < 0:
+            size = len(data)
+        self._buffer = data[size:]
+        return data[:size]
+
+    readline = read
+
 
 class PgSql:
     """Connector for PostgreSQL database.
@@ -28,17 +231,48 @@ class PgSql:
         table, column, value = "vgm_building", "vgo_building", "WTC%"
         with PgSql("vgm") as pg:
             data = list(pg.select(query, table, **{column: value}))
+
+    Connections are taken from a process-wide, thread-safe pool per
+    database, and returned to it on exit or `close`; when all connections
+    of the pool are in use, `connect` waits for one to be returned. With
+    `server_side_cursor=True`, every `fetch` streams its rows through a
+    uniquely named cursor, in batches of `itersize` rows, so that several
+    large result sets can be streamed at once. The cursors of fetches
+    that were not iterated to the end are closed on exit or `close`.
     """
 
     Error = psycopg2.Error  # noqa
     sql = sql
 
-    def __init__(self, database: str, server_side_cursor: bool = False):
+    def __init__(
+        self,
+        database: str,
+        server_side_cursor: bool = False,
+        itersize: int = 10_000,
+        minconn: int = 1,
+        maxconn: int = 16,
+    ):
+        """Create a connector for a PostgreSQL database.
+
+        :param itersize: Number of rows fetched at once by a server-side
+            cursor.
+        :param minconn: Number of connections in the pool of this
+            database that are kept open when idle.
+        :param maxconn: Maximum number of connections in the pool of
+            this database.
+
+        The pool of a database is created by its first connector, with
+        the `minconn` and `maxconn` of that connector.
+        """
         self.connection: psycopg2.extras.DictConnection | None = None
         self.cursor: psycopg2.extras.DictCursor | None = None
         self.database = database
         self.server_side_cursor = server_side_cursor
+        self.itersize = itersize
+        self.minconn = minconn
+        self.maxconn = maxconn
         self.query: bytes | None = None
+        self._named_cursors: set[Any] = set()
 
     def __enter__(self) -> PgSql:
         return self.connect()
@@ -48,20 +282,15 @@ class PgSql:
         assert isinstance(self.cursor, psycopg2.extras.DictCursor)
         self.cursor.__exit__(*args, **kwargs)
         self.connection.__exit__(*args, **kwargs)
+        self._close_named_cursors()
+        _pool(self.database, self.minconn, self.maxconn).putconn(self.connection)
+        self.connection = None
         if any((args, kwargs)):
             return False
         return True
 
     def connect(self) -> PgSql:
-        usr, pwd = get_secret("MX_PSQL")
-        self.connection = psycopg2.connect(
-            host="37.97.209.246",
-            port=5432,
-            database=self.database,
-            user=usr,
-            password=pwd,
-            connection_factory=psycopg2.extras.DictConnection,
-        ).__enter__()
+        self.connection = _pool(self.database, self.minconn, self.maxconn).getconn()
         self._connect_cursor()
         return self
 
@@ -72,17 +301,37 @@ class PgSql:
             self.cursor.close()
         except self.Error:
             pass
-        self.connection.close()
+        self._close_named_cursors()
+        _pool(self.database, self.minconn, self.maxconn).putconn(self.connection)
+        self.connection = None
 
     def _connect_cursor(self) -> None:
         assert isinstance(self.connection, psycopg2.extras.DictConnection)
-        if self.server_side_cursor:
-            self.cursor = self.connection.cursor(
-                "NamedCursor",
-                withhold=True,
-            ).__enter__()
-        else:
-            self.cursor = self.connection.cursor().__enter__()
+        self.cursor = self.connection.cursor().__enter__()
+
+    def _named_cursor(self, **kwargs: Any) -> Any:
+        """Create a server-side cursor with a unique name."""
+        assert isinstance(self.connection, psycopg2.extras.DictConnection)
+        cursor = self.connection.cursor(f"pgsql_{uuid4().hex}", withhold=True, **kwargs)
+        cursor.itersize = self.itersize
+        self._named_cursors.add(cursor)
+        return cursor
+
+    def _close_named_cursor(self, cursor: Any) -> None:
+        # Unless it was already closed with the connection
+        if cursor in self._named_cursors:
+            self._named_cursors.remove(cursor)
+            cursor.close()
+
+    def _close_named_cursors(self) -> None:
+        """Close the server-side cursors of unfinished fetches, which are
+        held open across transactions, before the connection is reused."""
+        assert isinstance(self.connection, psycopg2.extras.DictConnection)
+        while self._named_cursors:
+            try:
+                self._named_cursors.pop().close()
+            except self.Error:
+                self.connection.rollback()
 
     def _reconnect_cursor(self) -> None:
         assert isinstance(self.cursor, psycopg2.extras.DictCursor)
@@ -94,6 +343,82 @@ class PgSql:
         composed.execute = partial(self.execute, composed)
         return composed
 
+    def copy_in(
+        self,
+        table: str,
+        rows: Iterable[Sequence[Any] | dict[str, Any]],
+        columns: Sequence[str] | None = None,
+        *,
+        commit: bool = True,
+    ) -> int:
+        """Load rows into a table using COPY FROM STDIN.
+
+        Rows can be sequences of values (for all columns, or the given
+        :param columns:), or dicts, in which case their keys are used as
+        columns. Rows are formatted as they are sent, so a generator is
+        never materialized. Lists and tuples are copied as arrays, and
+        dicts as JSON; serialize other JSON values with `json.dumps`.
+
+        Returns the number of copied rows.
+
+        Example::
+            with PgSql("vgm") as pg:
+                pg.copy_in("vgm_account", ({"id": i} for i in range(10**6)))
+        """
+        assert isinstance(self.connection, psycopg2.extras.DictConnection)
+        values, columns = _values(rows, columns)
+        if values is None:
+            return 0
+        query = sql.SQL("COPY {} {} FROM STDIN").format(
+            sql.Identifier(table), _column_list(columns)
+        )
+        with self.connection.cursor() as cursor:
+            try:
+                cursor.copy_expert(query, _CopyReader(values), size=65_536)
+            except self.Error:
+                self.connection.rollback()
+                raise
+            count: int = cursor.rowcount
+        if commit:
+            self.connection.commit()
+        return count
+
+    def copy_out(
+        self,
+        query: str | _Composed,
+        fileobj: IO[Any],
+        args: Iterable[Any] | None = None,
+        options: str = "FORMAT csv, HEADER",
+    ) -> int:
+        """Export the result of a query to a file using COPY TO STDOUT.
+
+        :param args: are bound to placeholders in the query, and
+        :param options: are passed on to COPY (default: CSV with a header).
+
+        Returns the number of exported rows.
+
+        Example::
+            with PgSql("vgm") as pg, open("accounts.csv", "w") as f:
+                pg.copy_out("SELECT * FROM vgm_account", f)
+        """
+        assert isinstance(self.connection, psycopg2.extras.DictConnection)
+        if isinstance(query, str):
+            query = sql.SQL(query)
+        with self.connection.cursor() as cursor:
+            if args is not None:
+                query = sql.SQL(cursor.mogrify(query, args).decode())
+            copy = sql.SQL("COPY ({}) TO STDOUT WITH ({})").format(
+                query, sql.SQL(options)
+            )
+            try:
+                cursor.copy_expert(copy, fileobj, size=65_536)
+            except self.Error:
+                self.connection.rollback()
+                raise
+            count: int = cursor.rowcount
+        self.connection.commit()
+        return count
+
     def count(self, table: str) -> int:
         return next(self.select("SELECT COUNT(*) FROM {}", table))["count"]
 
@@ -147,18 +472,83 @@ class PgSql:
         *,
         ignore: bool = False,
     ) -> Iterator[psycopg2.extras.DictRow]:
-        self.execute(query, args)
-        assert isinstance(self.cursor, psycopg2.extras.DictCursor)
-        if ignore:
+        if not self.server_side_cursor:
+            self.execute(query, args)
+            cursor = self.cursor
+        else:
+            cursor = self._named_cursor()
+            try:
+                cursor.execute(query, args)
+            except self.Error:
+                self._close_named_cursor(cursor)
+                assert isinstance(self.connection, psycopg2.extras.DictConnection)
+                self.connection.rollback()
+                raise
+            self.query = cursor.query
+        assert isinstance(cursor, psycopg2.extras.DictCursor)
+        try:
+            if ignore:
+                while True:
+                    try:
+                        yield next(cursor)
+                    except PgSql.Error:
+                        pass
+                    except StopIteration:
+                        break
+            else:
+                yield from cursor
+        finally:
+            if cursor is not self.cursor:
+                self._close_named_cursor(cursor)
+
+    def fetch_batches(
+        self,
+        query: str | _Composed,
+        args: Iterable[Any] | None = None,
+        *,
+        size: int | None = None,
+        as_frame: bool = False,
+    ) -> Iterator[dict[str, NDArray[Any]] | DataFrame]:
+        """Stream the result of a query in batches of typed columns.
+
+        Rows are fetched through a server-side cursor, in batches of
+        :param size: rows (default: `itersize`). Every batch is returned
+        as a dict of NumPy arrays, or as a DataFrame if :param as_frame:.
+        Booleans, integers, floats, dates and timestamps get a matching
+        dtype (integers with NULL values become floats); other types are
+        returned as objects.
+
+        Example::
+            with PgSql("vgm") as pg:
+                for df in pg.fetch_batches("SELECT * FROM vgm_account", as_frame=True):
+                    print(df.dtypes)
+        """
+        if isinstance(query, str):
+            query = sql.SQL(query)
+        cursor = self._named_cursor(cursor_factory=psycopg2.extensions.cursor)
+        try:
+            cursor.execute(query, args)
+            self.query = cursor.query
             while True:
-                try:
-                    yield next(self.cursor)
-                except PgSql.Error:
-                    pass
-                except StopIteration:
+                rows = cursor.fetchmany(size or self.itersize)
+                if not rows:
                     break
-        else:
-            yield from self.cursor
+                batch = {
+                    column.name: _column(values, column.type_code)
+                    for column, values in zip(cursor.description, zip(*rows))
+                }
+                if as_frame:
+                    from pandas import DataFrame
+
+                    yield DataFrame(batch)
+                else:
+                    yield batch
+        except self.Error:
+            assert isinstance(self.connection, psycopg2.extras.DictConnection)
+            self.connection.rollback()
+            raise
+        finally:
+            self._close_named_cursor(cursor)
 
     def index(self, table: str, field: str, unique: bool = False) -> None:
         self.execute(
@@ -173,57 +563,190 @@ class PgSql:
     def insert(
         self,
         table: str,
-        args: Sequence[Sized] | Iterable[Iterable[Any]],
+        args: Iterable[Sequence[Any] | dict[str, Any]],
         n_values: int | None = None,
         ignore: bool = False,
         update_on: list[str] | str | None = None,
         fields_to_update: list[str] | str | None = None,
-    ) -> None:
+        *,
+        method: str = "copy",
+        page_size: int = 1_000,
+    ) -> int:
+        """Insert rows into a table.
+
+        Rows can be sequences of values for the first columns (usually
+        all of them), or dicts. :param n_values: is not needed anymore,
+        and ignored.
+
+        With `method="copy"` (default), rows are loaded using COPY. With
+        :param ignore: or :param update_on:, they are copied into a
+        temporary table first, and then inserted with ON CONFLICT DO
+        NOTHING, or ON CONFLICT DO UPDATE of :param fields_to_update:.
+
+        Where COPY isn't possible (e.g., because of triggers), use
+        `method="values"`: rows are then inserted with multi-row INSERT
+        statements of :param page_size: rows, using `execute_values`.
+
+        Of rows with the same :param update_on: values, the last one wins.
+        The number of rows and the throughput are logged.
+
+        Returns the number of inserted (or updated) rows.
+        """
         assert isinstance(self.connection, psycopg2.extras.DictConnection)
-        assert isinstance(self.cursor, psycopg2.extras.DictCursor)
-        if n_values:
-            pass
-        elif isinstance(args, Sequence) and isinstance(args[0], Sized):
-            n_values = len(args[0])
-        elif not n_values:
-            raise PgSqlError(
-                "Could not read number of values from args; provide n_values."
-            )
+        if method not in ("copy", "values"):
+            raise PgSqlError(f"Unknown method: {method}; use 'copy' or 'values'.")
+        columns: Sequence[str] | None = None
+        if isinstance(args, Sequence) and args and isinstance(args[0], dict):
+            columns = list(args[0])
         if isinstance(update_on, (str, list)):
-            if (
-                fields_to_update is None
-                and isinstance(args, Sequence)
-                and isinstance(args[0], dict)
-            ):
-                fields_to_update = list(args[0])
+            if fields_to_update is None and columns is not None:
+                fields_to_update = list(columns)
             if isinstance(fields_to_update, str):
-                set_fields = f"{update_on} = EXCLUDED.{update_on}"
-            elif isinstance(fields_to_update, list):
-                set_fields = ", ".join(
-                    f"{field} = EXCLUDED.{field}" for field in fields_to_update
-                )
-            else:
+                fields_to_update = [fields_to_update]
+            elif not isinstance(fields_to_update, list):
                 raise PgSqlError(
                     "Could not read the fields to be updated from args; provide fields_to_update."
                 )
-            if isinstance(update_on, list):
-                update_on = ", ".join(update_on)
-            on_conflict = f" ON CONFLICT ({update_on}) DO UPDATE SET {set_fields}"
+            if isinstance(update_on, str):
+                update_on = [update_on]
+            set_fields = ", ".join(
+                f"{field} = EXCLUDED.{field}" for field in fields_to_update
+            )
+            on_conflict = (
+                f" ON CONFLICT ({', '.join(update_on)}) DO UPDATE SET {set_fields}"
+            )
         elif ignore:
             on_conflict = " ON CONFLICT DO NOTHING"
         else:
             on_conflict = ""
-        composed = self.compose(
-            "INSERT INTO {} VALUES ({})" f"{on_conflict}",
-            sql.Identifier(table),
-            sql.SQL(", ").join(sql.Placeholder() * n_values),
+
+        start = perf_counter()
+        if method == "values":
+            count = self._insert_values(
+                table, args, columns, update_on, on_conflict, page_size
+            )
+        else:
+            rows, columns = _values(args, columns)
+            if rows is None:
+                count = 0
+            else:
+                if columns is None:
+                    # Unlike INSERT, COPY needs a value for every listed column
+                    first = next(rows)
+                    columns = self._columns(table)[: len(first)]
+                    rows = chain((first,), rows)
+                if on_conflict:
+                    count = self._insert_copy(
+                        table, rows, columns, update_on, on_conflict
+                    )
+                else:
+                    count = self.copy_in(table, rows, columns)
+        seconds = perf_counter() - start
+        info(
+            "%s: inserted %d rows in %.1f s (%.0f rows/s)",
+            table,
+            count,
+            seconds,
+            count / seconds if seconds else 0,
         )
-        try:
-            self.cursor.executemany(composed, args)
-        except self.Error:
-            self.connection.rollback()
-            raise
+        return count
+
+    def _insert_copy(
+        self,
+        table: str,
+        args: Iterable[Sequence[Any] | dict[str, Any]],
+        columns: Sequence[str] | None,
+        update_on: list[str] | None,
+        on_conflict: str,
+    ) -> int:
+        """Copy rows into a temporary table, and insert them from there."""
+        assert isinstance(self.connection, psycopg2.extras.DictConnection)
+        temp = sql.Identifier(f"_copy_{table}")
+        if update_on:
+            # ON CONFLICT DO UPDATE can't affect a row twice
+            keys = sql.SQL(", ").join(map(sql.Identifier, update_on))
+            select = sql.SQL(
+                "SELECT DISTINCT ON ({}) * FROM {} ORDER BY {}, ctid DESC"
+            ).format(keys, temp, keys)
+        else:
+            select = sql.SQL("SELECT * FROM {}").format(temp)
+        with self.connection.cursor() as cursor:
+            try:
+                cursor.execute(
+                    sql.SQL(
+                        "CREATE TEMPORARY TABLE {} (LIKE {} INCLUDING DEFAULTS)"
+                        " ON COMMIT DROP"
+                    ).format(temp, sql.Identifier(table))
+                )
+                self.copy_in(temp.string, args, columns, commit=False)
+                cursor.execute(
+                    sql.SQL("INSERT INTO {} {} SELECT {} FROM ({}) AS c").format(
+                        sql.Identifier(table),
+                        _column_list(columns),
+                        sql.SQL(", ").join(map(sql.Identifier, columns))
+                        if columns
+                        else sql.SQL("*"),
+                        select,
+                    )
+                    + sql.SQL(on_conflict)
+                )
+                count: int = cursor.rowcount
+            except self.Error:
+                self.connection.rollback()
+                raise
+        self.connection.commit()
+        return count
+
+    def _insert_values(
+        self,
+        table: str,
+        args: Iterable[Sequence[Any] | dict[str, Any]],
+        columns: Sequence[str] | None,
+        update_on: list[str] | None,
+        on_conflict: str,
+        page_size: int,
+    ) -> int:
+        """Insert rows with multi-row INSERT statements of a page each."""
+        assert isinstance(self.connection, psycopg2.extras.DictConnection)
+        values, columns = _values(args, columns)
+        if values is None:
+            return 0
+        query = sql.SQL("INSERT INTO {} {} VALUES %s").format(
+            sql.Identifier(table), _column_list(columns)
+        ) + sql.SQL(on_conflict)
+        key = None
+        if update_on:
+            # ON CONFLICT DO UPDATE can't affect a row twice in a statement
+            if columns is None:
+                columns = self._columns(table)
+            key = itemgetter(*(columns.index(field) for field in update_on))
+        count = 0
+        with self.connection.cursor() as cursor:
+            try:
+                while True:
+                    page = list(islice(values, page_size))
+                    if not page:
+                        break
+                    if key is not None:
+                        page = list({key(row): row for row in page}.values())
+                    psycopg2.extras.execute_values(
+                        cursor, query, page, page_size=len(page)
+                    )
+                    count += cursor.rowcount
+            except self.Error:
+                self.connection.rollback()
+                raise
         self.connection.commit()
+        return count
+
+    def _columns(self, table: str) -> list[str]:
+        """Return the column names of a table."""
+        assert isinstance(self.connection, psycopg2.extras.DictConnection)
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                sql.SQL("SELECT * FROM {} LIMIT 0").format(sql.Identifier(table))
+            )
+            return [column.name for column in cursor.description]
 
     def select(
         self,
@@ -5,13 +5,24 @@ __all__ = (
     "SQLtoMongo",
 )
 
+import pickle
 from abc import ABC, abstractmethod
-from collections.abc import Callable
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import Future, ProcessPoolExecutor
 from contextlib import suppress
+from datetime import date, datetime
+from decimal import Decimal
+from functools import partial
+from json import loads
+from pathlib import Path
+from queue import Empty, Full, Queue
+from threading import Event, Lock, Thread
+from time import monotonic, perf_counter
 from typing import Any, NewType
 
-from pandas import DataFrame, read_sql
-from pymongo import IndexModel, UpdateMany, UpdateOne
+from pandas import DataFrame, notna, read_sql
+from pymongo import DeleteMany, IndexModel, UpdateMany, UpdateOne
 from pymongo.errors import OperationFailure
 from sqlalchemy import create_engine
 from tqdm import tqdm
@@ -21,6 +32,60 @@ from ..connectors.mx_mongo import MongoDB, MxCollection
 from ..connectors.mx_mysql import MySQLClient
 from ..exceptions import ConnectorError
 
+_WATERMARKS = "sqltomongo_watermarks"
+
+
+def _bson_value(value: Any) -> Any:
+    """Convert a pandas, NumPy, decimal or date value to a BSON-encodable
+    value."""
+    if isinstance(value, Decimal):
+        return float(value)
+    if type(value) is date:
+        return datetime.combine(value, datetime.min.time())
+    if hasattr(value, "to_pydatetime"):
+        return value.to_pydatetime()
+    if hasattr(value, "item"):
+        return value.item()
+    return value
+
+
+def _bson_record(row: dict[str, Any] | list[Any]) -> dict[str, Any]:
+    assert isinstance(row, dict)
+    return {key: _bson_value(value) for key, value in row.items()}
+
+
+def _timed(
+    function: Callable[[list[dict[str, Any]]], list[Any]],
+    records: list[dict[str, Any]],
+) -> tuple[list[Any], float]:
+    start = perf_counter()
+    return function(records), perf_counter() - start
+
+
+def _documents(
+    mappings: MappingsBase,
+    records: list[dict[str, Any]],
+) -> list[dict[str, Any]]:
+    return [mappings.document(d) for d in records]
+
+
+def _updates(
+    filter: Callable[[dict[str, Any]], dict[str, Any]],  # noqa
+    update: Callable[[dict[str, Any]], dict[str, Any]],
+    update_cls: type[UpdateMany] | type[UpdateOne],  # noqa
+    upsert: bool,
+    records: list[dict[str, Any]],
+) -> list[UpdateMany | UpdateOne]:
+    return [update_cls(filter(d), update(d), upsert=upsert) for d in records]
+
+
+def _upsert(filter: dict[str, Any], document: dict[str, Any]) -> UpdateOne:  # noqa
+    """Upsert a mapped document; its _id, if any, is only set on insert."""
+    update = {"$set": document}
+    if "_id" in document:
+        update["$setOnInsert"] = {"_id": document.pop("_id")}
+    return UpdateOne(filter, update, upsert=True)
+
 
 class MappingsBase(ABC):
     @abstractmethod
@@ -50,7 +115,21 @@ class SQLtoMongo:
 
         Provide a MySQL from database and table, and a MongoDB to database
         and collection. Additionally, provide a mappings object, which should
-        at least have a :meth: `Mappings.document`"""
+        at least have a :meth: `Mappings.document`
+
+        :meth: `SQLtoMongo.insert` and :meth: `SQLtoMongo.update` run as a
+        pipeline: a reader thread prefetches :param prefetch: chunks
+        (default: 2), the chunks are mapped in the main thread or in a pool
+        of :param processes: processes (default: 0, for CPU-heavy mappings;
+        requires picklable mappings, and for `update`, module-level filter
+        and update functions instead of lambdas), and :param writers: threads
+        (default: 1) write them with unordered bulk writes.
+
+        Set :param stream: to True to stream rows as dicts from an
+        unbuffered cursor, instead of reading DataFrames with pandas. The
+        DataFrame mode is still used for `preprocessing` and
+        `index_columns`. Note that NULL values are then None instead of
+        NaN; as with pandas, decimals become floats and dates datetimes."""
         self.coll = MongoDB(
             database=mongo_database,
             collection=mongo_collection,
@@ -75,6 +154,185 @@ class SQLtoMongo:
         self.chunksize = kwargs.pop("chunksize", 1_000)
         self.date_columns = kwargs.pop("date_columns", None)
         self.index_columns = kwargs.pop("index_columns", None)
+        self.stream = kwargs.pop("stream", False)
+        self.prefetch = kwargs.pop("prefetch", 2)
+        self.processes = kwargs.pop("processes", 0)
+        self.writers = kwargs.pop("writers", 1)
+        self.rows_read = 0
+        self.timings: dict[str, float] = {}
+        self._lock = Lock()
+
+    def apply_changes(
+        self,
+        events: Iterable[dict[str, Any]],
+        *,
+        filter: Callable[[dict[str, Any]], dict[str, Any]],
+        field: str | None = None,
+        batch_size: int = 1_000,
+        flush_interval: float = 1.0,
+    ) -> None:
+        """Apply a feed of row changes from MySQL to MongoDB.
+
+        Provide change events from :meth: `SQLtoMongo.binlog_events` or
+        :meth: `SQLtoMongo.recorded_events`. Events are dicts with a
+        "type": "insert", "update" and "delete" events have "schema",
+        "table" and "rows" (the row values, after an update), "commit"
+        events have the binlog position ("log_file" and "log_pos"), and
+        "heartbeat" events have nothing.
+
+        Inserted and updated rows of this table are mapped using
+        :attr: `SQLtoMongo.mappings.document`, and upserted in the
+        document selected by :param filter:. Deleted rows are deleted
+        where :param field: equals :attr: `SQLtoMongo.mappings.delete`.
+
+        Operations are written in order, in micro-batches of at most
+        :param batch_size: operations or :param flush_interval: seconds.
+        After every batch, the position of the last commit is saved in the
+        `sqltomongo_watermarks` collection, from where
+        :meth: `SQLtoMongo.binlog_events` resumes; use
+        `reset_watermark("binlog")` to start over.
+
+        Example::
+            stm.apply_changes(
+                stm.binlog_events(),
+                filter=lambda d: {"address.identification.addressId": d["id"]},
+                field="address.identification.addressId",
+            )
+        """
+        assert isinstance(self.coll, MxCollection)
+        assert isinstance(self.mappings, MappingsBase)
+        state = self.coll.database[_WATERMARKS]
+        key = self._watermark_key("binlog")
+        table = (self.sql.database, self.sql.table_name)
+        requests: list[DeleteMany | UpdateOne] = []
+        position: dict[str, Any] | None = None
+        flushed = monotonic()
+
+        def flush() -> None:
+            nonlocal requests, flushed
+            assert isinstance(self.coll, MxCollection)
+            if requests:
+                result = self.coll.bulk_write(requests=requests)
+                self.matched_count += result.matched_count
+                self.number_of_updates += result.modified_count
+                self.number_of_insertions += result.upserted_count
+                self.number_of_deletions += result.deleted_count
+            if position is not None:
+                state.update_one(
+                    {"_id": key}, {"$set": {"value": position}}, upsert=True
+                )
+            requests, flushed = [], monotonic()
+
+        for event in events:
+            if event["type"] == "commit":
+                position = {"log_file": event["log_file"], "log_pos": event["log_pos"]}
+            elif (event.get("schema"), event.get("table")) == table:
+                for row in event["rows"]:
+                    if event["type"] != "delete":
+                        document = self.mappings.document(row)
+                        requests.append(_upsert(filter(row), document))
+                    elif field is None:
+                        raise ConnectorError("Provide a field to apply deletes.")
+                    else:
+                        requests.append(DeleteMany({field: self.mappings.delete(row)}))
+            if len(requests) >= batch_size or monotonic() - flushed >= flush_interval:
+                flush()
+        flush()
+
+    def binlog_events(
+        self,
+        server_id: int = 1_000,
+        **kwargs: Any,
+    ) -> Iterator[dict[str, Any]]:
+        """Stream the row changes of this table from the MySQL binlog.
+
+        Requires `mysql-replication`, a binlog in ROW format, and a user
+        with REPLICATION SLAVE and REPLICATION CLIENT privileges. Provide
+        a :param server_id: that is unique among the replicas. The stream
+        resumes from the position saved by :meth: `SQLtoMongo.apply_changes`,
+        and waits for new events; heartbeats are sent every
+        `slave_heartbeat` seconds (default: 1). Other keyword arguments
+        are passed on to `BinLogStreamReader`.
+
+        Yields events in the format of :meth: `SQLtoMongo.apply_changes`.
+        """
+        from pymysqlreplication import BinLogStreamReader
+        from pymysqlreplication.event import HeartbeatLogEvent, XidEvent
+        from pymysqlreplication.row_event import (
+            DeleteRowsEvent,
+            UpdateRowsEvent,
+            WriteRowsEvent,
+        )
+
+        config = self.sql.__dict__["_MySQLClient__config"]
+        settings = {
+            "host": config["host"],
+            "user": config["user"],
+            "passwd": config["password"],
+        }
+        if config.get("ssl_ca"):
+            settings["ssl"] = {
+                "ca": config["ssl_ca"],
+                "cert": config.get("ssl_cert"),
+                "key": config.get("ssl_key"),
+            }
+        position = self.binlog_position()
+        if position is not None:
+            kwargs.setdefault("log_file", position["log_file"])
+            kwargs.setdefault("log_pos", position["log_pos"])
+            kwargs.setdefault("resume_stream", True)
+        kwargs.setdefault("blocking", True)
+        kwargs.setdefault("slave_heartbeat", 1)
+        rows_events = {
+            WriteRowsEvent: ("insert", "values"),
+            UpdateRowsEvent: ("update", "after_values"),
+            DeleteRowsEvent: ("delete", "values"),
+        }
+        stream = BinLogStreamReader(
+            connection_settings=settings,
+            server_id=server_id,
+            only_schemas=[self.sql.database],
+            only_tables=[self.sql.table_name],
+            only_events=[*rows_events, XidEvent, HeartbeatLogEvent],
+            **kwargs,
+        )
+        try:
+            for event in stream:
+                if isinstance(event, XidEvent):
+                    yield {
+                        "type": "commit",
+                        "log_file": stream.log_file,
+                        "log_pos": stream.log_pos,
+                    }
+                elif isinstance(event, HeartbeatLogEvent):
+                    yield {"type": "heartbeat"}
+                else:
+                    kind, values = rows_events[type(event)]
+                    yield {
+                        "type": kind,
+                        "schema": event.schema,
+                        "table": event.table,
+                        "rows": [row[values] for row in event.rows],
+                    }
+        finally:
+            stream.close()
+
+    def binlog_position(self) -> dict[str, Any] | None:
+        """Return the binlog position saved by :meth: `SQLtoMongo.apply_changes`."""
+        assert isinstance(self.coll, MxCollection)
+        state = self.coll.database[_WATERMARKS].find_one(
+            {"_id": self._watermark_key("binlog")}
+        )
+        return state["value"] if state else None
+
+    @staticmethod
+    def recorded_events(path: Path | str) -> Iterator[dict[str, Any]]:
+        """Read change events from a JSON Lines file, one event per line,
+        in the format of :meth: `SQLtoMongo.apply_changes`."""
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    yield loads(line)
 
     def create_indexes(self, names: list[str]) -> None:
         """Create indexes in the MongoDB collection.
@@ -109,10 +367,8 @@ class SQLtoMongo:
             self.number_of_deletions += result.deleted_count
         else:
             assert isinstance(self.mappings, MappingsBase)
-            for chunk in self.generator_df:
-                if preprocessing:
-                    chunk = preprocessing(chunk)
-                chunk = [self.mappings.delete(d) for d in chunk.to_dict("records")]
+            for records in self._records(self.query, preprocessing=preprocessing):
+                chunk = [self.mappings.delete(d) for d in records]
                 result = self.coll.delete_many(filter={field: {"$in": chunk}})
                 self.number_of_deletions += result.deleted_count
 
@@ -129,20 +385,53 @@ class SQLtoMongo:
 
     @property
     def generator_df(self) -> DataFrame:
+        return self._read_sql(self.query)
+
+    def _read_sql(
+        self,
+        query: str | None,
+        params: dict[str, Any] | None = None,
+    ) -> DataFrame:
         self._set_session_variables()
         try:
             return read_sql(
-                sql=self.query,
+                sql=query,
                 con=self.engine,
+                params=params,
                 chunksize=self.chunksize,
                 parse_dates=self.date_columns,
                 index_col=self.index_columns,
             )
         except Exception as e:
-            if not self.query:
+            if not query:
                 raise ConnectorError("Use `.set_query()` to set a query first.") from e
             raise
 
+    def _records(
+        self,
+        query: str | None,
+        params: dict[str, Any] | None = None,
+        preprocessing: Callable[[DataFrame], DataFrame] | None = None,
+    ) -> Iterator[list[dict[str, Any]]]:
+        """Yield chunks of rows as lists of dicts.
+
+        With `stream=True`, rows are fetched from an unbuffered
+        :class:`MySQLClient` cursor, skipping pandas entirely, unless
+        `preprocessing` or `index_columns` need a DataFrame.
+        """
+        if self.stream and preprocessing is None and self.index_columns is None:
+            if not query:
+                raise ConnectorError("Use `.set_query()` to set a query first.")
+            args = (params,) if params else ()
+            for rows in self.sql.chunk(query, self.chunksize, *args, fieldnames=True):
+                assert rows is not None
+                yield [_bson_record(row) for row in rows]
+            return
+        for chunk in self._read_sql(query, params):
+            if preprocessing:
+                chunk = preprocessing(chunk)
+            yield chunk.to_dict("records")
+
     def insert(
         self,
         *,
@@ -156,12 +445,134 @@ class SQLtoMongo:
         """
         assert isinstance(self.coll, MxCollection)
         assert isinstance(self.mappings, MappingsBase)
-        for chunk in self.generator_df:
-            if preprocessing:
-                chunk = preprocessing(chunk)
-            chunk = [self.mappings.document(d) for d in chunk.to_dict("records")]
-            result = self.coll.insert_many(chunk)
-            self.number_of_insertions += len(result.inserted_ids)
+
+        def write(documents: list[dict[str, Any]]) -> None:
+            assert isinstance(self.coll, MxCollection)
+            result = self.coll.insert_many(documents, ordered=False)
+            with self._lock:
+                self.number_of_insertions += len(result.inserted_ids)
+
+        self._pipeline(
+            self._records(self.query, preprocessing=preprocessing),
+            partial(_documents, self.mappings),
+            write,
+        )
+
+    def _pipeline(
+        self,
+        chunks: Iterable[list[dict[str, Any]]],
+        transform: Callable[[list[dict[str, Any]]], list[Any]],
+        write: Callable[[list[Any]], None],
+        progress_bar: bool = False,
+    ) -> None:
+        """Read, transform and write chunks in concurrent stages.
+
+        The stages are connected by bounded queues, and stop as soon as
+        one of them fails; the error is then raised. The time spent in
+        every stage (summed over its workers) is added to
+        :attr: `SQLtoMongo.timings`.
+        """
+        if self.processes:
+            try:
+                pickle.dumps(transform)
+            except (AttributeError, TypeError, pickle.PicklingError) as e:
+                raise ConnectorError(
+                    "With processes, the mappings and functions must be picklable;"
+                    " use module-level functions instead of lambdas."
+                ) from e
+        records_queue: Queue[list[dict[str, Any]] | None] = Queue(self.prefetch)
+        requests_queue: Queue[list[Any] | None] = Queue(max(self.writers, 1) * 2)
+        timings = {"read": 0.0, "transform": 0.0, "write": 0.0}
+        errors: list[Exception] = []
+        stop = Event()
+
+        def put(queue: Queue[Any], item: Any) -> None:
+            while not stop.is_set():
+                with suppress(Full):
+                    queue.put(item, timeout=0.1)
+                    return
+
+        def get(queue: Queue[Any]) -> Any:
+            while not stop.is_set():
+                with suppress(Empty):
+                    return queue.get(timeout=0.1)
+            return None
+
+        def fail(e: Exception) -> None:
+            errors.append(e)
+            stop.set()
+
+        def read() -> None:
+            try:
+                iterator = iter(tqdm(chunks, disable=not progress_bar))
+                while not stop.is_set():
+                    start = perf_counter()
+                    records = next(iterator, None)
+                    if records is None:
+                        break
+                    timings["read"] += perf_counter() - start
+                    put(records_queue, records)
+            except Exception as e:
+                fail(e)
+            finally:
+                put(records_queue, None)
+
+        def write_chunks() -> None:
+            for requests in iter(lambda: get(requests_queue), None):
+                start = perf_counter()
+                try:
+                    write(requests)
+                except Exception as e:
+                    fail(e)
+                    return
+                with self._lock:
+                    timings["write"] += perf_counter() - start
+
+        def transformed() -> Iterator[tuple[list[Any], float]]:
+            records_iterator = iter(lambda: get(records_queue), None)
+            if not self.processes:
+                for records in records_iterator:
+                    yield _timed(transform, records)
+                return
+            with ProcessPoolExecutor(self.processes) as executor:
+                futures: deque[Future[tuple[list[Any], float]]] = deque()
+                for records in records_iterator:
+                    futures.append(executor.submit(_timed, transform, records))
+                    if len(futures) > self.processes:
+                        yield futures.popleft().result()
+                while futures and not stop.is_set():
+                    yield futures.popleft().result()
+
+        start = perf_counter()
+        threads = [Thread(target=read, daemon=True)]
+        threads.extend(
+            Thread(target=write_chunks, daemon=True) for _ in range(self.writers)
+        )
+        for thread in threads:
+            thread.start()
+        try:
+            for requests, seconds in transformed():
+                timings["transform"] += seconds
+                self.rows_read += len(requests)
+                if requests:
+                    put(requests_queue, requests)
+        except Exception as e:
+            fail(e)
+        except BaseException:
+            # Stop the other stages on KeyboardInterrupt, and re-raise
+            stop.set()
+            raise
+        finally:
+            for _ in range(self.writers):
+                put(requests_queue, None)
+            for thread in threads:
+                thread.join()
+
+        timings["total"] = perf_counter() - start
+        for stage, seconds in timings.items():
+            self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+        if errors:
+            raise errors[0]
 
     def notify(
         self,
@@ -183,7 +594,24 @@ class SQLtoMongo:
             f"Number of updated documents: {self.number_of_updates}\n"
             f"Number of deleted documents: {self.number_of_deletions}\n"
             f"Number of inserted documents: {self.number_of_insertions}\n"
-            f"Total number of documents affected: {total}",
+            f"Total number of documents affected: {total}"
+            f"{self._report()}",
+        )
+
+    def _report(self) -> str:
+        """Report the throughput and stage timings of the pipeline."""
+        if not self.timings.get("total"):
+            return ""
+        stages = ", ".join(
+            f"{stage} {seconds:,.1f} s"
+            for stage, seconds in self.timings.items()
+            if stage != "total"
+        )
+        return (
+            f"\n\nNumber of rows read: {self.rows_read}"
+            f" in {self.timings['total']:,.1f} s"
+            f" ({self.rows_read / self.timings['total']:,.0f} rows/s)\n"
+            f"Time spent per stage: {stages}"
         )
 
     def set_query(
@@ -204,6 +632,110 @@ class SQLtoMongo:
         else:
             self.query = f"SELECT * FROM {self.sql.database}.{self.sql.table_name}"
 
+    def sync(
+        self,
+        *,
+        watermark: str,
+        filter: Callable[[dict[str, Any]], dict[str, Any]],
+        preprocessing: Callable[[DataFrame], DataFrame] | None = None,
+        progress_bar: bool = False,
+    ) -> None:
+        """Upsert the rows that changed since the previous sync.
+
+        Provide the :param watermark: column, such as an `updated_at`
+        timestamp or an auto-increment ID (preferably indexed), and a
+        :param filter: that selects the document of a row. Only rows with
+        a watermark of at least the persisted one are selected from
+        :attr: `SQLtoMongo.query` (default: the whole table), in order of
+        the watermark. They are mapped using
+        :attr: `SQLtoMongo.mappings.document`, and upserted with
+        unordered `UpdateOne` bulk writes. Write a literal % in the query
+        as a single %; it is escaped when the watermark is bound.
+
+        The highest watermark is saved in the `sqltomongo_watermarks`
+        collection of the MongoDB database after every chunk, so that an
+        interrupted sync resumes where it stopped. The first sync, or a
+        sync after :meth: `SQLtoMongo.reset_watermark`, reads all rows.
+
+        Example::
+            stm = SQLtoMongo(
+                mongo_database="dev_realestate",
+                mongo_collection="real_estate",
+                sql_database="real_estate",
+                sql_table="real_estate",
+                mappings=Mappings(),
+            )
+            stm.set_query()
+            stm.sync(
+                watermark="updated_at",
+                filter=lambda d: {"address.identification.addressId": d["id"]},
+            )
+        """
+        assert isinstance(self.coll, MxCollection)
+        assert isinstance(self.mappings, MappingsBase)
+        if not self.query:
+            raise ConnectorError("Use `.set_query()` to set a query first.")
+        state = self.coll.database[_WATERMARKS]
+        key = self._watermark_key(watermark)
+        last = state.find_one({"_id": key})
+        query = self.query
+        if last is not None:
+            # The watermark is bound as a parameter, so escape literal %
+            query = query.replace("%", "%%")
+        query = f"SELECT * FROM ({query}) AS q"
+        if last is not None:
+            # Rows that share the last watermark may have been added since
+            query = f"{query} WHERE `{watermark}` >= %(watermark)s"
+        query = f"{query} ORDER BY `{watermark}`"
+        params = {"watermark": last["value"]} if last is not None else None
+
+        values: list[Any] = []
+
+        def checkpoint(chunk: DataFrame) -> DataFrame:
+            values.append(chunk[watermark].max())
+            assert preprocessing is not None
+            return preprocessing(chunk)
+
+        for records in tqdm(
+            self._records(query, params, checkpoint if preprocessing else None),
+            disable=not progress_bar,
+        ):
+            # Rows are ordered by the watermark, with NULL values first
+            if values:
+                value = values.pop()
+            elif records and watermark not in records[-1]:
+                raise ConnectorError(
+                    f"The watermark {watermark} must be a column of the rows."
+                )
+            else:
+                value = records[-1][watermark] if records else None
+            requests = [_upsert(filter(d), self.mappings.document(d)) for d in records]
+            if requests:
+                result = self.coll.bulk_write(requests=requests, ordered=False)
+                self.matched_count += result.matched_count
+                self.number_of_updates += result.modified_count
+                self.number_of_insertions += result.upserted_count
+            if notna(value):
+                state.update_one(
+                    {"_id": key},
+                    {"$set": {"value": _bson_value(value)}},
+                    upsert=True,
+                )
+
+    def reset_watermark(self, watermark: str) -> None:
+        """Delete the persisted watermark, so that the next sync reads all
+        rows."""
+        assert isinstance(self.coll, MxCollection)
+        self.coll.database[_WATERMARKS].delete_one(
+            {"_id": self._watermark_key(watermark)}
+        )
+
+    def _watermark_key(self, watermark: str) -> str:
+        return (
+            f"{self.sql.database}.{self.sql.table_name}.{watermark}"
+            f" -> {self.coll.full_name}"
+        )
+
     def update(
         self,
         *,
@@ -214,18 +746,26 @@ class SQLtoMongo:
         update_cls: type[UpdateMany] | type[UpdateOne] = UpdateOne,  # noqa
         upsert: bool = False,
     ) -> None:
+        """Update documents in MongoDB from MySQL.
+
+        For every row selected using :attr: `SQLtoMongo.query`, an
+        `update_cls` operation is made using :param filter: and
+        :param update:, and these are written with unordered bulk writes.
+        With multiple writers, chunks may be written out of order: use one
+        writer if the same documents are updated by more than one chunk.
+        """
         assert isinstance(self.coll, MxCollection)
-        for chunk in tqdm(self.generator_df, disable=not progress_bar):
-            if preprocessing:
-                chunk = preprocessing(chunk)
-            chunk = [
-                update_cls(
-                    filter(d),
-                    update(d),
-                    upsert=upsert,
-                )
-                for d in chunk.to_dict("records")
-            ]
-            result = self.coll.bulk_write(requests=chunk)
-            self.matched_count += result.matched_count
-            self.number_of_updates += result.modified_count
+
+        def write(requests: list[UpdateMany | UpdateOne]) -> None:
+            assert isinstance(self.coll, MxCollection)
+            result = self.coll.bulk_write(requests=requests, ordered=False)
+            with self._lock:
+                self.matched_count += result.matched_count
+                self.number_of_updates += result.modified_count
+
+        self._pipeline(
+            self._records(self.query, preprocessing=preprocessing),
+            partial(_updates, filter, update, update_cls, upsert),
+            write,
+            progress_bar=progress_bar,
+        )
@@ -12,6 +12,7 @@ Usage::
 Modifiers (with defaults)::
     set_alpha(alpha=.05)
     set_clean_email(clean_email=True)
+    set_page_size(size=10, min_score=None, terminate_after=None)
     set_population_size(oldest_client_record_in_years=20)
     set_search_size(size=10)
     set_years_ago(years_ago=3)
@@ -41,6 +42,7 @@ __all__ = (
     "set_alpha",
     "set_clean_email",
     "set_must_have_address",
+    "set_page_size",
     "set_population_size",
     "set_search_size",
     "set_years_ago",
@@ -90,6 +92,24 @@ def set_search_size(size: int = 10) -> bool:
     return True
 
 
+def set_page_size(
+    size: int | None = 10,
+    min_score: float | None = None,
+    terminate_after: int | None = None,
+) -> bool:
+    """Set the size of the first page of hits for adaptive paging.
+
+    Set :param size: to None to request `Constant.SEARCH_SIZE` hits at once.
+    With :param min_score:, pages are requested while they have hits
+    scoring at least this high. With :param terminate_after:, every
+    shard stops collecting after this many documents.
+    """
+    Constant.PAGE_SIZE = size
+    Constant.MIN_SCORE = min_score
+    Constant.TERMINATE_AFTER = terminate_after
+    return True
+
+
 def set_years_ago(years_ago: int = 3) -> bool:
     Constant.YEARS_AGO = Constant.TODAY - timedelta(days=365.25 * years_ago)
     return True
@@ -99,6 +119,9 @@ class Constant:
     CLEAN_EMAIL = True
     MUST_HAVE_ADDRESS = False
     SEARCH_SIZE = 10_000
+    PAGE_SIZE: int | None = 10
+    MIN_SCORE: float | None = None
+    TERMINATE_AFTER: int | None = None
     HIGH_SCORE = 1
     LOW_SCORE = 4
     YEAR_STEP = 3
@@ -133,6 +156,23 @@ class Constant:
         "family",
     )
     PERSON_META = (*NAME, *OTHER, *META)
+    SOURCE_FIELDS = [  # The fields read by `Person.from_doc`
+        "details.lastname",
+        "details.initials",
+        "details.gender",
+        "address.postalCode",
+        "address.houseNumber",
+        "address.houseNumberExt",
+        "address.street",
+        "address.city",
+        "address.country",
+        "phoneNumber.mobile",
+        "phoneNumber.number",
+        "birth.date",
+        "contact.email",
+        "date",
+        "source",
+    ]
     COPY_FAMILY = ("address", "number", "lastname", "middlename")
     COPY_PERSON = (
         *COPY_FAMILY,
@@ -573,7 +613,7 @@ class Names:
     All data pertains to the Netherlands, and is loaded using Elasticsearch.
     """
 
-    @property
+    @cached_property
     def es(self) -> ESClient:
         return ESClient(Constant.ND_INDEX)
 
@@ -1256,7 +1296,7 @@ class Match:
         "person",
         "query",
     )
-    _es = ESClient(Constant.PD_INDEX)
+    _es = ESClient(Constant.PD_INDEX, http_compress=True)
 
     def __init__(self, matchable: Matchable, query_type: str = "person_query"):
         self._composite: Person | None = None
@@ -1281,17 +1321,59 @@ class Match:
 
     @property
     def search_response(self) -> list[dict[str, Any]]:
-        """Elastic response for this Match."""
+        """Elastic response for this Match.
+
+        Hits are requested in pages, starting with `Constant.PAGE_SIZE`
+        hits and doubling the page size, up to `Constant.SEARCH_SIZE` hits.
+        Every page is merged into the composite. A next page is only
+        requested while the previous one still changed the composite
+        (beyond its first hit, for the first page), or still had hits that
+        scored at least `Constant.MIN_SCORE`.
+        """
         if not self._search_response:
-            self._search_response = self._es.search(
-                index=Constant.PD_INDEX,
-                body=getattr(self.query, self._query_type),
-                size=Constant.SEARCH_SIZE,
-            )["hits"]["hits"]
+            self._search_response, self._matches = [], []
+            page_size = Constant.PAGE_SIZE or Constant.SEARCH_SIZE
+            offset = 0
+            while offset < Constant.SEARCH_SIZE:
+                size = min(page_size, Constant.SEARCH_SIZE - offset)
+                hits = self._es.search(
+                    index=Constant.PD_INDEX,
+                    body=getattr(self.query, self._query_type),
+                    from_=offset,
+                    size=size,
+                    _source_includes=Constant.SOURCE_FIELDS,
+                    terminate_after=Constant.TERMINATE_AFTER,
+                    track_scores=Constant.MIN_SCORE is not None,
+                    track_total_hits=False,
+                )["hits"]["hits"]
+                self._search_response.extend(hits)
+                if not self._merge(hits) or len(hits) < size:
+                    break
+                offset += size
+                page_size *= 2
             if not self._search_response:
                 raise NoMatch
         return self._search_response
 
+    def _merge(self, hits: list[dict[str, Any]]) -> bool:
+        """Merge hits into the composite, and return whether to continue."""
+        assert isinstance(self._matches, list)
+        before = None if self._composite is None else list(self._composite)
+        for doc in hits:
+            person = Person.from_doc(doc)
+            self._matches.append(person)
+            if self._composite is None:
+                # The first hit itself doesn't count as a change
+                self._composite = deepcopy(person)
+                before = list(self._composite)
+            else:
+                self._composite |= person
+        if self._composite is not None and list(self._composite) != before:
+            return True
+        return Constant.MIN_SCORE is not None and any(
+            (doc.get("_score") or 0) >= Constant.MIN_SCORE for doc in hits
+        )
+
     @property
     def matches(self) -> list[Person]:
         if not self._matches:
@@ -1329,8 +1411,7 @@ class Match:
     @property
     def composite(self) -> Person:
         """Create a composite output `Person`."""
-        if not self._composite:
-            self._composite = deepcopy(self.matches[0])
-            for person in self.matches[1:]:
-                self._composite |= person
+        if self._composite is None:
+            self.search_response  # noqa, merges all hits into the composite
+        assert isinstance(self._composite, Person)
         return self._composite
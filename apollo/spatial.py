@@ -0,0 +1,286 @@
+"""Module for answering geo_distance-style queries in-process.
+
+A :class:`SpatialIndex` holds the address ID, latitude and longitude of
+every address in a compact set of arrays, bucketed in a grid of cells.
+Radius and k-nearest-neighbour queries only compare the addresses in
+nearby cells, so that millions of queries can run without Elasticsearch.
+
+Example::
+    from apollo.spatial import SpatialIndex
+
+    # Take a snapshot once
+    index = SpatialIndex.from_es("real_estate_alias", path="real_estate.npz")
+
+    # Load it in every run
+    index = SpatialIndex.load("real_estate.npz")
+    ids, meters = index.radius(52.3702, 4.8952, 100)
+    ids, meters = index.nearest(52.3702, 4.8952, k=10)
+
+    # Let ESClient.geo_distance use it
+    es = ESClient("real_estate_alias", spatial_index=index)
+    ids = es.geo_distance(address_id="1071XB 71 B", distance="10m", ids_only=True)
+"""
+
+from __future__ import annotations
+
+__all__ = ("SpatialIndex",)
+
+from array import array
+from collections.abc import Sequence
+from functools import reduce
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+from numpy.typing import NDArray
+
+_EARTH_RADIUS = 6_371_008.7714  # m, the mean radius Elasticsearch uses
+_METERS_PER_DEGREE = np.radians(1) * _EARTH_RADIUS
+
+
+def haversine(
+    latitude: float,
+    longitude: float,
+    latitudes: NDArray[np.float64],
+    longitudes: NDArray[np.float64],
+) -> NDArray[np.float64]:
+    """Vectorized great-circle distance in meters, like Elasticsearch's `arc`."""
+    lat1, lon1 = np.radians(latitude), np.radians(longitude)
+    lat2, lon2 = np.radians(latitudes), np.radians(longitudes)
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * _EARTH_RADIUS * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+class SpatialIndex:
+    """Grid index over address coordinates for radius and k-nearest queries.
+
+    Addresses are sorted by grid cell, and the cells of every grid row are
+    found with a binary search. A query computes distances (vectorized)
+    only for the addresses in the cells that overlap its bounding box.
+    """
+
+    def __init__(
+        self,
+        address_ids: Sequence[str] | NDArray[Any],
+        latitudes: Sequence[float] | NDArray[np.float64],
+        longitudes: Sequence[float] | NDArray[np.float64],
+        cell_size: float = 0.01,
+    ):
+        """Build the index from three columns of equal length.
+
+        :param cell_size: Size of the grid cells in degrees. The default of
+            0.01 (about 1 km) suits radiuses of up to a few kilometers.
+        """
+        ids = np.asarray(address_ids)
+        lat = np.asarray(latitudes, dtype=np.float64)
+        lon = np.asarray(longitudes, dtype=np.float64)
+        if not len(ids) == len(lat) == len(lon):
+            raise ValueError("Provide columns of equal length.")
+        self.cell_size = cell_size
+        if len(ids):
+            self._origin = (lat.min(), lon.min())
+            rows, cols = self._cell(lat, lon)
+            self._shape = (int(rows.max()) + 1, int(cols.max()) + 1)
+        else:
+            self._origin, self._shape = (0.0, 0.0), (0, 0)
+            rows = cols = np.zeros(0, dtype=np.int64)
+        keys = rows * self._shape[1] + cols
+        order = np.argsort(keys, kind="stable")
+        self._keys = keys[order]
+        self.address_ids = ids[order]
+        self.latitudes = lat[order]
+        self.longitudes = lon[order]
+        self._id_order: NDArray[np.intp] | None = None
+
+    def __repr__(self) -> str:
+        return f"SpatialIndex({len(self)} addresses, cell_size={self.cell_size})"
+
+    def __len__(self) -> int:
+        return len(self.address_ids)
+
+    def __contains__(self, address_id: str) -> bool:
+        return self.location(address_id) is not None
+
+    @classmethod
+    def from_es(
+        cls,
+        es_index: str = "real_estate_alias",
+        path: Path | str | None = None,
+        **kwargs: Any,
+    ) -> SpatialIndex:
+        """Take a snapshot of the addresses in an Elasticsearch index.
+
+        Supports the real_estate, realestate.realestate and
+        addressvalidation indexes; for the latter, the address IDs are the
+        full address lines. Keyword arguments, such as `host`, are passed
+        on to :class:`ESClient`, except `query` (default: all documents)
+        and `cell_size`. Provide :param path: to also save the snapshot.
+        """
+        from .connectors.mx_elastic import ESClient, _address_fields, _address_location
+
+        query = kwargs.pop("query", None)
+        cell_size = kwargs.pop("cell_size", 0.01)
+        id_field, geo_field = _address_fields(es_index)
+        es = ESClient(es_index, **kwargs)
+        ids: list[bytes] = []
+        latitudes, longitudes = array("d"), array("d")
+        for doc in es.streamall(
+            query,
+            fields=[id_field, geo_field],
+            source_only=True,
+            chunk_size=10_000,
+        ):
+            try:
+                address_id = reduce(dict.__getitem__, id_field.split("."), doc)
+                latitude, longitude = _address_location(es_index, doc)
+            except (KeyError, TypeError, ValueError):
+                continue
+            ids.append(f"{address_id}".encode())
+            latitudes.append(latitude)
+            longitudes.append(longitude)
+        index = cls(np.array(ids), latitudes, longitudes, cell_size=cell_size)
+        if path is not None:
+            index.save(path)
+        return index
+
+    def save(self, path: Path | str) -> None:
+        """Save the index to a .npz file."""
+        np.savez(
+            path,
+            address_ids=self.address_ids,
+            latitudes=self.latitudes,
+            longitudes=self.longitudes,
+            cell_size=self.cell_size,
+        )
+
+    @classmethod
+    def load(cls, path: Path | str) -> SpatialIndex:
+        """Load an index from a .npz file written by `save`."""
+        with np.load(path) as data:
+            return cls(
+                data["address_ids"],
+                data["latitudes"],
+                data["longitudes"],
+                cell_size=float(data["cell_size"]),
+            )
+
+    def _cell(
+        self,
+        latitude: NDArray[np.float64],
+        longitude: NDArray[np.float64],
+    ) -> tuple[NDArray[np.int64], NDArray[np.int64]]:
+        rows = (latitude - self._origin[0]) // self.cell_size
+        cols = (longitude - self._origin[1]) // self.cell_size
+        return rows.astype(np.int64), cols.astype(np.int64)
+
+    def _decode(self, ids: NDArray[Any]) -> NDArray[Any]:
+        return np.char.decode(ids) if ids.dtype.kind == "S" else ids
+
+    def _search(
+        self,
+        latitude: float,
+        longitude: float,
+        meters: float,
+    ) -> tuple[NDArray[np.intp], NDArray[np.float64], bool]:
+        """Return positions and distances of all addresses in the cells
+        around a location, and whether these are all addresses."""
+        dlat = meters / _METERS_PER_DEGREE
+        cos = np.cos(np.radians(min(abs(latitude) + dlat, 90.0)))
+        dlon = dlat / cos if cos > 1e-12 else 360.0
+        (r0, r1), (c0, c1) = self._cell(
+            np.array((latitude - dlat, latitude + dlat)),
+            np.array((longitude - dlon, longitude + dlon)),
+        )
+        rows, cols = self._shape
+        r0, c0 = max(int(r0), 0), max(int(c0), 0)
+        r1, c1 = min(int(r1), rows - 1), min(int(c1), cols - 1)
+        complete = r0 == 0 and c0 == 0 and r1 == rows - 1 and c1 == cols - 1
+        if r0 > r1 or c0 > c1:
+            positions = np.zeros(0, dtype=np.intp)
+        else:
+            keys = np.arange(r0, r1 + 1) * cols
+            starts = np.searchsorted(self._keys, keys + c0)
+            stops = np.searchsorted(self._keys, keys + c1, side="right")
+            positions = np.concatenate(
+                [np.arange(start, stop) for start, stop in zip(starts, stops)]
+            )
+        distances = haversine(
+            latitude, longitude, self.latitudes[positions], self.longitudes[positions]
+        )
+        return positions, distances, complete
+
+    def radius(
+        self,
+        latitude: float,
+        longitude: float,
+        meters: float,
+    ) -> tuple[NDArray[Any], NDArray[np.float64]]:
+        """Return the address IDs within distance of a location.
+
+        Returns the address IDs and their distances in meters as arrays,
+        sorted by distance.
+        """
+        positions, distances, _ = self._search(latitude, longitude, meters)
+        within = np.flatnonzero(distances <= meters)
+        within = within[np.argsort(distances[within], kind="stable")]
+        return self._decode(self.address_ids[positions[within]]), distances[within]
+
+    def nearest(
+        self,
+        latitude: float,
+        longitude: float,
+        k: int = 1,
+    ) -> tuple[NDArray[Any], NDArray[np.float64]]:
+        """Return the k address IDs nearest to a location.
+
+        Returns the address IDs and their distances in meters as arrays,
+        sorted by distance. The search radius starts at one cell, and
+        doubles until it holds k addresses.
+        """
+        if k < 1 or not len(self):
+            return self._decode(self.address_ids[:0]), np.zeros(0)
+        meters = self.cell_size * _METERS_PER_DEGREE
+        while True:
+            positions, distances, complete = self._search(latitude, longitude, meters)
+            if not complete:
+                within = distances <= meters
+                positions, distances = positions[within], distances[within]
+            if len(positions) >= k or complete:
+                break
+            meters *= 2
+        if len(positions) > k:
+            nearest = np.argpartition(distances, k - 1)[:k]
+            positions, distances = positions[nearest], distances[nearest]
+        order = np.argsort(distances, kind="stable")
+        return self._decode(self.address_ids[positions[order]]), distances[order]
+
+    def location(self, address_id: str) -> tuple[float, float] | None:
+        """Return the latitude-longitude pair of an address, if indexed."""
+        return self.locations([address_id])[0]
+
+    def locations(
+        self,
+        address_ids: Sequence[str],
+    ) -> list[tuple[float, float] | None]:
+        """Return the latitude-longitude pairs of many addresses at once.
+
+        Addresses that are not in the index get None.
+        """
+        if not len(self):
+            return [None] * len(address_ids)
+        if self._id_order is None:
+            self._id_order = np.argsort(self.address_ids, kind="stable")
+        ids = np.asarray(address_ids)
+        if self.address_ids.dtype.kind == "S":
+            ids = np.char.encode(ids.astype(str))
+        found = np.searchsorted(self.address_ids, ids, sorter=self._id_order)
+        positions = self._id_order[np.minimum(found, len(self) - 1)]
+        return [
+            (self.latitudes[position], self.longitudes[position])
+            if self.address_ids[position] == address_id
+            else None
+            for address_id, position in zip(ids, positions)
+        ]
@@ -0,0 +1,95 @@
+"""Benchmark the persons search path with and without payload reduction.
+
+Compares `Match.search_response` for a random sample of persons:
+
+- before: full `_source` documents, uncompressed
+- after: `_source` includes for `Person.from_doc`, HTTP compression
+
+and reports the bytes sent and received over the wire, and the latency
+per match. Requires access to the person data index.
+
+Usage::
+    python benchmarks/persons_search.py --sample 200
+"""
+
+from __future__ import annotations
+
+import argparse
+from statistics import mean, median
+from time import perf_counter
+from typing import Any
+
+from apollo.connectors.mx_elastic import ESClient
+from apollo.exceptions import NoMatch
+from apollo.persons import Constant, Match, Person
+
+
+def count_bytes(es: ESClient) -> dict[str, int]:
+    """Count the bytes over the wire for all connections of a client."""
+    counts = {"sent": 0, "received": 0}
+    for connection in es.transport.connection_pool.connections:
+        urlopen = connection.pool.urlopen
+
+        def counting_urlopen(
+            method: str,
+            url: str,
+            body: bytes | None = None,
+            *args: Any,
+            _urlopen: Any = urlopen,
+            **kwargs: Any,
+        ) -> Any:
+            response = _urlopen(method, url, body, *args, **kwargs)
+            counts["sent"] += len(body or b"")
+            counts["received"] += response.tell()
+            return response
+
+        connection.pool.urlopen = counting_urlopen
+    return counts
+
+
+def sample_persons(size: int) -> list[Person]:
+    es = ESClient(Constant.PD_INDEX)
+    query = {
+        "query": {"function_score": {"random_score": {}}},
+        "_source": list(Constant.SOURCE_FIELDS),
+    }
+    return [Person.from_doc(doc) for doc in es.find(query, size=size)]
+
+
+def run(persons: list[Person], compress: bool, source_fields: Any) -> None:
+    es = ESClient(Constant.PD_INDEX, http_compress=compress, shared=False)
+    counts = count_bytes(es)
+    Match._es, Constant.SOURCE_FIELDS = es, source_fields
+    latencies = []
+    for person in persons:
+        start = perf_counter()
+        try:
+            Match(person).search_response
+        except NoMatch:
+            pass
+        latencies.append(perf_counter() - start)
+    es.close()
+    n = len(persons)
+    print(
+        f"  sent: {counts['sent'] / n:,.0f} B/match,"
+        f" received: {counts['received'] / n:,.0f} B/match,"
+        f" latency: mean {mean(latencies) * 1e3:.1f} ms,"
+        f" median {median(latencies) * 1e3:.1f} ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sample", type=int, default=100)
+    args = parser.parse_args()
+
+    persons = sample_persons(args.sample)
+    source_fields = Constant.SOURCE_FIELDS
+    print(f"before ({len(persons)} matches, SEARCH_SIZE={Constant.SEARCH_SIZE})")
+    run(persons, compress=False, source_fields=None)
+    print("after")
+    run(persons, compress=True, source_fields=source_fields)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,42 @@
 from __future__ import annotations
 
+import json
+import os
+from asyncio import gather, run, sleep
+from collections.abc import Generator, Iterator
+from copy import deepcopy
+from datetime import date, datetime
+from decimal import Decimal
+from functools import partial
+from pathlib import Path
+from threading import Lock
+from types import SimpleNamespace
+from typing import Any
+
+import psycopg2.extras
 import pytest
+from bson import encode
+from elasticsearch.exceptions import TransportError
+from elasticsearch.serializer import JSONSerializer
+from pymongo import DeleteMany, UpdateOne
 
+from apollo.connectors import mx_mysql, mx_sqltomongo
+from apollo.connectors.mx_aioelastic import AsyncESClient
+from apollo.connectors.mx_aiomysql import AsyncMySQLClient
 from apollo.connectors.mx_elastic import ESClient
 from apollo.connectors.mx_email import EmailClient
-from apollo.connectors.mx_mongo import MongoDB, MxClient
-from apollo.connectors.mx_mysql import MySQLClient
+from apollo.connectors.mx_mongo import MongoDB, MxClient, MxCollection
+from apollo.connectors.mx_mysql import (
+    _MISSING,
+    DiskQueryCache,
+    MySQLClient,
+    QueryCache,
+    _normalize_query,
+    _query_tables,
+)
+from apollo.connectors.mx_postgres import PgSql, _copy_value, _CopyReader
+from apollo.connectors.mx_sqltomongo import MappingsBase, SQLtoMongo
+from apollo.exceptions import ConnectorError, ESClientError, PgSqlError
 
 
 def test_email() -> None:
@@ -39,5 +70,842 @@ def test_mongo(host: str) -> None:
     assert client.server_info()
 
 
+def test_mongo_correct_geoshapes() -> None:
+    bowtie = [[[0, 0], [1, 1], [1, 0], [0, 1], [0, 0]]]
+    square = [[[0, 0], [1, 0], [1, 1], [0, 1], [0, 0]]]
+    docs = [
+        {"geometry": {"type": "Polygon", "coordinates": bowtie}},
+        {"geometry": {"type": "MultiPolygon", "coordinates": [square]}},
+        {"$set": {"geometry.geoPoint": {"type": "Polygon", "coordinates": bowtie}}},
+    ]
+    MxCollection.correct_geoshapes(docs, ("geometry", "geometry.geoPoint"))
+    assert docs[0]["geometry"]["coordinates"] != bowtie
+    assert docs[1]["geometry"]["coordinates"] == [square]
+    assert docs[2]["$set"]["geometry.geoPoint"]["coordinates"] != bowtie
+
+
 def test_mysql() -> None:
     assert MySQLClient().connect(conn=True)
+
+
+def test_mysql_query_cache(tmp_path: Path) -> None:
+    query = "SELECT *  FROM real_estate.real_estate\n WHERE city = 'Den  Haag';"
+    assert _normalize_query(query) == (
+        "SELECT * FROM real_estate.real_estate WHERE city = 'Den  Haag'"
+    )
+    assert _query_tables(query) == {"real_estate.real_estate"}
+    assert _query_tables("TRUNCATE TABLE `a`.`b`") == {"a.b"}
+    assert _query_tables("INSERT INTO b VALUES (1)", "a") == {"a.b"}
+
+    for cache in (QueryCache(), DiskQueryCache(path=tmp_path)):
+        key = cache.key(query)
+        assert key == cache.key(" ".join(query.split(" ")))
+        assert cache.get(key) is _MISSING
+        cache.set(key, _query_tables(query), [{"id": 1}])
+        assert cache.get(key) == [{"id": 1}]
+        cache.invalidate("real_estate.other")
+        assert cache.get(key) == [{"id": 1}]
+        cache.invalidate("real_estate.real_estate")
+        assert cache.get(key) is _MISSING
+
+
+class _FakeCursor:
+    def __init__(self, cursor_class: type | None, queries: list[Any]):
+        self.dictionary = "Dict" in getattr(cursor_class, "__name__", "")
+        self.queries = queries
+
+    async def __aenter__(self) -> _FakeCursor:
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        pass
+
+    async def execute(self, query: str, *args: Any) -> None:
+        self.queries.append((query, self.dictionary))
+
+    async def fetchone(self) -> Any:
+        return {"n": 1} if self.dictionary else (1,)
+
+    async def fetchall(self) -> Any:
+        return [await self.fetchone()]
+
+
+class _FakePool:
+    def __init__(self) -> None:
+        self.queries: list[Any] = []
+
+    def acquire(self) -> _FakePool:
+        return self
+
+    async def __aenter__(self) -> _FakePool:
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        pass
+
+    def cursor(self, cursor_class: type | None = None) -> _FakeCursor:
+        return _FakeCursor(cursor_class, self.queries)
+
+
+def test_aiomysql_concurrent_state(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    for name in ("server-ca.pem", "client-cert.pem", "client-key.pem"):
+        (tmp_path / name).touch()
+    monkeypatch.setattr(mx_mysql, "commondir", tmp_path)
+    monkeypatch.setattr(mx_mysql, "getenv", lambda name: "localhost")
+    monkeypatch.setattr(mx_mysql, "get_secret", lambda name: ("user", "password"))
+
+    sql = AsyncMySQLClient("real_estate.real_estate")
+    pool = _FakePool()
+
+    async def create_pool() -> _FakePool:
+        return pool
+
+    monkeypatch.setattr(sql, "create_pool", create_pool)
+
+    async def main() -> list[Any]:
+        return list(
+            await gather(
+                sql.query("SELECT 1", fieldnames=False),
+                sql.query("SELECT 1"),
+                sql.count("other.table"),
+                sql.count(),
+            )
+        )
+
+    assert run(main()) == [[(1,)], [{"n": 1}], 1, 1]
+    assert (sql.database, sql.table_name, sql.dictionary) == (
+        "real_estate",
+        "real_estate",
+        True,
+    )
+    assert [query for query, _ in pool.queries][2:] == [
+        "SELECT COUNT(*) FROM other.table",
+        "SELECT COUNT(*) FROM real_estate.real_estate",
+    ]
+
+
+class _StubWatermarks:
+    def __init__(self) -> None:
+        self.saved: list[dict[str, Any]] = []
+
+    def update_one(
+        self, filter: dict[str, Any], update: dict[str, Any], **kwargs: Any
+    ) -> None:
+        self.saved.append(update["$set"]["value"])
+
+    def find_one(self, filter: dict[str, Any]) -> dict[str, Any] | None:
+        return {"value": self.saved[-1]} if self.saved else None
+
+
+class _StubCollection:
+    full_name = "mongodb.collection"
+
+    def __init__(self) -> None:
+        self.documents: dict[Any, dict[str, Any]] = {}
+        self.database = {mx_sqltomongo._WATERMARKS: _StubWatermarks()}
+
+    def bulk_write(self, requests: list[Any], **kwargs: Any) -> SimpleNamespace:
+        counts = dict.fromkeys(("matched", "modified", "upserted", "deleted"), 0)
+        for request in requests:
+            _id = request._filter["_id"]
+            if isinstance(request, DeleteMany):
+                counts["deleted"] += self.documents.pop(_id, None) is not None
+            elif isinstance(request, UpdateOne):
+                document: Any = request._doc
+                if _id in self.documents:
+                    counts["matched"] += 1
+                    counts["modified"] += 1
+                    self.documents[_id].update(document["$set"])
+                else:
+                    counts["upserted"] += 1
+                    self.documents[_id] = {"_id": _id, **document["$set"]}
+        return SimpleNamespace(**{f"{k}_count": v for k, v in counts.items()})
+
+
+class _StubMappings(MappingsBase):
+    def document(self, d: dict[str, Any]) -> dict[str, Any]:
+        return {"value": d["v"]}
+
+    def delete(self, d: dict[str, Any]) -> str:
+        return d["id"]
+
+
+def test_sqltomongo_apply_changes(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    events = [
+        {"type": "insert", "schema": "db", "table": "t", "rows": [{"id": 1, "v": 1}]},
+        {"type": "insert", "schema": "db", "table": "t", "rows": [{"id": 2, "v": 2}]},
+        {"type": "insert", "schema": "db", "table": "other", "rows": [{"id": 9}]},
+        {"type": "commit", "log_file": "mysql-bin.000001", "log_pos": 100},
+        {"type": "update", "schema": "db", "table": "t", "rows": [{"id": 1, "v": 10}]},
+        {"type": "delete", "schema": "db", "table": "t", "rows": [{"id": 2, "v": 2}]},
+        {"type": "commit", "log_file": "mysql-bin.000001", "log_pos": 200},
+        {"type": "heartbeat"},
+    ]
+    path = tmp_path / "events.jsonl"
+    path.write_text("\n".join(json.dumps(event) for event in events) + "\n\n")
+    monkeypatch.setattr(mx_sqltomongo, "MxCollection", _StubCollection)
+
+    stm: Any = SQLtoMongo.__new__(SQLtoMongo)
+    stm.coll = coll = _StubCollection()
+    stm.sql = SimpleNamespace(database="db", table_name="t")
+    stm.mappings = _StubMappings()
+    stm.matched_count = stm.number_of_insertions = 0
+    stm.number_of_updates = stm.number_of_deletions = 0
+    assert stm.binlog_position() is None
+
+    stm.apply_changes(
+        SQLtoMongo.recorded_events(path),
+        filter=lambda d: {"_id": d["id"]},
+        field="_id",
+        batch_size=2,
+        flush_interval=60,
+    )
+
+    assert coll.documents == {1: {"_id": 1, "value": 10}}
+    assert (
+        stm.number_of_insertions,
+        stm.matched_count,
+        stm.number_of_updates,
+        stm.number_of_deletions,
+    ) == (2, 1, 1, 1)
+    assert [p["log_pos"] for p in coll.database[mx_sqltomongo._WATERMARKS].saved] == [
+        100,
+        200,
+    ]
+    assert stm.binlog_position() == {"log_file": "mysql-bin.000001", "log_pos": 200}
+
+
+def test_sqltomongo_sync(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(mx_sqltomongo, "MxCollection", _StubCollection)
+    stm: Any = SQLtoMongo.__new__(SQLtoMongo)
+    stm.coll = coll = _StubCollection()
+    stm.sql = SimpleNamespace(database="db", table_name="t")
+    stm.mappings = _StubMappings()
+    stm.matched_count = stm.number_of_insertions = stm.number_of_updates = 0
+    stm.query = "SELECT * FROM db.t WHERE name LIKE 'a%'"
+    queries = []
+    chunks = [
+        [{"id": 0, "v": 0, "at": None}],
+        [{"id": 1, "v": 1, "at": None}, {"id": 2, "v": 2, "at": 5}],
+        [{"id": 3, "v": 3, "at": 7}],
+    ]
+
+    def records(query: str, params: Any, preprocessing: Any) -> Any:
+        queries.append((query, params))
+        return iter(chunks)
+
+    monkeypatch.setattr(stm, "_records", records)
+    sync = partial(stm.sync, watermark="at", filter=lambda d: {"_id": d["id"]})
+
+    sync()
+    assert coll.database[mx_sqltomongo._WATERMARKS].saved == [5, 7]
+    assert stm.number_of_insertions == len(coll.documents) == 4
+
+    chunks = [[{"id": 3, "v": 30, "at": 7}]]
+    sync()
+    assert queries == [
+        (
+            "SELECT * FROM (SELECT * FROM db.t WHERE name LIKE 'a%') AS q"
+            " ORDER BY `at`",
+            None,
+        ),
+        (
+            "SELECT * FROM (SELECT * FROM db.t WHERE name LIKE 'a%%') AS q"
+            " WHERE `at` >= %(watermark)s ORDER BY `at`",
+            {"watermark": 7},
+        ),
+    ]
+    assert coll.documents[3] == {"_id": 3, "value": 30}
+
+    chunks = [[{"id": 4, "v": 4}]]
+    with pytest.raises(ConnectorError):
+        sync()
+
+
+def _pipeline_stm(processes: int = 0) -> Any:
+    stm: Any = SQLtoMongo.__new__(SQLtoMongo)
+    stm.processes, stm.prefetch, stm.writers = processes, 2, 3
+    stm.rows_read, stm.timings, stm._lock = 0, {}, Lock()
+    return stm
+
+
+@pytest.mark.parametrize("processes", [0, 2])
+def test_sqltomongo_pipeline(processes: int) -> None:
+    stm = _pipeline_stm(processes)
+    written: list[Any] = []
+
+    stm._pipeline(([{"i": i}] for i in range(50)), list, written.extend)
+
+    assert sorted(d["i"] for d in written) == list(range(50))
+    assert stm.rows_read == 50
+    if processes:
+        with pytest.raises(ConnectorError):
+            stm._pipeline([], lambda records: records, written.extend)
+
+
+def test_sqltomongo_pipeline_failure() -> None:
+    read = []
+
+    def chunks() -> Iterator[list[dict[str, Any]]]:
+        for i in range(10_000):
+            read.append(i)
+            yield [{"i": i}]
+
+    def write(documents: list[Any]) -> None:
+        if documents[0]["i"] == 3:
+            raise ValueError("write")
+
+    def transform(records: list[Any]) -> list[Any]:
+        if records[0]["i"] == 3:
+            raise ValueError("transform")
+        return records
+
+    with pytest.raises(ValueError, match="write"):
+        _pipeline_stm()._pipeline(chunks(), list, write)
+    assert len(read) < 100
+
+    read.clear()
+    with pytest.raises(ValueError, match="transform"):
+        _pipeline_stm()._pipeline(chunks(), transform, list)
+    assert len(read) < 100
+
+
+class _StubMySQL:
+    def chunk(self, query: str, size: int, *args: Any, **kwargs: Any) -> Any:
+        rows = [{"id": 1, "price": Decimal("1.50"), "day": date(2024, 1, 2)}]
+        yield rows + [{"id": 2, "price": None, "day": None}]
+
+
+def test_sqltomongo_stream_records() -> None:
+    stm: Any = SQLtoMongo.__new__(SQLtoMongo)
+    stm.sql = _StubMySQL()
+    stm.stream, stm.index_columns, stm.chunksize = True, None, 2
+
+    [records] = stm._records("SELECT * FROM db.t")
+
+    assert records == [
+        {"id": 1, "price": 1.5, "day": datetime(2024, 1, 2)},
+        {"id": 2, "price": None, "day": None},
+    ]
+    assert all(encode(record) for record in records)
+
+
+class _FakePgCursor:
+    rowcount = -1
+
+    def __enter__(self) -> _FakePgCursor:
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        pass
+
+
+class _FakePgConnection:
+    def __init__(self) -> None:
+        self.commits = 0
+
+    def cursor(self, *args: Any, **kwargs: Any) -> _FakePgCursor:
+        return _FakePgCursor()
+
+    def commit(self) -> None:
+        self.commits += 1
+
+
+@pytest.fixture
+def pg(monkeypatch: pytest.MonkeyPatch) -> PgSql:
+    monkeypatch.setattr(psycopg2.extras, "DictConnection", _FakePgConnection)
+    pg = PgSql("db")
+    pg.connection = _FakePgConnection()
+    return pg
+
+
+def test_pgsql_insert_values_pages(pg: PgSql, monkeypatch: pytest.MonkeyPatch) -> None:
+    pages = []
+
+    def execute_values(cursor: Any, query: Any, page: Any, page_size: int) -> None:
+        pages.append(page)
+        cursor.rowcount = len(page)
+
+    monkeypatch.setattr(psycopg2.extras, "execute_values", execute_values)
+    rows = [{"id": 1, "v": 1}, {"id": 1, "v": 2}, {"id": 2, "v": 3}, {"id": 2, "v": 4}]
+
+    assert pg.insert("t", iter(rows), method="values", page_size=3) == 4
+    assert pages == [[(1, 1), (1, 2), (2, 3)], [(2, 4)]]
+
+    pages.clear()
+    assert pg.insert("t", rows, update_on="id", method="values", page_size=3) == 3
+    assert pages == [[(1, 2), (2, 3)], [(2, 4)]]
+
+
+def test_pgsql_insert_method(pg: PgSql, monkeypatch: pytest.MonkeyPatch) -> None:
+    calls = []
+    for name in ("copy_in", "_insert_copy", "_insert_values"):
+
+        def method(*args: Any, name: str = name) -> int:
+            calls.append((name, args[2]))
+            return len(list(args[1]))
+
+        monkeypatch.setattr(pg, name, method)
+    rows = [{"id": 1, "v": 1}]
+
+    assert pg.insert("t", rows) == 1
+    assert pg.insert("t", rows, ignore=True) == 1
+    assert pg.insert("t", rows, update_on="id", method="values") == 1
+    assert calls == [
+        ("copy_in", ["id", "v"]),
+        ("_insert_copy", ["id", "v"]),
+        ("_insert_values", ["id", "v"]),
+    ]
+    with pytest.raises(PgSqlError):
+        pg.insert("t", rows, method="executemany")
+
+
+@pytest.mark.parametrize(
+    "value, field",
+    [
+        (None, "\\N"),
+        (True, "t"),
+        ("a\tb\nc\\d", "a\\tb\\nc\\\\d"),
+        (b"\x00\xff", "\\\\x00ff"),
+        (date(2024, 1, 2), "2024-01-02"),
+        ({"a": [1]}, '{"a": [1]}'),
+        ([1, None, [2]], '{"1",NULL,{"2"}}'),
+        (("a b", 'c"d', "e\\f"), '{"a b","c\\\\"d","e\\\\\\\\f"}'),
+    ],
+)
+def test_pgsql_copy_value(value: Any, field: str) -> None:
+    assert _copy_value(value) == field
+
+
+def test_pgsql_copy_reader() -> None:
+    reader = _CopyReader(([i, f"row {i}"] for i in range(3)))
+    chunks = [reader.read(5) for _ in range(6)]
+    assert chunks[-1] == ""
+    assert "".join(chunks) == "0\trow 0\n1\trow 1\n2\trow 2\n"
+    assert all(len(chunk) <= 5 for chunk in chunks)
+    assert _CopyReader([(None, 1)]).read() == "\\N\t1\n"
+
+
+def test_pgsql_insert_short_rows(pg: PgSql, monkeypatch: pytest.MonkeyPatch) -> None:
+    copied = []
+
+    def copy_in(table: str, rows: Any, columns: list[str]) -> int:
+        copied.append((list(rows), columns))
+        return len(copied[-1][0])
+
+    monkeypatch.setattr(pg, "_columns", lambda table: ["id", "v", "w"])
+    monkeypatch.setattr(pg, "copy_in", copy_in)
+
+    assert pg.insert("t", iter([(1,), (2,)])) == 2
+    assert copied == [([(1,), (2,)], ["id"])]
+
+
+def test_aioelastic_find_many_and_geo_distance(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    running, most = 0, 0
+
+    async def msearch(body: list[dict[str, Any]], **kwargs: Any) -> dict[str, Any]:
+        nonlocal running, most
+        running += 1
+        most = max(most, running)
+        await sleep(0.01)
+        running -= 1
+        hits = [{"_source": {"n": query["n"]}} for query in body[1::2]]
+        return {"responses": [{"hits": {"hits": [hit]}} for hit in hits]}
+
+    async def search(**kwargs: Any) -> dict[str, Any]:
+        return {"hits": {"hits": []}}
+
+    async def main() -> Any:
+        es = AsyncESClient("dev_realestate.real_estate", local=True)
+        monkeypatch.setattr(es, "msearch", msearch)
+        monkeypatch.setattr(es, "search", search)
+        try:
+            queries = [{"n": n} for n in range(30)]
+            found = await es.find(queries, batch_size=2, source_only=True)
+            with pytest.raises(ESClientError, match="Address not found"):
+                await es.geo_distance(address_id="0000AA0000")
+            return found
+        finally:
+            await es.close()
+
+    assert run(main()) == [[{"n": n}] for n in range(30)]
+    assert 1 < most <= 4
+
+
+def _dotted(doc: dict[str, Any], field: str) -> Any:
+    for key in field.removesuffix(".keyword").split("."):
+        doc = doc[key]
+    return doc
+
+
+def _real_estate(n: int) -> dict[str, Any]:
+    # Two addresses share every location
+    latitude, longitude = 52 + n // 2 / 100, 4.9
+    return {
+        "n": n,
+        "name": f"Straße {n}",
+        "address": {"identification": {"addressId": f"{n:04}AA"}},
+        "geometry": {
+            "latitude": latitude,
+            "longitude": longitude,
+            "geoPoint": {"coordinates": [longitude, latitude]},
+        },
+    }
+
+
+class _FakeTransport:
+    """Serves the search, scroll, PIT, count, aggregation, _msearch and _bulk
+    requests of ESClient from a list of documents, sorted by "_id"."""
+
+    serializer = JSONSerializer()
+
+    def __init__(self, sources: list[dict[str, Any]]) -> None:
+        self.docs: list[dict[str, Any]] = [
+            {"_id": f"{n}", "_source": doc} for n, doc in enumerate(sources)
+        ]
+        self.lock = Lock()
+        self.requests: list[tuple[str, str, dict[str, Any], Any]] = []
+        self.scrolls: dict[str, tuple[list[dict[str, Any]], int]] = {}
+        self.cleared: list[str] = []
+        self.pits: set[str] = set()
+        self.busy = 0
+        self.rejections = 0
+        self.indexed: list[dict[str, Any]] = []
+
+    def perform_request(
+        self,
+        method: str,
+        url: str,
+        headers: dict[str, str] | None = None,
+        params: dict[str, Any] | None = None,
+        body: Any = None,
+    ) -> Any:
+        with self.lock:
+            self.requests.append((method, url, params or {}, body))
+            return self._route(method, url, params or {}, body)
+
+    def close(self) -> None:
+        pass
+
+    def _route(self, method: str, url: str, params: dict[str, Any], body: Any) -> Any:
+        if url == "/_search/scroll" and method == "DELETE":
+            scroll_id = body["scroll_id"]
+            self.cleared.append(scroll_id)
+            self.scrolls.pop(scroll_id, None)
+            return {}
+        if url == "/_search/scroll":
+            hits, size = self.scrolls.pop(body["scroll_id"])
+            return self._page(hits, size, scroll=True)
+        if url == "/_pit":
+            self.pits.remove(body["id"])
+            return {}
+        if url.endswith("/_pit"):
+            pit_id = f"pit{len(self.requests)}"
+            self.pits.add(pit_id)
+            return {"id": pit_id}
+        if url.endswith("/_count"):
+            return {"count": len(self._match((body or {}).get("query")))}
+        if url.endswith("/_msearch"):
+            lines = [json.loads(line) for line in body.splitlines()]
+            return {
+                "responses": [
+                    {"error": query["error"]}
+                    if "error" in query
+                    else self._search(query)
+                    for query in lines[1::2]
+                ]
+            }
+        if url.endswith("/_bulk"):
+            return self._bulk(body)
+        if url.endswith("/_search"):
+            return self._search(body or {}, params)
+        raise NotImplementedError(f"{method} {url}")
+
+    def _match(self, query: dict[str, Any] | None) -> list[dict[str, Any]]:
+        if not query or "match_all" in query:
+            return self.docs
+        if "match" in query:
+            ((field, value),) = query["match"].items()
+        else:
+            geo = {**query["bool"]["filter"]["geo_distance"]}
+            del geo["distance"]
+            ((field, value),) = geo.items()
+        return [doc for doc in self.docs if _dotted(doc["_source"], field) == value]
+
+    def _search(
+        self, body: dict[str, Any], params: dict[str, Any] | None = None
+    ) -> dict[str, Any]:
+        params = params or {}
+        size = int(params.get("size", body.get("size", 10)))
+        hits = self._match(body.get("query"))
+        if "aggs" in body:
+            aggregation = self._aggregation(body["aggs"]["q"], hits)
+            return {"hits": {"hits": []}, "aggregations": {"q": aggregation}}
+        if "slice" in body:
+            slice_id, slices = body["slice"]["id"], body["slice"]["max"]
+            hits = [hit for hit in hits if int(hit["_id"]) % slices == slice_id]
+        fields = params.get("_source", body.get("_source"))
+        if isinstance(fields, bytes):
+            fields = fields.decode()
+        if isinstance(fields, str):
+            fields = fields.split(",")
+        hits = [
+            {"_id": hit["_id"], "_source": _pick(hit["_source"], fields)}
+            for hit in hits
+        ]
+        if "pit" in body:
+            assert body["pit"]["id"] in self.pits
+            after = body.get("search_after", [-1])[0]
+            hits = [
+                {**hit, "sort": [int(hit["_id"])]}
+                for hit in hits
+                if int(hit["_id"]) > after
+            ]
+            return {"pit_id": body["pit"]["id"], **self._page(hits, size)}
+        return self._page(hits, size, scroll="scroll" in params)
+
+    def _page(
+        self, hits: list[dict[str, Any]], size: int, scroll: bool = False
+    ) -> dict[str, Any]:
+        page: dict[str, Any] = {
+            "hits": {"total": {"value": len(hits)}, "hits": hits[:size]}
+        }
+        if scroll:
+            scroll_id = page["_scroll_id"] = f"scroll{len(self.requests)}"
+            self.scrolls[scroll_id] = hits[size:], size
+        return page
+
+    def _aggregation(
+        self, agg: dict[str, Any], hits: list[dict[str, Any]]
+    ) -> dict[str, Any]:
+        ((kind, spec),) = agg.items()
+        if kind == "composite":
+            field = spec["sources"][0]["q"]["terms"]["field"]
+        else:
+            field = spec["field"]
+        values = sorted({_dotted(hit["_source"], field) for hit in hits})
+        if kind == "cardinality":
+            return {"value": len(values)}
+        if kind == "composite":
+            after = spec.get("after", {}).get("q", -1)
+            keys = [{"q": value} for value in values if value > after]
+            keys = keys[: spec["size"]]
+            buckets = [{"key": key, "doc_count": 1} for key in keys]
+            return {"buckets": buckets, **({"after_key": keys[-1]} if keys else {})}
+        p, n = spec["include"]["partition"], spec["include"]["num_partitions"]
+        values = [value for value in values if value % n == p]
+        other = values[spec["size"] :]
+        return {
+            "buckets": [{"key": value} for value in values[: spec["size"]]],
+            "sum_other_doc_count": sum(
+                _dotted(hit["_source"], field) in other for hit in hits
+            ),
+        }
+
+    def _bulk(self, body: str) -> dict[str, Any]:
+        if self.busy:
+            self.busy -= 1
+            raise TransportError(429, "es_rejected_execution_exception", {})
+        items = []
+        lines = body.splitlines()
+        for action, source in zip(lines[::2], lines[1::2]):
+            ((op_type, meta),) = json.loads(action).items()
+            if self.rejections:
+                self.rejections -= 1
+                items.append({op_type: {**meta, "status": 429}})
+            else:
+                self.indexed.append(json.loads(source))
+                items.append({op_type: {**meta, "status": 201}})
+        return {"items": items}
+
+
+def _pick(source: dict[str, Any], fields: list[str] | None) -> dict[str, Any]:
+    if not fields:
+        return deepcopy(source)
+    picked: dict[str, Any] = {}
+    for field in fields:
+        *path, key = field.split(".")
+        doc = picked
+        for name in path:
+            doc = doc.setdefault(name, {})
+        doc[key] = deepcopy(_dotted(source, field))
+    return picked
+
+
+@pytest.fixture
+def fake_es() -> tuple[ESClient, _FakeTransport]:
+    es = ESClient("dev_realestate.real_estate", local=True, shared=False)
+    transport = _FakeTransport([_real_estate(n) for n in range(100)])
+    es.transport = transport  # type: ignore[assignment]
+    return es, transport
+
+
+@pytest.mark.parametrize("ordered", [False, True])
+def test_elastic_scroll_parallel(
+    fake_es: tuple[ESClient, _FakeTransport], ordered: bool
+) -> None:
+    es, transport = fake_es
+    chunks = list(
+        es.scroll_parallel(slices=3, chunk_size=7, ordered=ordered, source_only=True)
+    )
+    ns = [doc["n"] for chunk in chunks for doc in chunk]
+    assert sorted(ns) == list(range(100))
+    if ordered:
+        assert ns == sorted(ns, key=lambda n: (n % 3, n))
+    assert not transport.scrolls and len(transport.cleared) == 3
+
+    docs = es.findall({"query": {"match_all": {}}}, slices=2, size=10, with_id=True)
+    assert all(doc["_id"] == f"{doc['n']}" for doc in docs)
+    assert sorted(doc["n"] for doc in docs) == list(range(100))
+    assert not transport.scrolls
+
+
+def test_elastic_scroll_parallel_close(
+    fake_es: tuple[ESClient, _FakeTransport]
+) -> None:
+    es, transport = fake_es
+    chunks = es.scroll_parallel(slices=4, chunk_size=2)
+    assert isinstance(chunks, Generator)
+    assert len(next(chunks)) == 2
+    chunks.close()
+    assert not transport.scrolls and len(transport.cleared) == 4
+
+
+def test_elastic_scroll_pit_resume(fake_es: tuple[ESClient, _FakeTransport]) -> None:
+    es, transport = fake_es
+    query = {"query": {"match_all": {}}, "sort": [{"n": "asc"}]}
+    with es.scroll_pit(query, chunk_size=8, source_only=True) as docs:
+        first = [doc["n"] for _, doc in zip(range(20), docs)]
+        search_after = docs.search_after
+    assert first == list(range(20)) and search_after == [19]
+    assert not transport.pits
+
+    docs = es.scroll_pit(query, chunk_size=8, search_after=search_after, with_id=True)
+    rest = list(docs)
+    assert [doc["n"] for doc in rest] == list(range(20, 100))
+    assert rest[0]["_id"] == "20" and not transport.pits
+    searches = [body for _, url, _, body in transport.requests if url == "/_search"]
+    assert searches[-1]["sort"] == [{"n": "asc"}]
+
+
+@pytest.mark.parametrize("suffix", [".jsonl", ".jsonl.gz", ".pickle"])
+def test_elastic_dumpall(
+    fake_es: tuple[ESClient, _FakeTransport], tmp_path: Path, suffix: str
+) -> None:
+    es, transport = fake_es
+    path = tmp_path / f"dump{suffix}"
+    n = es.dumpall(path=path, fields=["n", "name"], source_only=True, chunk_size=7)
+    assert n == 100 and not transport.pits
+    docs = [{"n": n, "name": f"Straße {n}"} for n in range(100)]
+    assert list(es.loadall(path)) == docs
+
+    assert list(es.streamall(max_results=100, source_only=True)) == [
+        _real_estate(n) for n in range(100)
+    ]
+    with pytest.raises(ESClientError, match="max_results=99"):
+        next(es.streamall(max_results=99))
+
+
+def test_elastic_bulk_load(fake_es: tuple[ESClient, _FakeTransport]) -> None:
+    es, transport = fake_es
+    docs = [{"n": n, "name": "é" * 100} for n in range(50)]
+    transport.busy, transport.rejections = 1, 3
+    result = es.bulk_load(
+        docs, chunk_size=20, max_chunk_bytes=1_000, id_field="n", initial_backoff=0
+    )
+    assert result == (50, [])
+    assert sorted(transport.indexed, key=lambda doc: doc["n"]) == docs
+    bodies = [body for _, url, _, body in transport.requests if url.endswith("_bulk")]
+    assert max(len(body.encode()) for body in bodies) <= 1_000
+    assert json.loads(bodies[0].splitlines()[0]) == {
+        "index": {"_index": "dev_realestate.real_estate", "_id": 0}
+    }
+
+    transport.indexed, transport.rejections = [], 10
+    result = es.bulk_load(docs[:5], max_retries=1, initial_backoff=0)
+    assert result.success == 0 and len(result.errors) == 5
+    transport.busy = 2
+    with pytest.raises(ESClientError, match="Bulk request"):
+        es.bulk_load(docs, max_retries=1, initial_backoff=0)
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="requires fork")
+def test_elastic_transport_after_fork() -> None:
+    es = ESClient("dev_realestate.real_estate", local=True)
+    other = ESClient("dev_realestate.real_estate", local=True)
+    own = ESClient("dev_realestate.real_estate", local=True, shared=False)
+    assert es.transport is other.transport and own.transport is not es.transport
+    parent_transport = es.transport
+
+    pid = os.fork()
+    if pid == 0:
+        os._exit(
+            0
+            if es.transport is not parent_transport
+            and es.transport is other.transport
+            and es.indices.transport is es.transport
+            else 1
+        )
+    _, status = os.waitpid(pid, 0)
+    assert status == 0 and es.transport is parent_transport
+
+
+def test_elastic_distinct_count(fake_es: tuple[ESClient, _FakeTransport]) -> None:
+    es, transport = fake_es
+    assert es.distinct_count("n") == 100
+    assert es.distinct_count("n", partitions=3, threads=2) == 100
+    assert es.distinct_count("n", approximate=True) == 100
+    find = {"match": {"address.identification.addressId.keyword": "0042AA"}}
+    assert es.distinct_count("n", find, partitions=3) == 1
+    assert es.distinct_values("geometry.latitude") == [52 + n / 100 for n in range(50)]
+
+    transport.requests.clear()
+    pages = list(es._partitioned_pages("n", partitions=2, threads=2, size=10))
+    assert sorted(value for page in pages for value in page) == list(range(100))
+    assert max(len(page) for page in pages) <= 10
+    assert len(transport.requests) > len(pages) == 16
+
+
+def test_elastic_find_many(fake_es: tuple[ESClient, _FakeTransport]) -> None:
+    es, transport = fake_es
+    queries: list[dict[str, Any]] = [
+        {"query": {"match": {"address.identification.addressId.keyword": f"{n:04}AA"}}}
+        for n in reversed(range(25))
+    ]
+    found = es.find(queries, batch_size=10, threads=2, size=1, source_only=True)
+    assert isinstance(found, list)
+    assert [doc["n"] for doc in found] == list(reversed(range(25)))
+    bodies = [body for _, url, _, body in transport.requests if "_msearch" in url]
+    assert sorted(len(body.splitlines()) for body in bodies) == [10, 20, 20]
+
+    with pytest.raises(ESClientError, match="shard failure"):
+        es.find([*queries, {"error": "shard failure"}], batch_size=10)
+
+
+def test_elastic_geo_distance_many(fake_es: tuple[ESClient, _FakeTransport]) -> None:
+    es, _ = fake_es
+    locations = [(52.0, 4.9), None, {"latitude": 52.05, "longitude": 4.9}]
+    found = es.geo_distance_many(locations=locations, source_only=True)
+    assert [[doc["n"] for doc in docs] for docs in found] == [[0, 1], [], [10, 11]]
+    found = es.geo_distance_many(locations=locations, size=1, source_only=True)
+    assert [[doc["n"] for doc in docs] for docs in found] == [[0], [], [10]]
+
+    address_ids = ["0003AA", "9999XX", "0010AA"]
+    assert es.geo_distance_many(address_ids=address_ids, ids_only=True) == [
+        ["0002AA", "0003AA"],
+        [],
+        ["0010AA", "0011AA"],
+    ]
+    assert es.geo_distance_many(address_ids=address_ids, ids_only=True, size=1) == [
+        ["0002AA"],
+        [],
+        ["0010AA"],
+    ]
+    with pytest.raises(ESClientError, match="either"):
+        es.geo_distance_many()
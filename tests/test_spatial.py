@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+
+from apollo.spatial import SpatialIndex, haversine
+
+
+def test_spatial_index(tmp_path: Path) -> None:
+    rng = np.random.default_rng(0)
+    n = 10_000
+    ids = np.array([f"{i:06d}" for i in range(n)])
+    lat, lon = rng.uniform(52.0, 52.5, n), rng.uniform(4.5, 5.0, n)
+    index = SpatialIndex(ids, lat, lon)
+    assert len(index) == n
+
+    for latitude, longitude in rng.uniform((52.0, 4.5), (52.5, 5.0), (20, 2)):
+        distances = haversine(latitude, longitude, lat, lon)
+        found, meters = index.radius(latitude, longitude, 500)
+        assert sorted(found) == sorted(ids[distances <= 500])
+        assert (np.diff(meters) >= 0).all()
+        found, meters = index.nearest(latitude, longitude, k=5)
+        assert np.allclose(meters, np.sort(distances)[:5])
+
+    index.save(tmp_path / "index.npz")
+    index = SpatialIndex.load(tmp_path / "index.npz")
+    assert index.location("000042") == (lat[42], lon[42])
+    assert "unknown" not in index
+    assert index.locations(["000001", "unknown"])[1] is None